@@ -1,5 +1,6 @@
 from flask import Flask, render_template, request, jsonify, redirect, url_for
 import os
+import time
 import yaml
 from qbit_helper import QBitHelperBasic, DashboardInfo, APP_VERSION
 
@@ -49,21 +50,90 @@ def settings():
 # API路由定义
 @app.route('/api/dashboard/info', methods=['GET'])
 def get_dashboard_info():
-    """获取仪表板信息"""
+    """获取仪表板信息
+
+    返回后台刷新的快照，ETag为快照版本号，内容未变化时返回304。
+    查询参数instances为以|分隔的实例名称，为空时返回所有实例的汇总。
+    """
+    try:
+        # 使用QBitHelperBasic实例获取内存中的仪表板快照
+        snapshot = qbhper.get_dashboard_snapshot()
+        info, version = qbhper.select_dashboard_info(snapshot, request.args.get('instances'))
+        if version in request.if_none_match:
+            response = app.response_class(status=304)
+        else:
+            response = jsonify({
+                'success': True,
+                'data': {
+                    'total_torrents': info.total_torrents,
+                    'total_trackers': info.total_trackers,
+                    'non_working_trackers': info.non_working_trackers,
+                    'category_counts': info.category_counts,
+                    'tag_counts': info.tag_counts,
+                    'non_working_trackers_detail': info.non_working_trackers_detail,
+                    'request_rates': info.request_rates
+                },
+                'instances': list(snapshot.instances),
+                'version': version,
+                'updated_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot.updated_at)),
+                'age': round(time.time() - snapshot.updated_at, 1)
+            })
+        response.set_etag(version)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Data-Age'] = str(round(time.time() - snapshot.updated_at, 1))
+        return response
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/events', methods=['GET'])
+def get_events():
+    """服务器推送事件流（SSE）
+
+    事件类型：task_start、task_progress、task_finish（规则执行进度），task_result（任务结果日志更新），
+    job（后台任务状态变化），dashboard（仪表板变化的字段），reset（错过了部分事件，需要重新加载）。
+    连接在default.events.stream_duration秒后结束，浏览器会携带Last-Event-ID自动重连。
+    """
+    events_config = qbhper.config.get('default', {}).get('events', {})
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    response = app.response_class(qbhper.events.stream(last_event_id,
+                                                       duration=events_config.get('stream_duration', 300),
+                                                       heartbeat=events_config.get('heartbeat', 15)),
+                                  mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # 禁止反向代理缓冲事件流
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus文本格式的运行指标，合并所有worker进程的指标"""
+    if qbhper.metrics is None:
+        return jsonify({'success': False, 'message': '运行指标未启用'}), 404
+    return app.response_class(qbhper.render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/api/instances', methods=['GET'])
+def get_instances():
+    """获取所有qBittorrent实例及其连接状态"""
     try:
-        # 使用QBitHelperBasic实例获取实际的仪表板信息
-        info = qbhper.get_dashboard_info()
-        return jsonify({
-            'success': True,
-            'data': {
-                'total_torrents': info.total_torrents,
-                'total_trackers': info.total_trackers,
-                'non_working_trackers': info.non_working_trackers,
-                'category_counts': info.category_counts,
-                'tag_counts': info.tag_counts,
-                'non_working_trackers_detail': info.non_working_trackers_detail
-            }
-        })
+        return jsonify({'success': True, 'data': qbhper.get_instances_status()})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/instances/reconnect', methods=['POST'])
+def reconnect_instances():
+    """重新登录qBittorrent实例，请求体中的instances为空时重连所有实例"""
+    try:
+        data = request.get_json(silent=True) or {}
+        result = qbhper.reconnect_instances(data.get('instances'))
+        return jsonify({'success': all(result.values()), 'data': result})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -71,12 +141,13 @@ def get_dashboard_info():
 # 用户配置相关的API接口
 @app.route('/api/config/reload_config', methods=['POST'])
 def reload_config():
-    """重载配置"""
+    """重载配置
+
+    从配置文件重新加载配置，只重新连接连接信息变化的实例，自动任务按差异重新调度。
+    """
     try:
-        # 重新初始化QBitHelperBasic实例以加载最新配置
-        global qbhper
-        qbhper = QBitHelperBasic(CONFIG_FILE)
-        return jsonify({'success': True, 'message': '配置重载成功'})
+        changes = qbhper.reload_config()
+        return jsonify({'success': True, 'message': '配置重载成功', 'data': changes})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -114,15 +185,24 @@ def save_user_rules():
 
 @app.route('/api/task/get_task_results', methods=['GET'])
 def get_task_results():
-    """获取任务执行结果日志"""
+    """获取任务执行结果日志
+
+    查询参数：
+        limit: 返回最近的运行次数，默认50
+        before: 分页游标，返回该游标之前的运行
+        since: 字节偏移，只返回该偏移之后新追加的内容（配合generation使用）
+        generation: 上次返回的日志标识，日志轮转后需要重新加载
+    """
     try:
-        log_file_path = os.path.join('data', 'task_results.log')
-        if os.path.exists(log_file_path):
-            with open(log_file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return jsonify({'success': True, 'data': content})
+        task_result_log = qbhper.task_result_log
+        since = request.args.get('since', type=int)
+        if since is not None:
+            page = task_result_log.read_since(since, request.args.get('generation', type=int))
         else:
-            return jsonify({'success': True, 'data': ''})
+            page = task_result_log.read_runs(limit=request.args.get('limit', 50, type=int),
+                                             before=request.args.get('before', type=int))
+        content = page.pop('content')
+        return jsonify({'success': True, 'data': content, **page})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -162,21 +242,118 @@ def save_user_tasks():
 # 任务执行相关的API接口
 @app.route('/api/task/execute_manual_task', methods=['POST'])
 def execute_manual_task():
-    """执行手动任务"""
+    """在后台执行手动任务，立即返回任务ID，通过/api/task/jobs/<job_id>查询进度和结果"""
     try:
         # 获取请求数据
         data = request.json
         task_index = data.get('task_index')
+        # 可选：本次执行的实例，为空时使用任务配置的实例
+        instances = data.get('instances')
         
-        # 调用qbit_helper中的方法执行手动任务
-        result = qbhper.execute_manual_task(task_index)
+        # 提交后台任务
+        job = qbhper.submit_manual_task(task_index, instances)
         
-        return jsonify(result)
+        return jsonify({'success': True, 'message': f'手动任务 "{job["task_name"]}" 已提交', 'job_id': job['job_id'], 'data': job}), 202
         
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': f'执行手动任务时发生错误: {str(e)}'}), 500
 
 
+@app.route('/api/task/jobs', methods=['GET'])
+def list_task_jobs():
+    """获取最近的后台任务"""
+    try:
+        return jsonify({'success': True, 'data': qbhper.task_jobs.list()})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/task/jobs/<job_id>', methods=['GET'])
+def get_task_job(job_id):
+    """获取后台任务的状态和进度（已处理/总种子数、各规则计数）"""
+    try:
+        job = qbhper.task_jobs.get(job_id)
+        if job is None:
+            return jsonify({'success': False, 'message': '任务不存在'}), 404
+        return jsonify({'success': True, 'data': job})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/task/jobs/<job_id>/result', methods=['GET'])
+def get_task_job_result(job_id):
+    """获取后台任务的最终结果，任务尚未结束时返回409"""
+    try:
+        job = qbhper.task_jobs.get(job_id, include_result=True)
+        if job is None:
+            return jsonify({'success': False, 'message': '任务不存在'}), 404
+        if job['status'] not in qbhper.task_jobs.FINISHED_STATUSES:
+            return jsonify({'success': False, 'message': '任务尚未结束', 'data': job}), 409
+        return jsonify({'success': True, 'data': job})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/task/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_task_job(job_id):
+    """取消后台任务，执行中的任务处理完当前种子后停止"""
+    try:
+        if not qbhper.task_jobs.cancel(job_id):
+            return jsonify({'success': False, 'message': '任务不存在或已结束'}), 404
+        return jsonify({'success': True, 'message': '已请求取消任务'})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/task/plan_manual_task', methods=['POST'])
+def plan_manual_task():
+    """预览任务执行结果，不修改任何种子"""
+    try:
+        data = request.json
+        task_index = data.get('task_index')
+        limit = data.get('limit', 1000)
+        instances = data.get('instances')
+        
+        result = qbhper.plan_manual_task(task_index, limit, instances)
+        
+        return jsonify({'success': True, 'data': result})
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'预览任务时发生错误: {str(e)}'}), 500
+
+
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """查询规则执行记录
+
+    查询参数：hash（种子hash）、rule（规则名称）、instance（实例名称）、limit（默认100）
+    """
+    try:
+        if qbhper.state_store is None:
+            return jsonify({'success': False, 'message': '状态存储未启用'}), 404
+        history = qbhper.state_store.query_history(instance=request.args.get('instance'),
+                                                   torrent_hash=request.args.get('hash'),
+                                                   rule_name=request.args.get('rule'),
+                                                   limit=request.args.get('limit', 100, type=int))
+        return jsonify({'success': True, 'data': history})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/scheduler/status', methods=['GET'])
+def get_scheduler_status():
+    """获取调度器状态，包括leader进程号和已调度的任务"""
+    try:
+        result = qbhper.get_scheduler_status()
+        return jsonify({'success': True, 'data': result})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
 @app.route('/api/config/test_webhooks', methods=['POST'])
 def test_webhooks():
     """测试webhook配置"""
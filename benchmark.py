@@ -0,0 +1,431 @@
+"""性能基准测试
+
+在本地启动一个模拟的qBittorrent WebUI，生成指定规模的种子库，在独立的子进程中
+运行QBitHelperBasic的典型场景，输出每个场景的耗时、API请求数和内存峰值（JSON）。
+
+用法：
+    python benchmark.py --sizes 1000,10000 --output bench.json
+    python benchmark.py --sizes 50000 --scenarios tag_task,duplicate --latency 5 --error-rate 0.01
+
+每个场景在新的子进程和临时data目录中运行，场景之间种子库恢复为初始状态。
+场景先创建QBitHelperBasic（setup，包含登录和种子镜像预热），再执行repeat次
+场景操作：第1次为冷启动（tracker列表、文件列表尚未缓存），之后为热缓存。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit, parse_qs
+
+import yaml
+
+TRACKER_HOSTS = ['tracker.alpha.org', 'pt.beta.net', 'tracker.gamma.cc', 'delta.io', 'epsilon.xyz', 'zeta.club',
+                 'eta.me', 'theta.org', 'iota.net', 'kappa.cc', 'lambda.io', 'mu.xyz']
+TAGS = [f'tag{i}' for i in range(30)]
+CATEGORIES = ['', 'movie', 'tv', 'music', 'game', 'book']
+
+
+class FakeLibrary:
+    """模拟的种子库
+
+    标签和tracker按Zipf分布选取（少数标签、tracker覆盖大部分种子），约cross_seed_ratio的种子
+    是已有种子在其他tracker上的辅种（文件相同，顶层目录名可能不同）。修改接口会更新种子并
+    记录到变化日志，sync/maindata据此返回增量数据。
+    """
+
+    def __init__(self, size: int, seed: int = 1, cross_seed_ratio: float = 0.2):
+        self.size = size
+        self.seed = seed
+        self.cross_seed_ratio = cross_seed_ratio
+        self.lock = threading.Lock()
+        self.reset()
+
+    @staticmethod
+    def _zipf_choice(rng: random.Random, items: List[str], count: int) -> List[str]:
+        weights = [1 / (rank + 1) for rank in range(len(items))]
+        chosen = []
+        while len(chosen) < min(count, len(items)):
+            item = rng.choices(items, weights)[0]
+            if item not in chosen:
+                chosen.append(item)
+        return chosen
+
+    def reset(self):
+        """按种子值重新生成初始种子库"""
+        rng = random.Random(self.seed)
+        with self.lock:
+            self.torrents: Dict[str, Dict[str, Any]] = {}
+            self.trackers: Dict[str, List[Dict[str, Any]]] = {}
+            self.files: Dict[str, List[Dict[str, Any]]] = {}
+            # 与qBittorrent一致，首次同步返回的rid不为0，客户端之后的请求才能得到增量数据
+            self.rid = 1
+            # rid -> (变化的种子, 删除的种子)
+            self.changes: Dict[int, tuple] = {}
+            originals = []
+            for i in range(self.size):
+                torrent_hash = f'{rng.getrandbits(160):040x}'
+                if originals and rng.random() < self.cross_seed_ratio:
+                    # 辅种：与已有种子内容相同，tracker不同，部分顶层目录名不同
+                    source = rng.choice(originals)
+                    name = source['name'] if rng.random() < 0.7 else f"{source['name']}.{rng.randint(1, 99)}"
+                    files = [dict(f, name=name + f['name'][len(source['name']):]) for f in self.files[source['hash']]]
+                    size = source['size']
+                else:
+                    name = f'Torrent.{i}.{rng.choice(["1080p", "2160p", "FLAC", "EPUB"])}'
+                    file_count = rng.choice([1, 1, 1, 2, 3, 8])
+                    files = [{'name': f'{name}/file{j}.bin', 'size': rng.randint(1, 8 * 1024 ** 3)}
+                             for j in range(file_count)]
+                    size = sum(f['size'] for f in files)
+                hosts = self._zipf_choice(rng, TRACKER_HOSTS, rng.choice([1, 1, 2, 2, 3]))
+                trackers = [{'url': f'** [{kind}] **', 'status': 0, 'msg': '', 'tier': -1}
+                            for kind in ('DHT', 'PeX', 'LSD')]
+                trackers += [{'url': f'https://{host}/announce?passkey={i:08x}', 'status': rng.choice([2, 2, 2, 2, 4]),
+                              'msg': '', 'tier': 0} for host in hosts]
+                torrent = {
+                    'hash': torrent_hash, 'name': name, 'save_path': f'/downloads/{rng.choice(CATEGORIES) or "misc"}/',
+                    'size': size, 'total_size': size, 'progress': 1, 'state': 'stalledUP',
+                    'category': rng.choice(CATEGORIES),
+                    'tags': ', '.join(self._zipf_choice(rng, TAGS, rng.choice([0, 1, 1, 2, 3]))),
+                    'tracker': trackers[3]['url'] if trackers[3]['status'] == 2 else '',
+                    'trackers_count': len(hosts), 'comment': '', 'added_on': 1700000000 + i, 'ratio': rng.random() * 3,
+                }
+                self.torrents[torrent_hash] = torrent
+                self.trackers[torrent_hash] = trackers
+                self.files[torrent_hash] = [dict(f, index=j, progress=1, priority=1) for j, f in enumerate(files)]
+                originals.append(torrent)
+
+    def touch(self, changed=(), removed=()):
+        self.rid += 1
+        self.changes[self.rid] = (set(changed), set(removed))
+        # 只保留最近的变化记录，过旧的rid返回全量数据
+        self.changes.pop(self.rid - 1000, None)
+
+    def maindata(self, rid: int) -> Dict[str, Any]:
+        if rid == 0 or rid > self.rid or (rid < self.rid and rid + 1 not in self.changes):
+            return {'rid': self.rid, 'full_update': True,
+                    'torrents': {h: {k: v for k, v in t.items() if k != 'hash'} for h, t in self.torrents.items()},
+                    'categories': {c: {'name': c, 'savePath': ''} for c in CATEGORIES if c}, 'tags': TAGS,
+                    'server_state': {}}
+        changed, removed = set(), set()
+        for r in range(rid + 1, self.rid + 1):
+            changed |= self.changes[r][0]
+            removed |= self.changes[r][1]
+        return {'rid': self.rid,
+                'torrents': {h: {k: v for k, v in self.torrents[h].items() if k != 'hash'}
+                             for h in changed if h in self.torrents},
+                'torrents_removed': sorted(removed)}
+
+    def edit_tags(self, hashes: List[str], tags: List[str], add: bool):
+        for torrent_hash in hashes:
+            torrent = self.torrents.get(torrent_hash)
+            if torrent is None:
+                continue
+            current = [t for t in torrent['tags'].split(', ') if t]
+            for tag in tags:
+                if add and tag not in current:
+                    current.append(tag)
+                elif not add and tag in current:
+                    current.remove(tag)
+            torrent['tags'] = ', '.join(current)
+        self.touch(changed=hashes)
+
+    def edit_trackers(self, torrent_hash: str, urls: List[str], add: bool):
+        trackers = self.trackers.get(torrent_hash)
+        if trackers is None:
+            return
+        if add:
+            trackers.extend({'url': url, 'status': 1, 'msg': '', 'tier': 0} for url in urls
+                            if url not in [t['url'] for t in trackers])
+        else:
+            trackers[:] = [t for t in trackers if t['url'] not in urls]
+        self.torrents[torrent_hash]['trackers_count'] = len(trackers) - 3
+        self.touch(changed=[torrent_hash])
+
+
+class FakeQBittorrentHandler(BaseHTTPRequestHandler):
+    """模拟qBittorrent WebUI API v2的请求处理
+
+    server上的latency（秒）、jitter（秒）和error_rate（0~1）用于注入延迟和HTTP 500错误，
+    登录接口不注入错误。/_bench/stats返回各接口的请求数，/_bench/reset_stats清零。
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _params(self) -> Dict[str, str]:
+        params = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+        if self.command == 'POST':
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8')
+            params.update({k: v[0] for k, v in parse_qs(body).items()})
+        return params
+
+    def _send(self, code: int, body: Any = '', content_type: str = 'text/plain'):
+        if not isinstance(body, (str, bytes)):
+            body, content_type = json.dumps(body), 'application/json'
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        if self.path.startswith('/api/v2/auth/login'):
+            self.send_header('Set-Cookie', 'SID=benchmark; path=/')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self):
+        server = self.server
+        endpoint = urlsplit(self.path).path.replace('/api/v2/', '', 1).lstrip('/')
+        params = self._params()
+        if endpoint.startswith('_bench/'):
+            return self._handle_control(endpoint)
+        with server.stats_lock:
+            server.stats[endpoint] = server.stats.get(endpoint, 0) + 1
+        if server.latency or server.jitter:
+            time.sleep(server.latency + random.random() * server.jitter)
+        if endpoint != 'auth/login' and server.error_rate and random.random() < server.error_rate:
+            return self._send(500, 'injected error')
+        library: FakeLibrary = server.library
+        with library.lock:
+            if endpoint == 'auth/login':
+                return self._send(200, 'Ok.')
+            if endpoint == 'app/version':
+                return self._send(200, 'v4.6.7')
+            if endpoint == 'app/webapiVersion':
+                return self._send(200, '2.9.3')
+            if endpoint == 'sync/maindata':
+                return self._send(200, library.maindata(int(params.get('rid', 0))))
+            if endpoint == 'torrents/info':
+                return self._send(200, list(library.torrents.values()))
+            if endpoint == 'torrents/trackers':
+                return self._send(200, library.trackers.get(params.get('hash', ''), []))
+            if endpoint == 'torrents/files':
+                return self._send(200, library.files.get(params.get('hash', ''), []))
+            if endpoint in ('torrents/addTags', 'torrents/removeTags'):
+                library.edit_tags(params.get('hashes', '').split('|'), params.get('tags', '').split(','),
+                                  endpoint == 'torrents/addTags')
+                return self._send(200)
+            if endpoint in ('torrents/addTrackers', 'torrents/removeTrackers'):
+                separator = '\n' if endpoint == 'torrents/addTrackers' else '|'
+                library.edit_trackers(params.get('hash', ''), params.get('urls', '').split(separator),
+                                      endpoint == 'torrents/addTrackers')
+                return self._send(200)
+        return self._send(404, 'Not Found')
+
+    def _handle_control(self, endpoint: str):
+        server = self.server
+        with server.stats_lock:
+            stats = dict(server.stats)
+            if endpoint == '_bench/reset_stats':
+                server.stats.clear()
+        self._send(200, stats)
+
+
+def start_fake_server(library: FakeLibrary, latency: float = 0.0, jitter: float = 0.0,
+                      error_rate: float = 0.0) -> ThreadingHTTPServer:
+    """在后台线程中启动模拟的qBittorrent WebUI，监听127.0.0.1的随机端口"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeQBittorrentHandler)
+    server.daemon_threads = True
+    server.library = library
+    server.latency = latency
+    server.jitter = jitter
+    server.error_rate = error_rate
+    server.stats = {}
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# 场景名称 -> (说明, 规则列表)，规则为空的场景直接调用对应方法
+SCENARIOS = {
+    'dashboard': ('仪表板信息（所有种子的tracker状态、分类和标签统计）', None),
+    'init_torrent_dict': ('获取文件列表并初始化辅种字典', None),
+    'tag_task': ('按tracker添加标签、移除已有标签', [
+        {'rule_name': 'bench_tag_add', 'rule_type': 'tag_opt', 'priority': 1, 'opt_type': 'add',
+         'trackers': 'tracker.alpha.org|pt.beta.net', 'tag': 'bench'},
+        {'rule_name': 'bench_tag_remove', 'rule_type': 'tag_opt', 'priority': 2, 'opt_type': 'remove',
+         'trackers': '', 'tag': 'tag3'},
+    ]),
+    'tracker_task': ('为指定标签和tracker的种子添加tracker', [
+        {'rule_name': 'bench_tracker_add', 'rule_type': 'tracker_opt', 'priority': 1, 'opt_type': 'add',
+         'tags': 'tag1', 'trackers': 'delta.io', 'tracker': 'https://bench.example/announce'},
+    ]),
+    'duplicate': ('标记辅种', [
+        {'rule_name': 'bench_duplicate', 'rule_type': 'duplicate_tag_opt', 'priority': 1, 'opt_type': 'add'},
+    ]),
+}
+
+
+def _bench_request(port: int, endpoint: str) -> Dict[str, int]:
+    import requests
+    return requests.get(f'http://127.0.0.1:{port}/_bench/{endpoint}', timeout=30).json()
+
+
+def _run_scenario(scenario: str, port: int, options: Dict[str, Any], result_queue):
+    """子进程：在临时data目录中创建QBitHelperBasic并执行场景，结果放入result_queue"""
+    try:
+        work_dir = tempfile.mkdtemp(prefix='qbit-helper-bench-')
+        os.chdir(work_dir)
+        os.makedirs('data')
+        rules = SCENARIOS[scenario][1] or []
+        # 以示例配置的默认值为基础，只覆盖基准测试相关的配置
+        with open(os.path.join(options['repo_dir'], 'data', 'config_example.yaml'), 'r', encoding='utf-8') as f:
+            default_config = (yaml.safe_load(f) or {}).get('default', {})
+        default_config['logging'] = {'filename': 'benchmark.log', 'level': 'WARNING'}
+        default_config['dashboard'] = {'refresh_interval': 0}
+        default_config.setdefault('execution', {})['workers'] = options['workers']
+        default_config.setdefault('incremental', {})['enabled'] = options['incremental']
+        default_config.setdefault('rate_limit', {})['enabled'] = options['rate_limit']
+        config = {
+            'default': default_config,
+            'user_config': {'qbittorrent': {'host': f'http://127.0.0.1:{port}', 'username': 'admin', 'password': 'admin'}},
+            'user_rules': rules,
+            'user_tasks': [],
+        }
+        with open(os.path.join('data', 'config.yaml'), 'w', encoding='utf-8') as f:
+            yaml.safe_dump(config, f, allow_unicode=True)
+        sys.path.insert(0, options['repo_dir'])
+        if options['tracemalloc']:
+            tracemalloc.start()
+
+        steps = []
+
+        def measure(name: str, func):
+            _bench_request(port, 'reset_stats')
+            if options['tracemalloc']:
+                tracemalloc.reset_peak()
+            start_time = time.perf_counter()
+            error = None
+            try:
+                func()
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+            wall = time.perf_counter() - start_time
+            api_calls = _bench_request(port, 'stats')
+            step = {'step': name, 'wall_s': round(wall, 4), 'api_calls': sum(api_calls.values()),
+                    'api_calls_by_endpoint': api_calls}
+            if options['tracemalloc']:
+                step['python_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 2)
+            if error:
+                step['error'] = error
+            steps.append(step)
+
+        helper = {}
+
+        def setup():
+            import qbit_helper
+            helper['h'] = qbit_helper.QBitHelperBasic(os.path.join('data', 'config.yaml'))
+
+        measure('setup', setup)
+        h = helper['h']
+        for i in range(options['repeat']):
+            if scenario == 'dashboard':
+                func = h.get_dashboard_info
+            elif scenario == 'init_torrent_dict':
+                func = lambda: h.init_torrent_dict(fetch_file_lists=True)
+            else:
+                func = lambda: h.opt_all_torrent(rules)
+            measure('cold' if i == 0 else f'warm{i}', func)
+        result_queue.put({'steps': steps, 'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)})
+    except Exception as e:
+        result_queue.put({'error': f'{type(e).__name__}: {e}'})
+
+
+def run_benchmarks(sizes: List[int], scenarios: List[str], repeat: int = 2, latency_ms: float = 0.0,
+                   jitter_ms: float = 0.0, error_rate: float = 0.0, seed: int = 1, workers: int = 1,
+                   incremental: bool = False, rate_limit: bool = True, use_tracemalloc: bool = False,
+                   timeout: Optional[float] = None) -> Dict[str, Any]:
+    """按规模和场景运行基准测试，返回可序列化为JSON的结果"""
+    context = multiprocessing.get_context('spawn')
+    options = {'repeat': repeat, 'workers': workers, 'incremental': incremental, 'rate_limit': rate_limit,
+               'tracemalloc': use_tracemalloc,
+               'repo_dir': os.path.dirname(os.path.abspath(__file__))}
+    results = []
+    for size in sizes:
+        start_time = time.perf_counter()
+        library = FakeLibrary(size, seed=seed)
+        print(f'生成 {size} 个种子的种子库，耗时 {time.perf_counter() - start_time:.1f}s', file=sys.stderr)
+        server = start_fake_server(library, latency_ms / 1000, jitter_ms / 1000, error_rate)
+        try:
+            for scenario in scenarios:
+                library.reset()
+                result_queue = context.Queue()
+                process = context.Process(target=_run_scenario,
+                                          args=(scenario, server.server_address[1], options, result_queue))
+                process.start()
+                try:
+                    result = result_queue.get(timeout=timeout)
+                except Exception:
+                    process.kill()
+                    result = {'error': '超时'}
+                process.join()
+                result = {'scenario': scenario, 'torrents': size, **result}
+                results.append(result)
+                summary = '，'.join(f"{step['step']} {step['wall_s']:.2f}s/{step['api_calls']}次请求"
+                                   for step in result.get('steps', []))
+                print(f"[{size}] {scenario}: {summary or result.get('error')}"
+                      f"，内存峰值 {result.get('peak_rss_mb', '-')}MB", file=sys.stderr)
+        finally:
+            server.shutdown()
+            server.server_close()
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'config': {'sizes': sizes, 'scenarios': scenarios, 'repeat': repeat, 'latency_ms': latency_ms,
+                   'jitter_ms': jitter_ms, 'error_rate': error_rate, 'seed': seed, 'workers': workers,
+                   'incremental': incremental, 'rate_limit': rate_limit},
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='qBittorrent助手性能基准测试')
+    parser.add_argument('--sizes', default='1000,10000', help='种子库规模，逗号分隔，如1000,10000,200000')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"场景，逗号分隔，可选：{', '.join(SCENARIOS)}")
+    parser.add_argument('--repeat', type=int, default=2, help='每个场景执行的次数，第1次为冷启动')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求注入的延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='在延迟上随机增加0~jitter毫秒')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='请求返回HTTP 500的比例（0~1）')
+    parser.add_argument('--seed', type=int, default=1, help='生成种子库的随机数种子')
+    parser.add_argument('--workers', type=int, default=1, help='规则执行的线程数（default.execution.workers）')
+    parser.add_argument('--incremental', action='store_true', help='开启增量模式（default.incremental.enabled）')
+    parser.add_argument('--no-rate-limit', action='store_true', help='关闭WebUI请求限速（default.rate_limit.enabled）')
+    parser.add_argument('--tracemalloc', action='store_true', help='使用tracemalloc记录每一步的Python内存峰值（较慢）')
+    parser.add_argument('--timeout', type=float, default=None, help='单个场景的超时时间（秒）')
+    parser.add_argument('--output', help='结果JSON文件，默认输出到标准输出')
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知的场景：{', '.join(unknown)}")
+    report = run_benchmarks([int(s) for s in args.sizes.split(',') if s.strip()], scenarios, repeat=args.repeat,
+                            latency_ms=args.latency, jitter_ms=args.jitter, error_rate=args.error_rate,
+                            seed=args.seed, workers=args.workers, incremental=args.incremental,
+                            rate_limit=not args.no_rate_limit,
+                            use_tracemalloc=args.tracemalloc, timeout=args.timeout)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,17 +3,37 @@ import logging
 import yaml
 import time
 import json
+import hashlib
+import threading
+import uuid
+import functools
+import contextvars
+import re
+import sqlite3
+import heapq
+import itertools
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from dataclasses import dataclass, field
-from typing import List, Any, Dict, Optional, Set
+from datetime import datetime
+from typing import List, Any, Dict, Iterable, Optional, Set, Tuple
+from urllib.parse import urlsplit
 import qbittorrentapi
 from serverchan_sdk import sc_send
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from apscheduler.jobstores.base import ConflictingIdError
+from apscheduler.events import EVENT_JOB_SUBMITTED
 import atexit
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，仅使用进程内锁
+    fcntl = None
 
 # 应用版本号
 APP_VERSION = "Pre Release v0.1.0"
+# 未配置名称时默认实例的名称
+DEFAULT_INSTANCE_NAME = "默认"
 
 # 数据类定义
 @dataclass
@@ -36,6 +56,2401 @@ class DashboardInfo:
     category_counts: Dict[str, int]
     tag_counts: Dict[str, int]
     non_working_trackers_detail: List[Dict[str, str]]
+    # 各实例WebUI请求的当前速率（次/秒）：实例名称 -> 预算 -> 速率
+    request_rates: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    @classmethod
+    def merge(cls, infos: Iterable['DashboardInfo']) -> 'DashboardInfo':
+        """合并多个qBittorrent实例的仪表板信息"""
+        merged = cls(total_torrents=0, total_trackers=0, non_working_trackers=0,
+                     category_counts={}, tag_counts={}, non_working_trackers_detail=[])
+        for info in infos:
+            merged.total_torrents += info.total_torrents
+            merged.total_trackers += info.total_trackers
+            merged.non_working_trackers += info.non_working_trackers
+            for category, count in info.category_counts.items():
+                merged.category_counts[category] = merged.category_counts.get(category, 0) + count
+            for tag, count in info.tag_counts.items():
+                merged.tag_counts[tag] = merged.tag_counts.get(tag, 0) + count
+            merged.non_working_trackers_detail.extend(info.non_working_trackers_detail)
+            merged.request_rates.update(info.request_rates)
+        return merged
+
+@dataclass
+class DashboardSnapshot:
+    """仪表板信息快照数据类，info为所有实例的汇总，instances为各实例的信息"""
+    info: DashboardInfo
+    version: str
+    updated_at: float
+    refresh_duration: float
+    instances: Dict[str, DashboardInfo] = field(default_factory=dict)
+
+class KeywordMatcher:
+    """多关键字子串匹配器
+
+    关键字较少时逐个使用子串查找；关键字数量达到AUTOMATON_THRESHOLD时构建
+    Aho-Corasick自动机，对文本只扫描一遍。构建完成后不再修改，可在多个线程中共享。
+    """
+    AUTOMATON_THRESHOLD = 64
+
+    def __init__(self, keywords: List[str]):
+        # 去重并保持原有顺序
+        self.keywords: Tuple[str, ...] = tuple(dict.fromkeys(k for k in keywords if k))
+        self._goto: List[Dict[str, int]] = []
+        self._fail: List[int] = []
+        self._output: List[bool] = []
+        if len(self.keywords) >= self.AUTOMATON_THRESHOLD:
+            self._build_automaton()
+
+    def _build_automaton(self):
+        """构建Aho-Corasick自动机：goto表、失配指针和输出标记"""
+        goto: List[Dict[str, int]] = [{}]
+        output = [False]
+        for keyword in self.keywords:
+            node = 0
+            for char in keyword:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto.append({})
+                    output.append(False)
+                    goto[node][char] = next_node
+                node = next_node
+            output[node] = True
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, next_node in goto[node].items():
+                queue.append(next_node)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[next_node] = goto[state].get(char, 0)
+                # 失配指针指向的状态是输出状态时，当前状态也是输出状态
+                output[next_node] = output[next_node] or output[fail[next_node]]
+
+        self._goto, self._fail, self._output = goto, fail, output
+
+    def search(self, text: str) -> bool:
+        """文本中是否包含任一关键字"""
+        if not self._goto:
+            return any(keyword in text for keyword in self.keywords)
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                return True
+        return False
+
+    def search_any(self, texts) -> bool:
+        """多段文本中是否有任一段包含任一关键字"""
+        return any(self.search(text) for text in texts)
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """预编译的规则
+
+    匹配条件在编译时拆分为关键字匹配器，条件为空时对应匹配器为None，表示该条件
+    视为匹配成功。通过get方法保持与规则字典相同的读取方式。
+    """
+    rule_name: str
+    rule_type: str
+    priority: Any
+    opt_type: str
+    tracker_matcher: Optional[KeywordMatcher]
+    tag_matcher: Optional[KeywordMatcher]
+    rule: Dict[str, Any] = field(hash=False, compare=False)
+    # 规则定义的版本（不含index），规则被修改后版本变化
+    version: str = ''
+
+    @classmethod
+    def compile(cls, rule: Dict[str, Any]) -> 'CompiledRule':
+        """将规则字典编译为CompiledRule"""
+        def build_matcher(match_string) -> Optional[KeywordMatcher]:
+            if not match_string:
+                return None
+            return KeywordMatcher([k.strip() for k in match_string.split('|') if k.strip()])
+
+        # 处理标签规则时只使用tracker条件，与tag_opt_rule_check保持一致
+        rule_type = rule.get('rule_type', '')
+        return cls(
+            rule_name=rule.get('rule_name', '未命名规则'),
+            rule_type=rule_type,
+            priority=rule.get('priority', 0),
+            opt_type=rule.get('opt_type', ''),
+            tracker_matcher=build_matcher(rule.get('trackers', '')),
+            tag_matcher=build_matcher(rule.get('tags', '')) if rule_type != 'tag_opt' else None,
+            rule=dict(rule),
+            version=cls.rule_version(rule)
+        )
+
+    @staticmethod
+    def rule_version(rule: Dict[str, Any]) -> str:
+        """根据规则定义（不含index）计算规则版本"""
+        definition = json.dumps({key: value for key, value in rule.items() if key != 'index'},
+                                sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(definition.encode('utf-8')).hexdigest()[:16]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.rule.get(key, default)
+
+class TorrentIndex:
+    """从tracker主机名、tracker URL和标签到种子hash集合的倒排索引
+
+    标签索引随种子镜像刷新增量维护，tracker索引在tracker缓存获取列表时更新。
+    规则的关键字是对完整URL的子串匹配，因此候选集合按URL计算，主机名索引
+    用于按主机直接查询。尚未获取tracker列表的种子总是作为候选，保证剪枝不会漏掉种子。
+    """
+    def __init__(self):
+        self.tag_hashes: Dict[str, Set[str]] = {}
+        self.tracker_url_hashes: Dict[str, Set[str]] = {}
+        self.tracker_host_hashes: Dict[str, Set[str]] = {}
+        self._torrent_tags: Dict[str, Tuple[str, ...]] = {}
+        self._torrent_tracker_urls: Dict[str, Tuple[str, ...]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _tracker_host(url: str) -> str:
+        try:
+            return urlsplit(url).hostname or url
+        except ValueError:
+            return url
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], key: str, torrent_hash: str):
+        hashes = index.get(key)
+        if hashes is not None:
+            hashes.discard(torrent_hash)
+            if not hashes:
+                del index[key]
+
+    def _set_tags(self, torrent_hash: str, tags: Tuple[str, ...]):
+        old_tags = self._torrent_tags.get(torrent_hash, ())
+        if old_tags == tags:
+            return
+        for tag in old_tags:
+            self._discard(self.tag_hashes, tag, torrent_hash)
+        for tag in tags:
+            self.tag_hashes.setdefault(tag, set()).add(torrent_hash)
+        self._torrent_tags[torrent_hash] = tags
+
+    def _set_tracker_urls(self, torrent_hash: str, urls: Tuple[str, ...]):
+        old_urls = self._torrent_tracker_urls.get(torrent_hash)
+        if old_urls == urls:
+            return
+        for url in old_urls or ():
+            self._discard(self.tracker_url_hashes, url, torrent_hash)
+            self._discard(self.tracker_host_hashes, self._tracker_host(url), torrent_hash)
+        for url in urls:
+            self.tracker_url_hashes.setdefault(url, set()).add(torrent_hash)
+            self.tracker_host_hashes.setdefault(self._tracker_host(url), set()).add(torrent_hash)
+        self._torrent_tracker_urls[torrent_hash] = urls
+
+    def update_tags(self, torrent_hash: str, tags: str):
+        """更新种子的标签，tags为qBittorrent返回的逗号分隔字符串"""
+        tag_tuple = tuple(dict.fromkeys(t.strip() for t in (tags or '').split(',') if t.strip()))
+        with self._lock:
+            self._set_tags(torrent_hash, tag_tuple)
+
+    def update_trackers(self, torrent_hash: str, trackers: List[Any]):
+        """更新种子的tracker URL"""
+        urls = tuple(dict.fromkeys(tracker.url for tracker in trackers))
+        with self._lock:
+            self._set_tracker_urls(torrent_hash, urls)
+
+    def discard_trackers(self, torrent_hash: str):
+        """移除种子的tracker索引，该种子将总是作为tracker条件的候选"""
+        with self._lock:
+            self._set_tracker_urls(torrent_hash, ())
+            self._torrent_tracker_urls.pop(torrent_hash, None)
+
+    def remove(self, torrent_hash: str):
+        """从索引中移除种子"""
+        with self._lock:
+            self._set_tags(torrent_hash, ())
+            self._set_tracker_urls(torrent_hash, ())
+            self._torrent_tags.pop(torrent_hash, None)
+            self._torrent_tracker_urls.pop(torrent_hash, None)
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self.tag_hashes = {}
+            self.tracker_url_hashes = {}
+            self.tracker_host_hashes = {}
+            self._torrent_tags = {}
+            self._torrent_tracker_urls = {}
+
+    def hashes_for_tag(self, tag: str) -> Set[str]:
+        """获取带有指定标签的种子hash集合"""
+        with self._lock:
+            return set(self.tag_hashes.get(tag, ()))
+
+    def hashes_for_tracker_host(self, host: str) -> Set[str]:
+        """获取使用指定tracker主机的种子hash集合"""
+        with self._lock:
+            return set(self.tracker_host_hashes.get(host, ()))
+
+    def match_tags(self, matcher: 'KeywordMatcher') -> Set[str]:
+        """获取任一标签被匹配器匹配到的种子hash集合"""
+        with self._lock:
+            hashes = set()
+            for tag, tag_hashes in self.tag_hashes.items():
+                if matcher.search(tag):
+                    hashes |= tag_hashes
+            return hashes
+
+    def match_trackers(self, matcher: 'KeywordMatcher', torrent_hashes: Iterable[str]) -> Set[str]:
+        """获取可能被tracker匹配器匹配到的种子hash集合
+
+        Args:
+            matcher: 关键字匹配器
+            torrent_hashes: 当前全部种子的hash，其中尚未索引tracker的种子总是作为候选
+        """
+        with self._lock:
+            hashes = {h for h in torrent_hashes if h not in self._torrent_tracker_urls}
+            for url, url_hashes in self.tracker_url_hashes.items():
+                if matcher.search(url):
+                    hashes |= url_hashes
+            return hashes
+
+class TorrentMirror:
+    """基于 sync/maindata 增量接口的种子镜像
+
+    首次刷新时获取全量数据，之后只携带上次返回的rid请求增量数据。
+    种子对象创建后不再修改：变化的种子合并增量字段后替换为新的对象，正在执行的任务
+    持有的种子对象不会被后台刷新（如仪表板快照刷新）改变。
+    """
+    def __init__(self, qbit_client, logger):
+        self.qbit_client = qbit_client
+        self.logger = logger
+        self.rid = 0
+        self.torrents: Dict[str, Any] = {}
+        self.last_refresh = 0.0
+        self.index = TorrentIndex()
+        self._lock = threading.Lock()
+
+    def refresh(self) -> Set[str]:
+        """从qBittorrent拉取增量数据并合并到镜像中
+
+        Returns:
+            Set[str]: 本次新增、变化或删除的种子hash集合
+        """
+        with self._lock:
+            try:
+                maindata = self.qbit_client.sync_maindata(rid=self.rid)
+            except Exception:
+                # 增量同步失败时，下次刷新重新获取全量数据
+                self.rid = 0
+                raise
+
+            changed = set()
+            if maindata.get('full_update'):
+                changed.update(self.torrents.keys())
+                self.torrents = {}
+
+            for torrent_hash in maindata.get('torrents_removed', None) or []:
+                if self.torrents.pop(torrent_hash, None) is not None:
+                    changed.add(torrent_hash)
+
+            for torrent_hash, delta in (maindata.get('torrents', None) or {}).items():
+                torrent = self.torrents.get(torrent_hash)
+                self.torrents[torrent_hash] = qbittorrentapi.TorrentDictionary(
+                    {**(torrent or {}), **delta, 'hash': torrent_hash}, client=self.qbit_client)
+                changed.add(torrent_hash)
+
+            # 同步维护倒排索引中的标签
+            for torrent_hash in changed:
+                torrent = self.torrents.get(torrent_hash)
+                if torrent is None:
+                    self.index.remove(torrent_hash)
+                else:
+                    self.index.update_tags(torrent_hash, torrent.get('tags', ''))
+
+            self.rid = maindata.get('rid', 0)
+            self.last_refresh = time.time()
+            self.logger.debug(f"种子镜像已刷新，rid={self.rid}，变化种子数：{len(changed)}")
+            return changed
+
+    def get_torrents(self, refresh: bool = True) -> List[Any]:
+        """获取镜像中的种子列表
+
+        Args:
+            refresh: 是否先拉取增量数据
+        """
+        if refresh:
+            self.refresh()
+        with self._lock:
+            return list(self.torrents.values())
+
+    def reset(self):
+        """清空镜像，下次刷新将重新获取全量数据"""
+        with self._lock:
+            self.rid = 0
+            self.torrents = {}
+            self.index.clear()
+
+class TrackerCache:
+    """按种子hash缓存tracker列表
+
+    缓存项记录获取时种子的trackers_count和tracker字段，这两个字段变化、
+    缓存超过有效期或被显式失效时重新获取。批量预取时并发请求缺失的种子。
+    """
+    def __init__(self, qbit_client, logger, max_workers: int = 8, ttl: float = 600, index: Optional[TorrentIndex] = None):
+        self.qbit_client = qbit_client
+        self.logger = logger
+        self.index = index
+        self.max_workers = max(1, int(max_workers))
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[Tuple[Any, Any], float, List[Any]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fingerprint(torrent) -> Tuple[Any, Any]:
+        return (torrent.get('trackers_count'), torrent.get('tracker'))
+
+    def _is_fresh(self, torrent) -> bool:
+        entry = self._entries.get(torrent.hash)
+        if entry is None:
+            return False
+        fingerprint, fetched_at, _ = entry
+        if fingerprint != self._fingerprint(torrent):
+            return False
+        return not self.ttl or time.time() - fetched_at < self.ttl
+
+    def _fetch(self, torrent) -> List[Any]:
+        trackers = self.qbit_client.torrents_trackers(torrent_hash=torrent.hash)
+        with self._lock:
+            self._entries[torrent.hash] = (self._fingerprint(torrent), time.time(), trackers)
+        if self.index is not None:
+            self.index.update_trackers(torrent.hash, trackers)
+        return trackers
+
+    def get(self, torrent) -> List[Any]:
+        """获取单个种子的tracker列表，缓存失效时重新获取"""
+        with self._lock:
+            if self._is_fresh(torrent):
+                return self._entries[torrent.hash][2]
+        return self._fetch(torrent)
+
+    def prefetch(self, torrents: List[Any], hashes: Optional[Set[str]] = None):
+        """并发获取所有缓存缺失或失效的种子的tracker列表
+
+        Args:
+            torrents: 当前所有种子，不在其中的缓存项被清理
+            hashes: 只获取这些种子的tracker列表，为空时获取所有种子的
+        """
+        with self._lock:
+            current_hashes = {torrent.hash for torrent in torrents}
+            # 清理已不存在的种子
+            for torrent_hash in [h for h in self._entries if h not in current_hashes]:
+                del self._entries[torrent_hash]
+            missing = [torrent for torrent in torrents
+                       if (hashes is None or torrent.hash in hashes) and not self._is_fresh(torrent)]
+        if not missing:
+            return
+        self.logger.debug(f"并发获取 {len(missing)} 个种子的tracker列表")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [RunTiming.submit(executor, self._fetch, torrent) for torrent in missing]
+            for torrent, future in zip(missing, futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    if self.index is not None:
+                        self.index.discard_trackers(torrent.hash)
+                    self.logger.error(f"获取种子 {torrent.name} 的tracker列表失败: {str(e)}")
+
+    def peek(self, torrent_hash: str) -> Optional[List[Any]]:
+        """获取已缓存的tracker列表，不发起请求，未缓存时返回None"""
+        with self._lock:
+            entry = self._entries.get(torrent_hash)
+        return entry[2] if entry is not None else None
+
+    def invalidate(self, torrent_hash: str):
+        """使单个种子的缓存失效"""
+        with self._lock:
+            self._entries.pop(torrent_hash, None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries = {}
+
+class FileListCache:
+    """按种子hash持久化缓存种子内容指纹
+
+    内容指纹由种子的文件列表（去掉顶层目录后的相对路径和大小）计算得到，同一内容的辅种
+    即使顶层目录名不同也有相同的指纹。同一hash的文件列表不会变化，因此指纹追加写入
+    JSONL文件后长期有效，只需为新的种子获取文件列表。文件中已不存在的种子的记录超过
+    有效记录数时重写文件。尚未获取到元数据（文件列表为空）的种子不缓存。
+    """
+
+    def __init__(self, qbit_client, logger, path: str, max_workers: int = 8):
+        self.qbit_client = qbit_client
+        self.logger = logger
+        self.path = path
+        self.max_workers = max(1, int(max_workers))
+        self._fingerprints: Dict[str, str] = {}
+        self._stale_records = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """加载缓存文件，跳过损坏的记录，缓存文件损坏时只会丢失部分指纹"""
+        try:
+            with open(self.path, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if not isinstance(record, dict) or not isinstance(record.get('hash'), str) \
+                            or not isinstance(record.get('fingerprint'), str):
+                        # 计入过期记录，下次重写文件时清除
+                        self._stale_records += 1
+                        continue
+                    if record['hash'] in self._fingerprints:
+                        self._stale_records += 1
+                    self._fingerprints[record['hash']] = record['fingerprint']
+        except OSError:
+            return
+        self.logger.info(f"已加载 {len(self._fingerprints)} 个种子的内容指纹缓存")
+
+    @staticmethod
+    def fingerprint(files: List[Any]) -> Optional[str]:
+        """根据文件列表计算内容指纹，文件列表为空时返回None"""
+        entries = [(str(file.get('name', '')).replace('\\', '/'), int(file.get('size', 0))) for file in files]
+        if not entries:
+            return None
+        # 多文件种子去掉共同的顶层目录，使目录名不同的辅种指纹相同
+        roots = {name.split('/', 1)[0] for name, _ in entries}
+        if len(roots) == 1 and all('/' in name for name, _ in entries):
+            entries = [(name.split('/', 1)[1], size) for name, size in entries]
+        payload = '\n'.join(f"{name}\0{size}" for name, size in sorted(entries))
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def get(self, torrent_hash: str) -> Optional[str]:
+        """获取已缓存的内容指纹，未缓存时返回None"""
+        return self._fingerprints.get(torrent_hash)
+
+    def _fetch(self, torrent) -> Optional[str]:
+        return self.fingerprint(self.qbit_client.torrents_files(torrent_hash=torrent.hash))
+
+    def _append(self, fingerprints: Dict[str, str]):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(''.join(json.dumps({'hash': torrent_hash, 'fingerprint': fingerprint}) + '\n'
+                            for torrent_hash, fingerprint in fingerprints.items()))
+
+    def _compact(self):
+        """重写缓存文件，只保留当前存在的种子"""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for torrent_hash, fingerprint in self._fingerprints.items():
+                f.write(json.dumps({'hash': torrent_hash, 'fingerprint': fingerprint}) + '\n')
+        os.replace(tmp_path, self.path)
+        self._stale_records = 0
+
+    def prefetch(self, torrents: List[Any], fetch_missing: bool = True):
+        """为尚未缓存的种子并发获取文件列表并计算指纹，同时清理已不存在的种子
+
+        Args:
+            torrents: 当前所有种子
+            fetch_missing: 为False时只清理，不获取新的文件列表
+        """
+        with self._lock:
+            current_hashes = {torrent.hash for torrent in torrents}
+            removed = [h for h in self._fingerprints if h not in current_hashes]
+            for torrent_hash in removed:
+                del self._fingerprints[torrent_hash]
+            self._stale_records += len(removed)
+            missing = [torrent for torrent in torrents if torrent.hash not in self._fingerprints] if fetch_missing else []
+        fetched: Dict[str, str] = {}
+        if missing:
+            self.logger.info(f"并发获取 {len(missing)} 个新种子的文件列表")
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [RunTiming.submit(executor, self._fetch, torrent) for torrent in missing]
+                for torrent, future in zip(missing, futures):
+                    try:
+                        fingerprint = future.result()
+                    except Exception as e:
+                        self.logger.error(f"获取种子 {torrent.name} 的文件列表失败: {str(e)}")
+                        continue
+                    if fingerprint is not None:
+                        fetched[torrent.hash] = fingerprint
+        with self._lock:
+            self._fingerprints.update(fetched)
+            try:
+                if self._stale_records > max(len(self._fingerprints), 1000):
+                    self._compact()
+                elif fetched:
+                    self._append(fetched)
+            except OSError as e:
+                self.logger.error(f"写入内容指纹缓存失败: {str(e)}")
+
+class MutationBuffer:
+    """修改操作缓冲区
+
+    按(操作, 标签或tracker)分组缓存待执行的修改，flush时将同组种子的hash按
+    chunk_size分批合并为一次API调用。每个修改对应的结果字典会在提交后被更新为
+    processed或failed，批量调用失败时逐个种子重试以得到准确的失败记录。
+
+    dry_run模式下flush不调用任何修改接口，只记录计划执行的修改。
+
+    同一次运行中后执行的规则需要看到先执行的规则对tracker的修改，tracker_urls
+    返回叠加了尚未提交的tracker修改后的tracker列表。
+    """
+    TAG_OPERATIONS = ('add_tags', 'remove_tags')
+    TRACKER_OPERATIONS = ('add_trackers', 'remove_trackers')
+
+    def __init__(self, qbit_client, logger, chunk_size: int = 500, tracker_cache: Optional[TrackerCache] = None,
+                 dry_run: bool = False):
+        self.qbit_client = qbit_client
+        self.logger = logger
+        self.chunk_size = max(1, int(chunk_size))
+        self.tracker_cache = tracker_cache
+        self.dry_run = dry_run
+        # dry_run模式下记录的修改：种子hash -> 操作类型 -> 标签或tracker列表
+        self.planned: Dict[str, Dict[str, List[str]]] = {}
+        # 每组修改的提交耗时：(耗时, 该组修改对应的结果字典列表)
+        self.timings: List[Tuple[float, List[Dict]]] = []
+        self._pending: Dict[Tuple[str, str], List[Tuple[str, Dict, str]]] = {}
+        # 尚未提交的tracker修改：种子hash -> [(操作, tracker)]，按加入顺序
+        self._pending_trackers: Dict[str, List[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(entries) for entries in self._pending.values())
+
+    def add(self, operation: str, value: str, torrent_hash: str, result: Dict, failed_detail: str):
+        """加入一个待执行的修改
+        Args:
+            operation: 操作类型：add_tags, remove_tags, add_trackers, remove_trackers
+            value: 标签或tracker
+            torrent_hash: 种子hash
+            result: 该修改对应的结果字典，提交后更新其status和detail
+            failed_detail: 修改失败时写入结果的详情
+        """
+        if operation not in self.TAG_OPERATIONS + self.TRACKER_OPERATIONS:
+            raise ValueError(f'未知的修改操作: {operation}')
+        result['status'] = 'pending'
+        with self._lock:
+            self._pending.setdefault((operation, value), []).append((torrent_hash, result, failed_detail))
+            if operation in self.TRACKER_OPERATIONS:
+                self._pending_trackers.setdefault(torrent_hash, []).append((operation, value))
+
+    def tracker_urls(self, torrent_hash: str, urls: Iterable[str]) -> List[str]:
+        """在种子当前的tracker列表上叠加尚未提交的tracker修改
+        Args:
+            torrent_hash: 种子hash
+            urls: 种子当前的tracker URL
+        Returns:
+            List[str]: 提交缓存的修改后种子将拥有的tracker URL
+        """
+        urls = list(urls)
+        with self._lock:
+            operations = list(self._pending_trackers.get(torrent_hash, ()))
+        for operation, value in operations:
+            if operation == 'add_trackers':
+                if value not in urls:
+                    urls.append(value)
+            else:
+                urls = [url for url in urls if url != value]
+        return urls
+
+    def _call(self, operation: str, value: str, torrent_hashes: List[str]):
+        if operation == 'add_tags':
+            self.qbit_client.torrents_add_tags(tags=value, torrent_hashes=torrent_hashes)
+        elif operation == 'remove_tags':
+            self.qbit_client.torrents_remove_tags(tags=value, torrent_hashes=torrent_hashes)
+        elif operation == 'add_trackers':
+            # qBittorrent的addTrackers/removeTrackers接口每次只接受一个种子hash
+            for torrent_hash in torrent_hashes:
+                self.qbit_client.torrents_add_trackers(torrent_hash=torrent_hash, urls=[value])
+        elif operation == 'remove_trackers':
+            for torrent_hash in torrent_hashes:
+                self.qbit_client.torrents_remove_trackers(torrent_hash=torrent_hash, urls=[value])
+
+    def _submit(self, operation: str, value: str, entries: List[Tuple[str, Dict, str]]) -> bool:
+        try:
+            self._call(operation, value, [torrent_hash for torrent_hash, _, _ in entries])
+        except Exception as e:
+            if len(entries) > 1:
+                self.logger.warning(f'批量执行 {operation}：{value} 失败，逐个种子重试: {str(e)}')
+            else:
+                self.logger.error(f'为种子 {entries[0][0]} 执行 {operation}：{value} 失败: {str(e)}')
+            return False
+        finally:
+            if operation in self.TRACKER_OPERATIONS and self.tracker_cache is not None:
+                for torrent_hash, _, _ in entries:
+                    self.tracker_cache.invalidate(torrent_hash)
+        for _, result, _ in entries:
+            result['status'] = 'processed'
+        return True
+
+    def flush(self):
+        """提交所有缓存的修改"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pending_trackers = {}
+        if self.dry_run:
+            for (operation, value), entries in pending.items():
+                for torrent_hash, result, _ in entries:
+                    self.planned.setdefault(torrent_hash, {}).setdefault(operation, []).append(value)
+                    result['status'] = 'processed'
+            return
+        for (operation, value), entries in pending.items():
+            start_time = time.perf_counter()
+            # tracker接口不支持多个hash，逐个提交
+            chunk_size = self.chunk_size if operation in self.TAG_OPERATIONS else 1
+            for start in range(0, len(entries), chunk_size):
+                chunk = entries[start:start + chunk_size]
+                if self._submit(operation, value, chunk):
+                    continue
+                retry_entries = chunk if len(chunk) > 1 else []
+                for entry in retry_entries:
+                    self._submit(operation, value, [entry])
+                for _, result, failed_detail in chunk:
+                    if result['status'] != 'processed':
+                        result['status'] = 'failed'
+                        result['detail'] = failed_detail
+            self.timings.append((time.perf_counter() - start_time, [result for _, result, _ in entries]))
+            self.logger.info(f'已提交 {operation}：{value}，种子数：{len(entries)}')
+
+class TaskResultSink:
+    """任务结果收集器
+
+    内存中只保留各规则的计数，以及数量有限的处理/失败详情（用于任务结果日志和通知）；
+    每个种子的处理记录逐条写入JSONL格式的运行日志。跳过记录数量巨大，可选择
+    不记录(none)、只记录前skipped_sample条(sample)或全部记录(all)。
+    """
+    STATUSES = ('processed', 'skipped', 'failed')
+
+    def __init__(self, rule_names: List[str], run_log_path: Optional[str] = None, run_name: str = '',
+                 detail_limit: int = 200, skipped_detail: str = 'sample', skipped_sample: int = 100):
+        self.run_log_path = run_log_path
+        self.run_name = run_name
+        self.detail_limit = detail_limit
+        self.skipped_detail = skipped_detail
+        self.skipped_sample = skipped_sample if skipped_detail == 'sample' else (0 if skipped_detail == 'none' else None)
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self._details: Dict[str, Dict[str, List[str]]] = {}
+        for rule_name in rule_names:
+            self.counts[rule_name] = {status: 0 for status in self.STATUSES}
+            self._details[rule_name] = {status: [] for status in self.STATUSES}
+        self._lock = threading.Lock()
+        # 运行结束后设置的耗时分解，见opt_all_torrent
+        self.timing: Optional[RunTiming] = None
+        self.run_timing: Optional[Dict[str, Any]] = None
+        self._run_log = None
+        if run_log_path:
+            os.makedirs(os.path.dirname(run_log_path), exist_ok=True)
+            self._run_log = open(run_log_path, 'a', encoding='utf-8')
+            self._write({'type': 'run_start', 'run_name': run_name, 'rules': list(rule_names),
+                         'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')})
+
+    def _write(self, record: Dict):
+        if self._run_log is not None:
+            self._run_log.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def _keep_detail(self, status: str, kept: int) -> bool:
+        if status == 'skipped':
+            return self.skipped_sample is None or kept < self.skipped_sample
+        return kept < self.detail_limit
+
+    def record(self, rule_name: str, rule_result: Dict, torrent: Any = None):
+        """记录单个种子单个规则的处理结果"""
+        status = rule_result.get('status', '')
+        if rule_name not in self.counts or status not in self.STATUSES:
+            return
+        detail = rule_result.get('detail', '')
+        with self._lock:
+            count = self.counts[rule_name][status]
+            self.counts[rule_name][status] = count + 1
+            details = self._details[rule_name][status]
+            if detail and self._keep_detail(status, len(details)):
+                details.append(detail)
+            if status != 'skipped' or self.skipped_sample is None or count < self.skipped_sample:
+                self._write({
+                    'rule': rule_name,
+                    'status': status,
+                    'hash': getattr(torrent, 'hash', None) if torrent is not None else None,
+                    'name': getattr(torrent, 'name', None) if torrent is not None else None,
+                    'detail': detail
+                })
+
+    def record_skipped_bulk(self, rule_name: str, count: int, detail: str):
+        """批量记录未逐个处理、直接跳过的种子"""
+        if rule_name not in self.counts or count <= 0:
+            return
+        with self._lock:
+            self.counts[rule_name]['skipped'] += count
+            if self.skipped_sample != 0:
+                self._details[rule_name]['skipped'].append(detail)
+            self._write({'rule': rule_name, 'status': 'skipped', 'count': count, 'detail': detail})
+
+    def close(self):
+        """写入运行结束记录并关闭运行日志"""
+        with self._lock:
+            if self._run_log is None:
+                return
+            record = {'type': 'run_end', 'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'), 'counts': self.counts}
+            if self.timing is not None:
+                record['timing'] = {**self.run_timing,
+                                    'rules': {rule_name: self.timing.rule_timing(rule_name) for rule_name in self.counts}}
+            self._write(record)
+            self._run_log.close()
+            self._run_log = None
+
+    def results(self) -> Dict[str, Dict]:
+        """生成与原有结构兼容的汇总结果，详情被截断时注明运行日志位置"""
+        results = {}
+        with self._lock:
+            for rule_name, counts in self.counts.items():
+                rule_result = {}
+                for status in self.STATUSES:
+                    details = self._details[rule_name][status]
+                    lines = [f" - {detail}\n" for detail in details]
+                    omitted = counts[status] - len(details)
+                    if omitted > 0 and details and status != 'skipped':
+                        log_hint = f"，详见运行日志 {self.run_log_path}" if self.run_log_path else ''
+                        lines.append(f" - ……其余 {omitted} 条已省略{log_hint}\n")
+                    rule_result[f'{status}_count'] = counts[status]
+                    rule_result[f'{status}_detail'] = ''.join(lines)
+                if self.timing is not None:
+                    # 规则的耗时，run为所在运行的耗时分解（同一运行的各规则共享）
+                    rule_result['timing'] = {**self.timing.rule_timing(rule_name), 'run': self.run_timing}
+                results[rule_name] = rule_result
+        return results
+
+class RunTiming:
+    """单次运行的耗时分解
+
+    记录各阶段（获取种子、文件列表、tracker预取、候选计算、规则执行、提交修改、写入状态）的耗时，
+    以及每个规则执行（match）和提交修改（mutate）的耗时。规则执行可能在多个线程中并发进行，
+    规则耗时为各线程耗时之和，可能大于阶段的实际耗时。
+
+    运行期间通过current标记当前上下文所属的运行，客户端只把该上下文中发出的请求计入本次运行，
+    面板、SSE和其他任务同时发出的请求不会混入。线程池中的任务需通过submit提交才能继承该标记。
+    """
+    PHASE_LABELS = {
+        'fetch': '获取种子',
+        'file_lists': '文件列表',
+        'incremental': '增量范围',
+        'trackers': 'tracker预取',
+        'candidates': '候选计算',
+        'match': '规则执行',
+        'mutate': '提交修改',
+        'state': '写入状态',
+    }
+    # 当前上下文所属运行的RunTiming
+    current: contextvars.ContextVar = contextvars.ContextVar('run_timing', default=None)
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self._last_mark = self.started_at
+        self.phases: Dict[str, float] = {}
+        self.rules: Dict[str, Dict[str, float]] = {}
+        # 本次运行各接口的请求数
+        self.api_calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def submit(executor, fn, *args, **kwargs):
+        """向线程池提交任务，任务在当前上下文的副本中执行，继承当前运行的标记"""
+        return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+    def mark(self, name: str):
+        """结束一个阶段：上一个阶段结束（或运行开始）到现在的耗时计入该阶段"""
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self._last_mark
+        self._last_mark = now
+
+    def add_rule(self, rule_name: str, key: str, seconds: float):
+        """累加规则的match或mutate耗时"""
+        with self._lock:
+            rule = self.rules.setdefault(rule_name, {'match': 0.0, 'mutate': 0.0})
+            rule[key] += seconds
+
+    def count_request(self, endpoint: str):
+        """累加本次运行的接口请求数"""
+        with self._lock:
+            self.api_calls[endpoint] = self.api_calls.get(endpoint, 0) + 1
+
+    def api_call_counts(self) -> Dict[str, int]:
+        """本次运行各接口的请求数"""
+        with self._lock:
+            return dict(self.api_calls)
+
+    @contextmanager
+    def activate(self):
+        """在当前上下文中标记本次运行，退出时（包括异常退出）恢复之前的标记"""
+        token = RunTiming.current.set(self)
+        try:
+            yield self
+        finally:
+            RunTiming.current.reset(token)
+
+    def to_dict(self, **extra) -> Dict[str, Any]:
+        """生成运行的耗时摘要（秒）"""
+        with self._lock:
+            return {
+                'total': round(time.perf_counter() - self.started_at, 3),
+                'phases': {name: round(seconds, 3) for name, seconds in self.phases.items()},
+                **extra
+            }
+
+    def rule_timing(self, rule_name: str) -> Dict[str, float]:
+        with self._lock:
+            rule = self.rules.get(rule_name, {'match': 0.0, 'mutate': 0.0})
+            return {key: round(seconds, 3) for key, seconds in rule.items()}
+
+class TaskProgress:
+    """任务执行进度
+
+    记录已处理种子数/总种子数和各规则的计数，并提供取消标记。任务在多个实例上并行执行时
+    共享同一个进度对象。on_update在进度变化时被调用（不超过每interval秒一次）。
+    """
+
+    def __init__(self, on_update=None, interval: float = 1.0):
+        self.total = 0
+        self.done = 0
+        self.on_update = on_update
+        self.interval = interval
+        self._sinks: List[TaskResultSink] = []
+        self._cancel_event = threading.Event()
+        self._last_update = 0.0
+        self._lock = threading.Lock()
+
+    def attach(self, result_sink: TaskResultSink):
+        """关联任务结果收集器，用于汇总各规则的计数"""
+        with self._lock:
+            self._sinks.append(result_sink)
+
+    def add_total(self, count: int):
+        with self._lock:
+            self.total += count
+        self._notify()
+
+    def advance(self, count: int = 1):
+        with self._lock:
+            self.done += count
+        self._notify()
+
+    def _notify(self, force: bool = False):
+        if self.on_update is None:
+            return
+        now = time.time()
+        if not force and now - self._last_update < self.interval:
+            return
+        self._last_update = now
+        self.on_update(self)
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前进度：已处理/总种子数，以及各规则已处理、跳过、失败的数量（多个实例时累加）"""
+        rules: Dict[str, Dict[str, int]] = {}
+        with self._lock:
+            sinks = list(self._sinks)
+            done, total = self.done, self.total
+        for sink in sinks:
+            with sink._lock:
+                for rule_name, counts in sink.counts.items():
+                    rule_counts = rules.setdefault(rule_name, {status: 0 for status in TaskResultSink.STATUSES})
+                    for status, count in counts.items():
+                        rule_counts[status] += count
+        return {
+            'done': done,
+            'total': total,
+            'percent': round(done * 100 / total, 1) if total else 0.0,
+            'rules': rules
+        }
+
+class StateStore:
+    """基于SQLite的本地状态存储
+
+    - torrent_state：每个实例每个种子的紧凑状态（标签、tracker主机名、内容指纹、规则相关字段指纹），
+      与上次写入的状态比较后只写入变化的种子；规则相关字段指纹变化时更新changed_at。
+      已删除的种子保留一条字段指纹为空的记录，用于增量模式下重新处理其辅种
+    - rule_applications：规则的执行记录（哪个版本的规则在什么时候处理了哪个种子）
+    - rule_checkpoints：每个实例每个规则上次完整运行的规则版本、开始时间和上次全量处理的时间
+    写入在一个事务中批量执行；数据库使用WAL模式，多个进程可以在写入的同时并发读取。
+    每个线程使用独立的连接。
+    """
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS torrent_state (
+            instance TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            tags TEXT NOT NULL DEFAULT '',
+            tracker_hosts TEXT NOT NULL DEFAULT '',
+            fingerprint TEXT,
+            updated_at REAL NOT NULL,
+            field_fingerprint TEXT NOT NULL DEFAULT '',
+            changed_at REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (instance, hash)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS rule_applications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            instance TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            rule_name TEXT NOT NULL,
+            rule_version TEXT NOT NULL,
+            status TEXT NOT NULL,
+            detail TEXT NOT NULL DEFAULT '',
+            run_name TEXT NOT NULL DEFAULT '',
+            applied_at REAL NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS rule_checkpoints (
+            instance TEXT NOT NULL,
+            rule_name TEXT NOT NULL,
+            rule_version TEXT NOT NULL,
+            evaluated_at REAL NOT NULL,
+            full_sweep_at REAL NOT NULL,
+            PRIMARY KEY (instance, rule_name)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_rule_applications_hash ON rule_applications (instance, hash, applied_at)",
+        "CREATE INDEX IF NOT EXISTS idx_rule_applications_rule ON rule_applications (rule_name, applied_at)",
+    )
+    # 旧版本数据库缺少的列
+    MIGRATIONS = {
+        'torrent_state': (("field_fingerprint", "TEXT NOT NULL DEFAULT ''"), ("changed_at", "REAL NOT NULL DEFAULT 0")),
+    }
+
+    def __init__(self, path: str, logger: logging.Logger, batch_size: int = 1000, history_days: float = 30):
+        self.path = path
+        self.logger = logger
+        self.batch_size = max(1, int(batch_size))
+        self.history_days = history_days
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        # 各实例上次写入的种子状态和字段指纹变化时间，用于只写入变化的种子
+        self._torrent_states: Dict[str, Dict[str, Tuple[str, str, Optional[str], str]]] = {}
+        self._changed_at: Dict[str, Dict[str, float]] = {}
+        self._last_prune = 0.0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            for table, columns in self.MIGRATIONS.items():
+                existing = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+                for column, definition in columns:
+                    if column not in existing:
+                        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+    def _connection(self) -> sqlite3.Connection:
+        """当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _load_torrent_states(self, instance: str) -> Dict[str, Tuple[str, str, Optional[str], str]]:
+        states = self._torrent_states.get(instance)
+        if states is None:
+            rows = self._connection().execute(
+                'SELECT hash, tags, tracker_hosts, fingerprint, field_fingerprint, changed_at '
+                'FROM torrent_state WHERE instance = ?', (instance,))
+            states, changed_at = {}, {}
+            for row in rows:
+                states[row['hash']] = (row['tags'], row['tracker_hosts'], row['fingerprint'], row['field_fingerprint'])
+                changed_at[row['hash']] = row['changed_at']
+            self._torrent_states[instance] = states
+            self._changed_at[instance] = changed_at
+        return states
+
+    def get_torrent_states(self, instance: str) -> Dict[str, Tuple[str, str, Optional[str], str]]:
+        """获取实例所有种子的状态：hash -> (标签, tracker主机名, 内容指纹, 规则相关字段指纹)"""
+        with self._write_lock:
+            return {torrent_hash: state for torrent_hash, state in self._load_torrent_states(instance).items()
+                    if state[3]}
+
+    def changed_torrents(self, instance: str, field_fingerprints: Dict[str, str],
+                         since: float) -> Tuple[Set[str], Set[str]]:
+        """计算自since以来新增或规则相关字段变化的种子
+
+        Args:
+            instance: 实例名称
+            field_fingerprints: 当前所有种子的规则相关字段指纹：hash -> 指纹
+            since: 时间戳，通常为规则上次运行的开始时间
+        Returns:
+            Tuple[Set[str], Set[str]]: 变化的种子hash集合，以及此后被删除的种子的内容指纹集合
+        """
+        with self._write_lock:
+            states = self._load_torrent_states(instance)
+            changed_at = self._changed_at[instance]
+            changed = set()
+            for torrent_hash, field_fingerprint in field_fingerprints.items():
+                state = states.get(torrent_hash)
+                if state is None or state[3] != field_fingerprint or changed_at.get(torrent_hash, 0) > since:
+                    changed.add(torrent_hash)
+            removed_fingerprints = set()
+            for torrent_hash, state in states.items():
+                if torrent_hash in field_fingerprints or not state[2]:
+                    continue
+                # 尚未写入删除记录，或删除记录晚于since
+                if state[3] or changed_at.get(torrent_hash, 0) > since:
+                    removed_fingerprints.add(state[2])
+        return changed, removed_fingerprints
+
+    def get_rule_checkpoints(self, instance: str) -> Dict[str, Dict[str, Any]]:
+        """获取实例各规则的检查点：规则名称 -> {rule_version, evaluated_at, full_sweep_at}"""
+        rows = self._connection().execute(
+            'SELECT rule_name, rule_version, evaluated_at, full_sweep_at FROM rule_checkpoints WHERE instance = ?',
+            (instance,))
+        return {row['rule_name']: {'rule_version': row['rule_version'], 'evaluated_at': row['evaluated_at'],
+                                   'full_sweep_at': row['full_sweep_at']} for row in rows}
+
+    def _executemany(self, conn: sqlite3.Connection, sql: str, rows: List[Tuple]):
+        for start in range(0, len(rows), self.batch_size):
+            conn.executemany(sql, rows[start:start + self.batch_size])
+
+    def save_run(self, instance: str, torrent_states: Dict[str, Tuple[str, Optional[str], Optional[str], str]],
+                 applications: List[Tuple[str, str, str, str, str]], run_name: str = '',
+                 checkpoints: Optional[List[Tuple[str, str, float, bool]]] = None,
+                 force_changed: Iterable[str] = ()) -> Tuple[int, int]:
+        """在一个事务中写入一次运行后的种子状态、规则执行记录和规则检查点
+
+        Args:
+            instance: 实例名称
+            torrent_states: 当前所有种子的状态：hash -> (标签, tracker主机名, 内容指纹, 规则相关字段指纹)，
+                tracker主机名为None时保留上次写入的值
+            applications: (hash, 规则名称, 规则版本, 状态, 详情)列表
+            run_name: 运行名称
+            checkpoints: (规则名称, 规则版本, 运行开始时间, 是否全量处理)列表，为空时不更新检查点
+            force_changed: 字段未变化也视为已变化的种子hash，下次增量运行时重新处理
+        Returns:
+            Tuple[int, int]: 写入的种子状态数和执行记录数
+        """
+        now = time.time()
+        force_changed = set(force_changed)
+        with self._write_lock:
+            states = self._load_torrent_states(instance)
+            changed_at = self._changed_at[instance]
+            changed = []
+            for torrent_hash, (tags, tracker_hosts, fingerprint, field_fingerprint) in torrent_states.items():
+                old_state = states.get(torrent_hash)
+                if tracker_hosts is None:
+                    tracker_hosts = old_state[1] if old_state is not None else ''
+                state = (tags, tracker_hosts, fingerprint, field_fingerprint)
+                if old_state is None or old_state[3] != field_fingerprint or torrent_hash in force_changed:
+                    changed.append((instance, torrent_hash, *state, now, now))
+                elif old_state != state:
+                    changed.append((instance, torrent_hash, *state, now, changed_at.get(torrent_hash, 0)))
+            # 已删除的种子写入字段指纹为空的删除记录
+            removed = [(instance, torrent_hash, '', '', state[2], '', now, now) for torrent_hash, state in states.items()
+                       if torrent_hash not in torrent_states and state[3]]
+            application_rows = [(instance, torrent_hash, rule_name, rule_version, status, detail, run_name, now)
+                                for torrent_hash, rule_name, rule_version, status, detail in applications]
+            checkpoint_rows = [(instance, rule_name, rule_version, evaluated_at, evaluated_at if full else 0)
+                               for rule_name, rule_version, evaluated_at, full in (checkpoints or [])]
+            conn = self._connection()
+            with conn:
+                self._executemany(conn, 'INSERT OR REPLACE INTO torrent_state '
+                                        '(instance, hash, tags, tracker_hosts, fingerprint, field_fingerprint, '
+                                        'updated_at, changed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                  changed + removed)
+                self._executemany(conn, 'INSERT INTO rule_applications '
+                                        '(instance, hash, rule_name, rule_version, status, detail, run_name, applied_at) '
+                                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', application_rows)
+                # 增量运行不更新上次全量处理的时间
+                self._executemany(conn, 'INSERT INTO rule_checkpoints '
+                                        '(instance, rule_name, rule_version, evaluated_at, full_sweep_at) '
+                                        'VALUES (?, ?, ?, ?, ?) ON CONFLICT (instance, rule_name) DO UPDATE SET '
+                                        'rule_version = excluded.rule_version, evaluated_at = excluded.evaluated_at, '
+                                        'full_sweep_at = MAX(full_sweep_at, excluded.full_sweep_at)', checkpoint_rows)
+                # 每天清理一次过期的执行记录和删除记录
+                pruned = []
+                if self.history_days and now - self._last_prune > 86400:
+                    expire_at = now - self.history_days * 86400
+                    conn.execute('DELETE FROM rule_applications WHERE applied_at < ?', (expire_at,))
+                    pruned = [torrent_hash for torrent_hash, state in states.items()
+                              if not state[3] and changed_at.get(torrent_hash, 0) < expire_at]
+                    self._executemany(conn, 'DELETE FROM torrent_state WHERE instance = ? AND hash = ?',
+                                      [(instance, torrent_hash) for torrent_hash in pruned])
+                    self._last_prune = now
+            for row in changed + removed:
+                states[row[1]] = row[2:6]
+                changed_at[row[1]] = row[7]
+            for torrent_hash in pruned:
+                del states[torrent_hash]
+                changed_at.pop(torrent_hash, None)
+        return len(changed) + len(removed), len(application_rows)
+
+    def query_history(self, instance: Optional[str] = None, torrent_hash: Optional[str] = None,
+                      rule_name: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """按实例、种子hash或规则名称查询规则执行记录，按时间倒序"""
+        conditions, params = [], []
+        for column, value in (('instance', instance), ('hash', torrent_hash), ('rule_name', rule_name)):
+            if value:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        rows = self._connection().execute(
+            f'SELECT instance, hash, rule_name, rule_version, status, detail, run_name, applied_at '
+            f'FROM rule_applications {where} ORDER BY applied_at DESC, id DESC LIMIT ?', (*params, int(limit)))
+        return [{**dict(row), 'applied_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row['applied_at']))}
+                for row in rows]
+
+class TaskResultLog:
+    """任务结果日志文件，带运行边界索引和按大小轮转
+
+    每次运行的结果作为一段文本追加到日志文件，同时在旁路索引文件中追加一条
+    定长记录（该段的起始偏移和长度），因此可以直接定位第N次运行，读取最近N次
+    运行或从某个字节偏移开始增量读取时都不需要读取整个日志文件。
+    日志超过max_bytes时轮转为.1、.2……，最多保留backup_count个旧文件。
+    索引缺失或与日志不一致（日志被截断、由旧版本写入）时根据日志内容重建。
+    """
+    INDEX_RECORD_SIZE = 32
+    ENTRY_START_PATTERN = re.compile(r'^\[\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\] 任务：')
+
+    def __init__(self, path: str, max_bytes: int = 5 * 1024 * 1024, backup_count: int = 3):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+
+    def _pack_index_record(self, offset: int, length: int) -> bytes:
+        return f"{offset:016x}{length:015x}\n".encode('ascii')
+
+    def _unpack_index_record(self, record: bytes) -> Tuple[int, int]:
+        return int(record[:16], 16), int(record[16:31], 16)
+
+    def _rotate(self):
+        """轮转日志文件，旧文件不再建立索引"""
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+
+    @contextmanager
+    def _file_lock(self):
+        """多个进程可能同时写入，使用文件锁保证日志和索引一致"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _index_valid(self) -> bool:
+        """索引是否与日志一致：记录完整，且最后一条记录正好结束于日志末尾"""
+        log_exists = os.path.exists(self.path)
+        try:
+            with open(self.index_path, 'rb') as f:
+                index_size = os.fstat(f.fileno()).st_size
+                if index_size % self.INDEX_RECORD_SIZE:
+                    return False
+                last_end = 0
+                if index_size:
+                    f.seek(index_size - self.INDEX_RECORD_SIZE)
+                    offset, length = self._unpack_index_record(f.read(self.INDEX_RECORD_SIZE))
+                    last_end = offset + length
+        except FileNotFoundError:
+            return not log_exists
+        except ValueError:
+            return False
+        return log_exists and last_end == os.path.getsize(self.path)
+
+    def _rebuild_index(self):
+        """根据日志内容重建索引，日志不存在时删除索引"""
+        if not os.path.exists(self.path):
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            return
+        records = []
+        entry_start = None
+        offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if self.ENTRY_START_PATTERN.match(line.decode('utf-8', errors='replace')):
+                    if entry_start is not None:
+                        records.append(self._pack_index_record(entry_start, offset - entry_start))
+                    entry_start = offset
+                offset += len(line)
+        if entry_start is not None:
+            records.append(self._pack_index_record(entry_start, offset - entry_start))
+        with open(self.index_path, 'wb') as f:
+            f.write(b''.join(records))
+
+    def _ensure_index(self):
+        """索引与日志不一致时在文件锁内重建，写入中的日志在获得锁后即一致"""
+        if self._index_valid():
+            return
+        with self._file_lock():
+            if not self._index_valid():
+                self._rebuild_index()
+
+    def append(self, entry: str):
+        """追加一次运行的结果，并记录其在日志中的位置"""
+        data = entry.encode('utf-8')
+        with self._lock, self._file_lock():
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes > 0:
+                self._rotate()
+            if not self._index_valid():
+                self._rebuild_index()
+            with open(self.path, 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+            with open(self.index_path, 'ab') as f:
+                f.write(self._pack_index_record(offset, len(data)))
+
+    def generation(self) -> int:
+        """当前日志文件的标识，日志轮转后会变化"""
+        try:
+            return os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return 0
+
+    def read_runs(self, limit: int = 50, before: Optional[int] = None) -> Dict[str, Any]:
+        """读取最近的运行记录
+
+        Args:
+            limit: 最多返回的运行次数
+            before: 分页游标，返回编号小于该值的运行；为空时从最新的运行开始
+        Returns:
+            Dict: content为按时间顺序拼接的日志文本，cursor为下一页的游标，
+                next_offset为当前日志末尾的字节偏移，可用于read_since增量读取
+        """
+        with self._lock:
+            self._ensure_index()
+        if not os.path.exists(self.path):
+            return {'content': '', 'cursor': 0, 'has_more': False, 'next_offset': 0,
+                    'total_runs': 0, 'generation': 0}
+        with open(self.index_path, 'rb') as index_file, open(self.path, 'rb') as log_file:
+            total_runs = os.fstat(index_file.fileno()).st_size // self.INDEX_RECORD_SIZE
+            end = total_runs if before is None else max(0, min(before, total_runs))
+            start = max(0, end - max(0, limit))
+            index_file.seek(start * self.INDEX_RECORD_SIZE)
+            records = [self._unpack_index_record(index_file.read(self.INDEX_RECORD_SIZE)) for _ in range(end - start)]
+            chunks = []
+            for offset, length in records:
+                log_file.seek(offset)
+                chunks.append(log_file.read(length))
+            # 增量读取从最后一条已索引运行的末尾开始
+            next_offset = 0
+            if total_runs:
+                index_file.seek((total_runs - 1) * self.INDEX_RECORD_SIZE)
+                last_offset, last_length = self._unpack_index_record(index_file.read(self.INDEX_RECORD_SIZE))
+                next_offset = last_offset + last_length
+        return {
+            'content': b''.join(chunks).decode('utf-8', errors='replace'),
+            'cursor': start,
+            'has_more': start > 0,
+            'next_offset': next_offset,
+            'total_runs': total_runs,
+            'generation': self.generation()
+        }
+
+    def read_since(self, offset: int, generation: Optional[int] = None, max_bytes: int = 1024 * 1024) -> Dict[str, Any]:
+        """从指定字节偏移开始读取新追加的内容
+
+        日志已轮转（generation不同）或偏移超出文件大小时返回reset=True，
+        调用方应改为调用read_runs重新加载。
+        """
+        current_generation = self.generation()
+        if not os.path.exists(self.path):
+            return {'content': '', 'next_offset': 0, 'generation': 0, 'reset': bool(offset)}
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if (generation is not None and generation != current_generation) or offset > size:
+                return {'content': '', 'next_offset': size, 'generation': current_generation, 'reset': True}
+            f.seek(offset)
+            data = f.read(max_bytes)
+        # 读取量达到上限时截断到最后一个完整行，避免截断在UTF-8多字节字符中间
+        if len(data) >= max_bytes and b'\n' in data:
+            data = data[:data.rindex(b'\n') + 1]
+        return {
+            'content': data.decode('utf-8', errors='replace'),
+            'next_offset': offset + len(data),
+            'generation': current_generation,
+            'reset': False
+        }
+
+class AdaptiveRateLimiter:
+    """qBittorrent WebUI请求的自适应限速器
+
+    读取和修改请求分别使用独立的令牌桶，每个请求发出前取得一个令牌，令牌不足时
+    阻塞等待。每完成window个请求统计一次平均延迟和错误率：延迟超过latency_target
+    或错误率超过error_threshold时速率乘以decrease_factor（乘性减），否则速率增加
+    increase_step（加性增），速率始终限制在[min_rate, max_rate]之间。
+    """
+    DEFAULT_BUDGETS = {
+        'read': {'rate': 100, 'burst': 50, 'min_rate': 5, 'max_rate': 500},
+        'mutation': {'rate': 20, 'burst': 10, 'min_rate': 1, 'max_rate': 100},
+    }
+    # torrents命名空间下只读取数据的接口，其余接口均会修改种子
+    TORRENT_READ_METHODS = frozenset({'info', 'properties', 'trackers', 'webseeds', 'files', 'pieceStates',
+                                      'pieceHashes', 'count', 'categories', 'tags', 'export'})
+
+    class _Bucket:
+        def __init__(self, rate: float, burst: float, min_rate: float, max_rate: float):
+            self.min_rate = float(min_rate)
+            self.max_rate = float(max_rate)
+            self.rate = min(max(float(rate), self.min_rate), self.max_rate)
+            self.burst = max(1.0, float(burst))
+            self.tokens = self.burst
+            self.updated_at = time.monotonic()
+            # 当前统计窗口内的请求数、错误数和总延迟
+            self.window_count = 0
+            self.window_errors = 0
+            self.window_latency = 0.0
+            # 最近一个窗口的统计结果
+            self.avg_latency = 0.0
+            self.error_rate = 0.0
+            self.total_requests = 0
+            self.total_errors = 0
+            self.total_wait = 0.0
+
+    def __init__(self, logger: logging.Logger, budgets: Optional[Dict[str, Dict]] = None,
+                 latency_target: float = 1.0, error_threshold: float = 0.1, window: int = 20,
+                 increase_step: float = 5.0, decrease_factor: float = 0.5):
+        self.logger = logger
+        self.latency_target = latency_target
+        self.error_threshold = error_threshold
+        self.window = max(1, int(window))
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        budgets = budgets or {}
+        self._buckets = {
+            operation: self._Bucket(**{**default_budget, **(budgets.get(operation) or {})})
+            for operation, default_budget in self.DEFAULT_BUDGETS.items()
+        }
+        self._lock = threading.Lock()
+
+    @classmethod
+    def classify(cls, api_namespace: Any, api_method: str) -> Optional[str]:
+        """根据请求的接口判断所属的预算，登录请求不限速
+
+        qBittorrent较新版本的读取接口同样使用POST，因此按接口名称而不是HTTP方法区分。
+        """
+        api_namespace = getattr(api_namespace, 'value', api_namespace)
+        if api_namespace == 'auth':
+            return None
+        if api_namespace == 'torrents':
+            return 'read' if api_method in cls.TORRENT_READ_METHODS else 'mutation'
+        return 'mutation' if api_method.startswith(('set', 'toggle')) else 'read'
+
+    @staticmethod
+    def is_congestion_error(error: Exception) -> bool:
+        """403、5xx、超时和连接错误视为WebUI过载的信号，其他4xx错误不计入"""
+        if isinstance(error, (qbittorrentapi.HTTP403Error, qbittorrentapi.HTTP5XXError)):
+            return True
+        return isinstance(error, OSError) and not isinstance(error, qbittorrentapi.HTTP4XXError)
+
+    def acquire(self, operation: str):
+        """取得一个令牌，令牌不足时等待"""
+        bucket = self._buckets[operation]
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                bucket.tokens = min(bucket.burst, bucket.tokens + (now - bucket.updated_at) * bucket.rate)
+                bucket.updated_at = now
+                if bucket.tokens >= 1:
+                    bucket.tokens -= 1
+                    bucket.total_wait += waited
+                    return
+                delay = (1 - bucket.tokens) / bucket.rate
+            time.sleep(delay)
+            waited += delay
+
+    def record(self, operation: str, latency: float, error: Optional[Exception] = None):
+        """记录一次请求的延迟和结果，窗口结束时调整速率"""
+        bucket = self._buckets[operation]
+        failed = error is not None and self.is_congestion_error(error)
+        with self._lock:
+            bucket.total_requests += 1
+            bucket.window_count += 1
+            bucket.window_latency += latency
+            if failed:
+                bucket.total_errors += 1
+                bucket.window_errors += 1
+            if bucket.window_count < self.window:
+                return
+            bucket.avg_latency = bucket.window_latency / bucket.window_count
+            bucket.error_rate = bucket.window_errors / bucket.window_count
+            bucket.window_count = bucket.window_errors = 0
+            bucket.window_latency = 0.0
+            old_rate = bucket.rate
+            if bucket.error_rate > self.error_threshold or bucket.avg_latency > self.latency_target:
+                bucket.rate = max(bucket.min_rate, bucket.rate * self.decrease_factor)
+            else:
+                bucket.rate = min(bucket.max_rate, bucket.rate + self.increase_step)
+        if bucket.rate < old_rate:
+            self.logger.warning(f"qBittorrent响应变慢（平均延迟 {bucket.avg_latency:.2f} 秒，错误率 {bucket.error_rate:.0%}），"
+                                f"{operation}请求速率从 {old_rate:.1f}/秒 降至 {bucket.rate:.1f}/秒")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """各预算当前的速率及最近窗口的统计"""
+        with self._lock:
+            return {
+                operation: {
+                    'rate': round(bucket.rate, 1),
+                    'max_rate': bucket.max_rate,
+                    'avg_latency': round(bucket.avg_latency, 3),
+                    'error_rate': round(bucket.error_rate, 3),
+                    'total_requests': bucket.total_requests,
+                    'total_errors': bucket.total_errors,
+                    'total_wait': round(bucket.total_wait, 1)
+                }
+                for operation, bucket in self._buckets.items()
+            }
+
+class Metrics:
+    """进程内运行指标，按Prometheus文本格式输出
+
+    计数器和直方图只在内存中累加，开销为一次加锁和字典更新。多个worker进程部署时，
+    每个进程定时将自己的指标写入data/dir/<pid>.json，输出时合并所有存活进程的指标：
+    计数器和直方图相加，仪表取最近一次设置的值。已退出进程的指标文件被删除。
+    """
+
+    API_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    TASK_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+    # 指标名称 -> (类型, 说明, 直方图分桶)
+    DEFINITIONS = {
+        'qbit_helper_api_requests_total': ('counter', 'qBittorrent WebUI请求数', None),
+        'qbit_helper_api_request_duration_seconds': ('histogram', 'qBittorrent WebUI请求耗时（不含限速等待）', API_BUCKETS),
+        'qbit_helper_task_runs_total': ('counter', '任务执行次数', None),
+        'qbit_helper_task_duration_seconds': ('histogram', '任务执行耗时', TASK_BUCKETS),
+        'qbit_helper_rule_torrents_total': ('counter', '规则处理的种子数', None),
+        'qbit_helper_scheduler_lag_seconds': ('histogram', '调度任务实际提交时间与计划时间的差', API_BUCKETS),
+        'qbit_helper_dashboard_refresh_duration_seconds': ('histogram', '仪表板快照刷新耗时', TASK_BUCKETS),
+        'qbit_helper_instance_up': ('gauge', 'qBittorrent实例是否已连接', None),
+    }
+
+    def __init__(self, directory: str, logger: logging.Logger):
+        # 退出时仍会写入指标，使用绝对路径避免受工作目录变化影响
+        self.directory = os.path.abspath(directory)
+        self.logger = logger
+        self._values: Dict[str, Dict[Tuple, Any]] = {name: {} for name in self.DEFINITIONS}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _key(labels: Dict[str, Any]) -> Tuple:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, labels: Dict[str, Any], value: float = 1):
+        """计数器加value"""
+        key = self._key(labels)
+        with self._lock:
+            values = self._values[name]
+            values[key] = values.get(key, 0) + value
+
+    def observe(self, name: str, labels: Dict[str, Any], value: float):
+        """直方图记录一次观测值"""
+        buckets = self.DEFINITIONS[name][2]
+        key = self._key(labels)
+        with self._lock:
+            values = self._values[name]
+            histogram = values.get(key)
+            if histogram is None:
+                # 各分桶的计数（不累计）、总和、次数
+                histogram = values[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    break
+            else:
+                i = len(buckets)
+            histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def set(self, name: str, labels: Dict[str, Any], value: float):
+        """设置仪表的值"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[name][key] = [value, time.time()]
+
+    def _snapshot(self) -> Dict[str, List]:
+        with self._lock:
+            return {name: [[list(map(list, key)), json.loads(json.dumps(value))] for key, value in values.items()]
+                    for name, values in self._values.items()}
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def flush(self):
+        """将当前进程的指标写入共享目录"""
+        try:
+            path = self._path(os.getpid())
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._snapshot(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self.logger.error(f"写入运行指标时发生错误: {str(e)}")
+
+    def _other_snapshots(self) -> List[Dict[str, List]]:
+        """读取其他存活进程的指标，删除已退出进程的指标文件"""
+        snapshots = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json') or not filename[:-5].isdigit():
+                continue
+            pid = int(filename[:-5])
+            if pid == os.getpid():
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            except PermissionError:
+                pass
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def _merged(self) -> Dict[str, Dict[Tuple, Any]]:
+        merged: Dict[str, Dict[Tuple, Any]] = {name: {} for name in self.DEFINITIONS}
+        for snapshot in [self._snapshot()] + self._other_snapshots():
+            for name, entries in snapshot.items():
+                if name not in merged:
+                    continue
+                metric_type = self.DEFINITIONS[name][0]
+                values = merged[name]
+                for labels, value in entries:
+                    key = tuple(map(tuple, labels))
+                    current = values.get(key)
+                    if current is None:
+                        values[key] = value
+                    elif metric_type == 'counter':
+                        values[key] = current + value
+                    elif metric_type == 'histogram':
+                        values[key] = [[a + b for a, b in zip(current[0], value[0])],
+                                       current[1] + value[1], current[2] + value[2]]
+                    elif value[1] > current[1]:
+                        values[key] = value
+        return merged
+
+    @staticmethod
+    def _format_labels(key: Tuple, extra: Tuple = ()) -> str:
+        pairs = list(key) + list(extra)
+        if not pairs:
+            return ''
+        escaped = [(name, str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"'))
+                   for name, value in pairs]
+        return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+    def render(self) -> str:
+        """输出所有进程合并后的指标（Prometheus文本格式）"""
+        lines = []
+        for name, values in self._merged().items():
+            metric_type, description, buckets = self.DEFINITIONS[name]
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for key, value in sorted(values.items()):
+                if metric_type == 'counter':
+                    lines.append(f'{name}{self._format_labels(key)} {value}')
+                elif metric_type == 'gauge':
+                    lines.append(f'{name}{self._format_labels(key)} {value[0]}')
+                else:
+                    counts, total, count = value
+                    cumulative = 0
+                    for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                        cumulative += bucket_count
+                        lines.append(f'{name}_bucket{self._format_labels(key, (("le", bound),))} {cumulative}')
+                    lines.append(f'{name}_sum{self._format_labels(key)} {total}')
+                    lines.append(f'{name}_count{self._format_labels(key)} {count}')
+        return '\n'.join(lines) + '\n'
+
+class ManagedClient:
+    """带连接管理的qBittorrent客户端
+
+    包装qbittorrentapi.Client，只通过其公开的接口方法（如torrents_info、sync_maindata）发出请求：
+    - 创建时不登录，第一次请求前登录（多个线程同时请求时只登录一次）
+    - 每次接口调用经过自适应限速器
+    - 登录失效（403）时由qbittorrentapi重新登录并重试
+    - 连续failure_threshold次连接失败后进入退避，退避期间的请求直接失败，
+      退避时间从backoff_min开始每次失败翻倍，最长backoff_max秒，任意请求成功后恢复
+    - 配置了metrics时按接口记录请求数和耗时
+    其余属性直接使用qbittorrentapi.Client的属性。种子镜像中的种子对象绑定本客户端，其方法同样经过以上管理。
+    """
+    # 接口方法名称的前缀，如torrents_add_tags对应接口torrents/addTags
+    API_NAMESPACES = frozenset(name.value for name in qbittorrentapi.APINames if name.value)
+
+    def __init__(self, host: str = '', username: str = '', password: str = '', *,
+                 rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                 logger: Optional[logging.Logger] = None, failure_threshold: int = 3,
+                 backoff_min: float = 1.0, backoff_max: float = 60.0,
+                 metrics: Optional[Metrics] = None, instance_name: str = '', **kwargs):
+        self._client = qbittorrentapi.Client(host=host, username=username, password=password, **kwargs)
+        self.host = host
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        self.instance_name = instance_name
+        self.logger = logger or logging.getLogger(__name__)
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.connected = False
+        self.last_error = ''
+        self._consecutive_failures = 0
+        self._retry_at = 0.0
+        self._logged_in = False
+        self._state_lock = threading.Lock()
+        self._login_lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        # 私有属性不转发，也避免初始化完成前访问_client时无限递归
+        if name.startswith('_'):
+            raise AttributeError(name)
+        attr = getattr(self._client, name)
+        api_namespace, _, method = name.partition('_')
+        if not method or api_namespace not in self.API_NAMESPACES or not callable(attr):
+            return attr
+        # 方法名称转换为接口名称，如add_tags -> addTags
+        first, *rest = method.split('_')
+        api_method = first + ''.join(part[:1].upper() + part[1:] for part in rest)
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return self._call(attr, api_namespace, api_method, *args, **kwargs)
+        return call
+
+    @staticmethod
+    def _is_connection_error(error: Exception) -> bool:
+        """连接失败、超时等未收到HTTP响应的错误"""
+        return isinstance(error, qbittorrentapi.APIConnectionError) and not isinstance(error, qbittorrentapi.HTTPError)
+
+    def _record_success(self):
+        with self._state_lock:
+            if not self.connected or self._consecutive_failures:
+                self.logger.info(f"qBittorrent {self.host} 连接已恢复")
+            self.connected = True
+            self._consecutive_failures = 0
+            self._retry_at = 0.0
+
+    def _record_failure(self, error: Exception):
+        with self._state_lock:
+            self.connected = False
+            self.last_error = str(error)
+            self._consecutive_failures += 1
+            if self._consecutive_failures < self.failure_threshold:
+                return
+            backoff = min(self.backoff_max,
+                          self.backoff_min * 2 ** (self._consecutive_failures - self.failure_threshold))
+            self._retry_at = time.monotonic() + backoff
+        self.logger.warning(f"qBittorrent {self.host} 连续 {self._consecutive_failures} 次连接失败，{backoff:.0f} 秒后重试")
+
+    def _check_backoff(self):
+        retry_in = self._retry_at - time.monotonic()
+        if retry_in > 0:
+            raise qbittorrentapi.APIConnectionError(
+                f"qBittorrent {self.host} 暂时不可用，{retry_in:.0f} 秒后重试：{self.last_error}")
+
+    def auth_log_in(self, *args, **kwargs):
+        try:
+            self._call(self._client.auth_log_in, 'auth', 'logIn', *args, **kwargs)
+        except Exception as e:
+            with self._state_lock:
+                self.connected = False
+                self.last_error = str(e)
+            raise
+        self._logged_in = True
+        self._record_success()
+
+    def _ensure_logged_in(self):
+        """第一次请求前登录，其他线程已在此期间登录时直接返回"""
+        with self._login_lock:
+            if not self._logged_in:
+                self.auth_log_in()
+
+    def _call(self, func, api_namespace: str, api_method: str, *args, **kwargs):
+        """经过退避检查和限速器调用一个接口方法，并记录请求结果"""
+        is_auth = api_namespace == 'auth'
+        if not is_auth:
+            self._check_backoff()
+            if not self._logged_in:
+                self._ensure_logged_in()
+        rate_limiter = self.rate_limiter
+        operation = rate_limiter.classify(api_namespace, api_method) if rate_limiter is not None else None
+        if operation is not None:
+            rate_limiter.acquire(operation)
+        start_time = time.monotonic()
+        try:
+            response = func(*args, **kwargs)
+        except Exception as e:
+            self._record_request(operation, api_namespace, api_method, time.monotonic() - start_time, e)
+            if self._is_connection_error(e):
+                self._record_failure(e)
+            raise
+        self._record_request(operation, api_namespace, api_method, time.monotonic() - start_time)
+        if not is_auth:
+            self._record_success()
+        return response
+
+    def _record_request(self, operation: Optional[str], api_namespace, api_method, duration: float,
+                        error: Optional[Exception] = None):
+        """将请求耗时和结果记录到限速器和运行指标"""
+        if operation is not None:
+            self.rate_limiter.record(operation, duration, error)
+        endpoint = f"{getattr(api_namespace, 'value', api_namespace)}/{getattr(api_method, 'value', api_method)}"
+        timing = RunTiming.current.get()
+        if timing is not None:
+            timing.count_request(endpoint)
+        if self.metrics is not None:
+            labels = {'instance': self.instance_name, 'endpoint': endpoint}
+            self.metrics.inc('qbit_helper_api_requests_total', {**labels, 'result': 'error' if error else 'ok'})
+            self.metrics.observe('qbit_helper_api_request_duration_seconds', labels, duration)
+
+    def status(self) -> Dict[str, Any]:
+        """连接状态"""
+        with self._state_lock:
+            return {
+                'connected': self.connected,
+                'consecutive_failures': self._consecutive_failures,
+                'retry_in': round(max(0.0, self._retry_at - time.monotonic()), 1),
+                'last_error': self.last_error
+            }
+
+class QBitInstance:
+    """单个qBittorrent实例
+
+    保存该实例的客户端、种子镜像、tracker缓存、内容指纹缓存和辅种字典，多个实例之间互不共享状态。
+    """
+
+    def __init__(self, name: str, host: str, username: str, password: str, logger: logging.Logger,
+                 tracker_cache_config: Optional[Dict] = None, rate_limit_config: Optional[Dict] = None,
+                 connection_config: Optional[Dict] = None, file_list_cache_config: Optional[Dict] = None,
+                 metrics: Optional[Metrics] = None):
+        tracker_cache_config = tracker_cache_config or {}
+        file_list_cache_config = file_list_cache_config or {}
+        rate_limit_config = rate_limit_config or {}
+        connection_config = connection_config or {}
+        self.name = name
+        self.host = host
+        self.username = username
+        self.password = password
+        self.logger = logger
+        # 每个实例一个限速器，该实例的所有请求共享
+        self.rate_limiter = None
+        if rate_limit_config.get('enabled', True):
+            self.rate_limiter = AdaptiveRateLimiter(
+                logger,
+                budgets={operation: rate_limit_config.get(operation) for operation in AdaptiveRateLimiter.DEFAULT_BUDGETS},
+                latency_target=rate_limit_config.get('latency_target', 1.0),
+                error_threshold=rate_limit_config.get('error_threshold', 0.1),
+                window=rate_limit_config.get('window', 20),
+                increase_step=rate_limit_config.get('increase_step', 5.0),
+                decrease_factor=rate_limit_config.get('decrease_factor', 0.5)
+            )
+        # 长连接池的大小需要覆盖并发请求的线程数，否则多余的连接用完即被丢弃
+        self.qbit_client = ManagedClient(
+            host=host, username=username, password=password,
+            rate_limiter=self.rate_limiter, logger=logger,
+            metrics=metrics, instance_name=name,
+            failure_threshold=connection_config.get('failure_threshold', 3),
+            backoff_min=connection_config.get('backoff_min', 1),
+            backoff_max=connection_config.get('backoff_max', 60),
+            REQUESTS_ARGS={'timeout': (connection_config.get('connect_timeout', 5),
+                                       connection_config.get('timeout', 30))},
+            HTTPADAPTER_ARGS={'pool_connections': 1,
+                              'pool_maxsize': connection_config.get('pool_maxsize', 10)}
+        )
+        self.torrent_mirror = TorrentMirror(self.qbit_client, logger)
+        self.tracker_cache = TrackerCache(self.qbit_client, logger,
+                                          max_workers=tracker_cache_config.get('workers', 8),
+                                          ttl=tracker_cache_config.get('ttl', 600),
+                                          index=self.torrent_mirror.index)
+        # 内容指纹缓存按实例名称保存在data目录下
+        cache_file = re.sub(r'[^\w.-]', '_', name) + '.jsonl'
+        self.file_list_cache = FileListCache(self.qbit_client, logger,
+                                             os.path.join('data', file_list_cache_config.get('dir', 'file_lists'), cache_file),
+                                             max_workers=file_list_cache_config.get('workers', 8))
+        # 辅种字典：标识符 -> 种子hash列表
+        self.torrent_dict: Dict[str, List[str]] = {}
+        # 同一实例上的任务依次执行，避免同时重建辅种字典
+        self.lock = threading.RLock()
+
+    @property
+    def connected(self) -> bool:
+        return self.qbit_client.connected
+
+    def connect(self) -> bool:
+        """登录qBittorrent WebUI，登录失效后客户端会自动重新登录，无需再次调用"""
+        try:
+            self.qbit_client.auth_log_in()
+            self.logger.info(f"成功连接到qBittorrent实例 {self.name}，版本：{self.qbit_client.app_version()}")
+        except Exception as e:
+            self.logger.error(f"连接qBittorrent实例 {self.name} 失败: {str(e)}")
+        return self.connected
+
+class SchedulerLeaderLock:
+    """基于文件锁的调度器leader选举
+
+    多个进程（如Gunicorn的多个worker）共享同一个data目录时，只有持有锁文件
+    排他锁的进程成为leader，负责调度和执行自动任务。锁由进程持有直到退出，
+    进程退出后操作系统自动释放锁，其他进程可以接替。同一进程内的多个实例共享锁。
+    """
+    _held_files: Dict[str, Any] = {}
+    _class_lock = threading.Lock()
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+
+    def try_acquire(self) -> bool:
+        """尝试获取锁，当前进程已持有时直接返回True"""
+        with self._class_lock:
+            if self.path in self._held_files:
+                return True
+            if fcntl is None:
+                self._held_files[self.path] = None
+                return True
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            lock_file = open(self.path, 'a+')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            # 记录leader进程号，供其他进程查询
+            lock_file.seek(0)
+            lock_file.truncate()
+            lock_file.write(str(os.getpid()))
+            lock_file.flush()
+            self._held_files[self.path] = lock_file
+            return True
+
+    def is_held(self) -> bool:
+        """当前进程是否持有锁"""
+        with self._class_lock:
+            return self.path in self._held_files
+
+    def leader_pid(self) -> Optional[int]:
+        """读取当前leader的进程号"""
+        try:
+            with open(self.path, 'r') as f:
+                content = f.read().strip()
+            return int(content) if content else None
+        except (OSError, ValueError):
+            return None
+
+class TaskRunQueue:
+    """自动任务运行队列
+
+    调度器触发的自动任务先进入优先级队列（priority越小越优先），由单个线程依次执行，
+    避免多个任务同时拉取种子列表、争抢qBittorrent。队列中出现任务后，线程继续等待同时到期的
+    其他任务入队，直到BATCH_IDLE秒内没有新任务入队或等待满batch_window秒，然后取出所有任务
+    交给run_batch一起执行，使同时到期的任务可以共享一次种子遍历。
+    每个任务排队和运行中的次数不超过max_instances，超过时本次触发被合并丢弃。
+    """
+    BATCH_IDLE = 0.1
+
+    def __init__(self, run_batch, logger: logging.Logger, batch_window: float = 1.0):
+        self.run_batch = run_batch
+        self.logger = logger
+        self.batch_window = batch_window
+        self._heap: List[Tuple[int, float, int, str, str, Any]] = []
+        self._counter = itertools.count()
+        self._pending: Dict[str, int] = {}
+        self._running: List[str] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, job_id: str, name: str, payload: Any, priority: int = 100, max_instances: int = 1) -> bool:
+        """将任务加入队列
+
+        Returns:
+            bool: 是否入队，任务排队和运行中的次数已达到max_instances时返回False
+        """
+        with self._cond:
+            if self._pending.get(job_id, 0) >= max(1, max_instances):
+                self.logger.warning(f"任务 {name} 上次触发尚未执行完成，合并本次触发")
+                return False
+            self._pending[job_id] = self._pending.get(job_id, 0) + 1
+            heapq.heappush(self._heap, (priority, time.time(), next(self._counter), job_id, name, payload))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='task-run-queue', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return True
+
+    def _take_batch(self) -> List[Tuple[int, float, int, str, str, Any]]:
+        """等待队列中出现任务，再等待同时到期的其他任务入队后取出所有任务"""
+        with self._cond:
+            while not self._heap:
+                self._cond.wait()
+            deadline = time.monotonic() + self.batch_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                queued = len(self._heap)
+                self._cond.wait(min(self.BATCH_IDLE, remaining))
+                if len(self._heap) == queued:
+                    break
+            items = [heapq.heappop(self._heap) for _ in range(len(self._heap))]
+            self._running = [item[4] for item in items]
+            return items
+
+    def _run(self):
+        while True:
+            items = self._take_batch()
+            try:
+                self.run_batch([item[5] for item in items])
+            except Exception as e:
+                self.logger.exception(f"执行任务队列时发生错误: {str(e)}")
+            finally:
+                with self._cond:
+                    for item in items:
+                        self._pending[item[3]] -= 1
+                        if self._pending[item[3]] <= 0:
+                            del self._pending[item[3]]
+                    self._running = []
+
+    def status(self) -> Dict[str, List[str]]:
+        """获取排队中和执行中的任务名称"""
+        with self._cond:
+            return {'queued': [item[4] for item in sorted(self._heap)], 'running': list(self._running)}
+
+class EventBus:
+    """服务器推送事件（SSE）总线
+
+    事件追加写入共享的JSONL文件，所有进程（如Gunicorn的多个worker）的SSE连接都从该文件
+    读取，因此每个事件只生成一次，由各个连接直接转发，不需要为每个页面重新计算。
+    事件ID为"文件标识-偏移"，客户端断线重连时通过Last-Event-ID从断开的位置继续。
+    文件超过max_bytes时轮转，只保留一个旧文件；连接发现文件已轮转时发送reset事件，
+    客户端应重新加载完整数据。
+    """
+
+    def __init__(self, path: str, logger: logging.Logger, max_bytes: int = 1024 * 1024,
+                 poll_interval: float = 0.5):
+        self.path = path
+        self.logger = logger
+        self.max_bytes = max_bytes
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def publish(self, event: str, data: Dict[str, Any]):
+        """发布事件，写入失败只记录日志"""
+        line = json.dumps({'event': event, 'data': data, 'time': time.time()}, ensure_ascii=False) + '\n'
+        try:
+            with self._cond:
+                while True:
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        if fcntl is not None:
+                            fcntl.flock(f, fcntl.LOCK_EX)
+                            # 等待锁期间文件被其他进程轮转时重新打开
+                            if os.fstat(f.fileno()).st_ino != self._file_id():
+                                continue
+                        if f.tell() > self.max_bytes:
+                            os.replace(self.path, f"{self.path}.1")
+                            with open(self.path, 'a', encoding='utf-8') as new_file:
+                                new_file.write(line)
+                        else:
+                            f.write(line)
+                    break
+                self._cond.notify_all()
+        except Exception as e:
+            self.logger.error(f"发布事件 {event} 时发生错误: {str(e)}")
+
+    def _file_id(self) -> int:
+        try:
+            return os.stat(self.path).st_ino
+        except OSError:
+            return 0
+
+    def cursor(self) -> str:
+        """当前文件末尾的位置，新连接从这里开始接收事件"""
+        try:
+            stat = os.stat(self.path)
+            return f"{stat.st_ino}-{stat.st_size}"
+        except OSError:
+            return "0-0"
+
+    def read_since(self, cursor: str) -> Tuple[List[Tuple[str, str, Any]], str, bool]:
+        """读取cursor之后的事件
+        Returns:
+            Tuple: (事件ID, 事件类型, 数据)列表，新的cursor，以及文件是否已轮转
+        """
+        try:
+            file_id, offset = (int(part) for part in cursor.split('-', 1))
+        except (AttributeError, ValueError):
+            file_id, offset = 0, 0
+        current_id = self._file_id()
+        reset = file_id != current_id
+        if reset:
+            offset = 0
+        events = []
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    offset += len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    events.append((f"{current_id}-{offset}", record.get('event'), record.get('data')))
+        except OSError:
+            pass
+        return events, f"{current_id}-{offset}", reset and file_id != 0
+
+    def stream(self, last_event_id: Optional[str] = None, duration: float = 300, heartbeat: float = 15):
+        """生成SSE格式的事件流，duration秒后结束，由浏览器自动重连"""
+        cursor = last_event_id or self.cursor()
+        yield 'retry: 3000\n\n'
+        deadline = time.time() + duration
+        last_sent = time.time()
+        while time.time() < deadline:
+            events, cursor, reset = self.read_since(cursor)
+            if reset:
+                yield f"event: reset\ndata: {{}}\n\n"
+            for event_id, event, data in events:
+                yield f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            if events or reset:
+                last_sent = time.time()
+            elif time.time() - last_sent >= heartbeat:
+                yield ': ping\n\n'
+                last_sent = time.time()
+            # 本进程发布的事件立即唤醒，其他进程发布的事件在poll_interval内读取到
+            with self._cond:
+                self._cond.wait(self.poll_interval)
+
+class TaskJobManager:
+    """后台任务管理
+
+    手动执行的任务提交到后台线程池后立即返回任务ID，之后通过任务ID查询状态、进度和结果，
+    或取消任务。任务状态写入jobs_dir下的JSON文件，因此Gunicorn的其他worker也可以查询；
+    其他worker取消任务时写入取消标记文件，执行任务的进程在更新进度时检查该标记。
+    内存和jobs_dir中只保留最近keep个任务。
+    """
+    FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+    JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+    def __init__(self, jobs_dir: str, logger: logging.Logger, workers: int = 2, keep: int = 50,
+                 progress_interval: float = 1.0, events: Optional[EventBus] = None):
+        self.jobs_dir = jobs_dir
+        self.logger = logger
+        self.events = events
+        self.keep = keep
+        self.progress_interval = progress_interval
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='task-job')
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _job_path(self, job_id: str, suffix: str = '.json') -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}{suffix}")
+
+    def _view(self, job: Dict[str, Any], include_result: bool = False) -> Dict[str, Any]:
+        """任务的可序列化状态"""
+        view = {key: value for key, value in job.items() if key not in ('progress', 'result')}
+        view['progress'] = job['progress'].snapshot()
+        if include_result:
+            view['result'] = job.get('result')
+        return view
+
+    def _set_status(self, job: Dict[str, Any], status: str):
+        """更新任务状态，保存并发布job事件"""
+        job['status'] = status
+        self._save(job)
+        if self.events is not None:
+            self.events.publish('job', {'job_id': job['job_id'], 'task_name': job['task_name'], 'status': status})
+
+    def _save(self, job: Dict[str, Any]):
+        """将任务状态写入共享文件，并检查其他进程写入的取消标记"""
+        try:
+            if os.path.exists(self._job_path(job['job_id'], '.cancel')):
+                job['progress'].cancel()
+            tmp_path = f"{self._job_path(job['job_id'])}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._view(job, include_result=job['status'] in self.FINISHED_STATUSES), f, ensure_ascii=False)
+            os.replace(tmp_path, self._job_path(job['job_id']))
+        except Exception as e:
+            self.logger.error(f"写入任务 {job['job_id']} 状态时发生错误: {str(e)}")
+
+    def _prune(self):
+        """只保留最近keep个任务"""
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job['status'] in self.FINISHED_STATUSES]
+            for job_id in finished[:max(0, len(self._jobs) - self.keep)]:
+                del self._jobs[job_id]
+        try:
+            files = sorted((os.path.join(self.jobs_dir, name) for name in os.listdir(self.jobs_dir)
+                            if name.endswith('.json')), key=os.path.getmtime)
+            for path in files[:max(0, len(files) - self.keep)]:
+                os.remove(path)
+                cancel_path = path[:-len('.json')] + '.cancel'
+                if os.path.exists(cancel_path):
+                    os.remove(cancel_path)
+        except OSError as e:
+            self.logger.error(f"清理任务状态文件时发生错误: {str(e)}")
+
+    def submit(self, task_name: str, func, **meta) -> Dict[str, Any]:
+        """提交后台任务
+        Args:
+            task_name: 任务名称
+            func: 任务函数，参数为TaskProgress，返回值作为任务结果
+            meta: 记录在任务状态中的其他信息
+        Returns:
+            Dict: 任务状态
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'task_name': task_name,
+            'status': 'queued',
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'started_at': None,
+            'finished_at': None,
+            'error': None,
+            'result': None,
+            **meta
+        }
+        job['progress'] = TaskProgress(on_update=lambda progress: self._save(job), interval=self.progress_interval)
+        with self._lock:
+            self._jobs[job_id] = job
+        self._save(job)
+        self._prune()
+        self._executor.submit(self._run, job, func)
+        return self._view(job)
+
+    def _run(self, job: Dict[str, Any], func):
+        progress = job['progress']
+        if not progress.cancelled:
+            job['started_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+            self._set_status(job, 'running')
+            try:
+                job['result'] = func(progress)
+            except Exception as e:
+                self.logger.error(f"后台任务 {job['task_name']} 执行失败: {str(e)}")
+                job['error'] = str(e)
+        job['finished_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        self._set_status(job, 'failed' if job['error'] else ('cancelled' if progress.cancelled else 'succeeded'))
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """读取其他进程写入的任务状态"""
+        try:
+            with open(self._job_path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, job_id: str, include_result: bool = False) -> Optional[Dict[str, Any]]:
+        """获取任务状态和进度，任务不存在时返回None"""
+        if not self.JOB_ID_PATTERN.match(job_id or ''):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return self._view(job, include_result)
+        view = self._load(job_id)
+        if view is not None and not include_result:
+            view.pop('result', None)
+        return view
+
+    def list(self) -> List[Dict[str, Any]]:
+        """获取最近的任务状态，按创建时间倒序"""
+        jobs = {}
+        try:
+            for name in os.listdir(self.jobs_dir):
+                if name.endswith('.json'):
+                    view = self._load(name[:-len('.json')])
+                    if view is not None:
+                        view.pop('result', None)
+                        jobs[view['job_id']] = view
+        except OSError:
+            pass
+        with self._lock:
+            local_jobs = list(self._jobs.values())
+        for job in local_jobs:
+            jobs[job['job_id']] = self._view(job)
+        return sorted(jobs.values(), key=lambda view: view.get('created_at') or '', reverse=True)
+
+    def cancel(self, job_id: str) -> bool:
+        """取消任务：排队中的任务不再执行，执行中的任务处理完当前种子后停止
+
+        Returns:
+            bool: 任务是否存在且尚未结束
+        """
+        view = self.get(job_id)
+        if view is None or view['status'] in self.FINISHED_STATUSES:
+            return False
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            job['progress'].cancel()
+            if job['status'] == 'queued':
+                self._set_status(job, 'cancelled')
+        else:
+            # 任务在其他进程中执行，写入取消标记
+            with open(self._job_path(job_id, '.cancel'), 'w') as f:
+                f.write(str(os.getpid()))
+        self.logger.info(f"已请求取消任务 {view['task_name']}（{job_id}）")
+        return True
+
+class ConfigStore:
+    """配置存储
+
+    配置保存在内存中，修改在防抖时间内合并为一次写入：每次修改重新计时，最后一次修改debounce秒后写入。写入时持有跨进程文件锁，
+    先写临时文件再用os.replace替换，避免多个进程并发写入或写入中途崩溃导致配置文件被截断。
+    写入前如果配置文件已被其他进程修改，先重新读取，只覆盖本进程修改过的配置节。
+    每次配置发生变化（本进程修改或从文件重新加载）版本号加一，可用于判断缓存是否失效。
+    """
+
+    def __init__(self, path: str, debounce: float = 0.5, logger: Optional[logging.Logger] = None):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.debounce = debounce
+        self.logger = logger or logging.getLogger(__name__)
+        self.version = 0
+        self.mtime = 0.0
+        self._data: Dict[str, Any] = {}
+        self._dirty: Set[str] = set()
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+        self.load()
+        # 退出前写入尚未保存的修改
+        atexit.register(self.flush)
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        return self._data
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._data.get(key, default)
+
+    def _get_mtime(self) -> float:
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return 0.0
+
+    def _read_file(self) -> Dict[str, Any]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程的配置文件写锁，没有fcntl时只使用进程内锁"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, 'a+') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def changed_on_disk(self) -> bool:
+        """配置文件是否在上次读取或写入后被其他进程修改"""
+        mtime = self._get_mtime()
+        return bool(mtime) and mtime != self.mtime
+
+    def load(self) -> bool:
+        """从配置文件重新加载配置，本进程尚未写入的修改优先保留
+
+        Returns:
+            bool: 配置是否发生变化
+        """
+        with self._lock:
+            data = self._read_file()
+            self.mtime = self._get_mtime()
+            for key in self._dirty:
+                data[key] = self._data[key]
+            if data == self._data:
+                return False
+            self._data = data
+            self.version += 1
+            return True
+
+    def set(self, key: str, value: Any):
+        """修改一个配置节，在防抖时间后写入配置文件，防抖时间小于等于0时立即写入
+
+        value应为新的对象，与当前值相同时不做修改，版本号不变。
+        """
+        with self._lock:
+            if key in self._data and self._data[key] == value:
+                return
+            self._data[key] = value
+            self._dirty.add(key)
+            self.version += 1
+            if self.debounce <= 0:
+                self.flush()
+            else:
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._timer = threading.Timer(self.debounce, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> bool:
+        """将修改过的配置节写入配置文件
+
+        Returns:
+            bool: 是否写入成功，没有待写入的修改时返回True
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return True
+            try:
+                with self._file_lock():
+                    if self.changed_on_disk():
+                        # 合并其他进程对其他配置节的修改
+                        data = self._read_file()
+                        for key in self._dirty:
+                            data[key] = self._data[key]
+                        if data != self._data:
+                            self._data = data
+                            self.version += 1
+                    tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        yaml.safe_dump(self._data, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp_path, self.path)
+                    self.mtime = self._get_mtime()
+                self._dirty.clear()
+                return True
+            except Exception as e:
+                # 保留未写入的修改，下次修改或退出时重试
+                self.logger.error(f"写入配置文件失败: {str(e)}")
+                return False
 
 class QBitHelperBasic:
     def __init__(self, config: str):
@@ -46,8 +2461,7 @@ class QBitHelperBasic:
         if not os.path.exists(config):
             self._create_config_from_example(config)
         
-        with open(config, 'r', encoding='utf-8') as f:
-            self.config = yaml.safe_load(f)
+        self.config_store = ConfigStore(config)
 
         # 初始化logging
         self.log_file = os.path.join('data', self.config.get('default', {}).get('logging', {}).get('filename', 'QBittorrent-Helper.log'))
@@ -55,21 +2469,239 @@ class QBitHelperBasic:
         logging.basicConfig(filename=self.log_file, level=self.log_level, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', encoding='utf-8')
         self.logger = logging.getLogger(self.log_file)
         self.logger.info(f'加载配置文件：{os.path.abspath(config)}')
+        self.config_store.logger = self.logger
+        self.config_store.debounce = self.config.get('default', {}).get('config_store', {}).get('debounce', 0.5)
+
+        # 预编译规则缓存，保存规则时清空
+        self._compiled_rules: Dict[str, CompiledRule] = {}
+        self._compiled_rules_lock = threading.Lock()
 
-        # 初始化qbit_client
-        self.init_qbit_client()
+        # 初始化任务结果日志
+        task_log_config = self.config.get('default', {}).get('task_results', {})
+        self.task_result_log = TaskResultLog(os.path.join('data', 'task_results.log'),
+                                             max_bytes=task_log_config.get('log_max_bytes', 5 * 1024 * 1024),
+                                             backup_count=task_log_config.get('log_backup_count', 3))
+
+        # 运行指标：任务、规则、qBittorrent请求、调度延迟和仪表板刷新
+        metrics_config = self.config.get('default', {}).get('metrics', {})
+        self.metrics: Optional[Metrics] = None
+        if metrics_config.get('enabled', True):
+            self.metrics = Metrics(os.path.join('data', metrics_config.get('dir', 'metrics')), self.logger)
+
+        # 初始化qbit_client，每个qBittorrent实例一个；只处理Web请求的进程不在启动时登录，
+        # 成为leader时或第一次需要请求qBittorrent时才登录
+        self.is_leader = False
+        self.instances: Dict[str, QBitInstance] = {}
+        self._instance_local = threading.local()
+        self.init_qbit_client(connect=False)
         
-        # 初始化torrent_dict
-        self.init_torrent_dict()
+        # 仪表板快照，由leader进程后台刷新并写入共享文件
+        self._dashboard_snapshot: Optional[DashboardSnapshot] = None
+        self._dashboard_snapshot_mtime = 0.0
+        self._dashboard_lock = threading.Lock()
+        self.dashboard_snapshot_file = os.path.join('data', 'dashboard_snapshot.json')
+        self.scheduler_status_file = os.path.join('data', 'scheduler_status.json')
+        # 已应用到实例、规则缓存和调度器的配置版本
+        self._applied_config_version = self.config_store.version
+        self._applied_user_rules = self.get_user_rules()
+
+        # 本地状态存储：种子状态和规则执行记录
+        state_config = self.config.get('default', {}).get('state_store', {})
+        self.state_store: Optional[StateStore] = None
+        if state_config.get('enabled', True):
+            self.state_store = StateStore(os.path.join('data', state_config.get('filename', 'state.db')), self.logger,
+                                          batch_size=state_config.get('batch_size', 1000),
+                                          history_days=state_config.get('history_days', 30))
+
+        # 服务器推送事件：任务进度、任务结果和仪表板变化
+        events_config = self.config.get('default', {}).get('events', {})
+        self.events = EventBus(os.path.join('data', events_config.get('filename', 'events.jsonl')), self.logger,
+                               max_bytes=events_config.get('max_bytes', 1024 * 1024),
+                               poll_interval=events_config.get('poll_interval', 0.5))
+
+        # 后台执行的手动任务
+        jobs_config = self.config.get('default', {}).get('manual_jobs', {})
+        self.task_jobs = TaskJobManager(os.path.join('data', jobs_config.get('dir', 'task_jobs')), self.logger,
+                                        workers=jobs_config.get('workers', 2),
+                                        keep=jobs_config.get('keep', 50),
+                                        progress_interval=jobs_config.get('progress_interval', 1),
+                                        events=self.events)
+
+        # cron调度器和自动任务运行队列只在leader进程中创建，见try_become_leader
+        self.scheduler: Optional[BackgroundScheduler] = None
+        self.task_run_queue: Optional[TaskRunQueue] = None
+        # 后台线程（指标写入、leader选举重试）的停止信号
+        self._stopped = threading.Event()
+        atexit.register(self.shutdown)
+        if self.metrics is not None:
+            # 定时写入当前进程的指标供其他worker合并输出
+            self._start_periodic('运行指标写入', metrics_config.get('flush_interval', 15), self.metrics.flush)
+            atexit.register(self.metrics.flush)
         
-        # 初始化cron调度器
+        # 选举调度器leader：只有leader进程登录qBittorrent、加载自动任务、刷新仪表板快照，
+        # 其他进程定时重试，在leader退出后接替
+        self.leader_lock = SchedulerLeaderLock(os.path.join('data', 'scheduler.lock'))
+        if not self.try_become_leader():
+            self.logger.info(f"调度器由进程 {self.leader_lock.leader_pid()} 负责，当前进程 {os.getpid()} 仅处理Web请求")
+            self._start_periodic('调度器leader选举',
+                                 self.config.get('default', {}).get('scheduler', {}).get('leader_retry_interval', 30),
+                                 self.try_become_leader)
+
+    def _start_periodic(self, name: str, interval: float, func):
+        """在后台守护线程中每隔interval秒调用func，func返回True或调用shutdown后停止，interval不大于0时不启动"""
+        if not interval or interval <= 0:
+            return
+
+        def loop():
+            while not self._stopped.wait(interval):
+                try:
+                    if func() is True:
+                        return
+                except Exception as e:
+                    self.logger.error(f"{name}时发生错误: {str(e)}")
+        threading.Thread(target=loop, name=name, daemon=True).start()
+
+    def shutdown(self):
+        """停止后台线程和调度器"""
+        self._stopped.set()
+        if self.scheduler is not None and self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+    def _start_scheduler(self):
+        """leader进程创建cron调度器和自动任务运行队列"""
+        self.task_run_queue = TaskRunQueue(self._run_auto_task_batch, self.logger,
+                                           self.config.get('default', {}).get('scheduler', {}).get('batch_window', 1))
         self.scheduler = BackgroundScheduler()
+        if self.metrics is not None:
+            # 记录调度延迟
+            self.scheduler.add_listener(self._record_scheduler_lag, EVENT_JOB_SUBMITTED)
         self.scheduler.start()
-        # 注册退出时停止调度器
-        atexit.register(lambda: self.scheduler.shutdown())
+    
+    def try_become_leader(self) -> bool:
+        """尝试成为调度器leader，成功后登录所有实例，创建调度器并加载自动任务和后台刷新任务"""
+        if self.is_leader:
+            return True
+        leader_enabled = self.config.get('default', {}).get('scheduler', {}).get('leader_lock', True)
+        if leader_enabled and not self.leader_lock.try_acquire():
+            return False
+        # 先创建调度器再标记为leader，其他线程看到is_leader时调度器已可用
+        self._start_scheduler()
+        self.is_leader = True
+        self.logger.info(f"当前进程 {os.getpid()} 成为调度器leader")
+
+        # 登录所有实例并预热种子镜像，辅种字典只使用已缓存的内容指纹
+        self.run_on_instances(None, lambda: self.instance.connect())
+        self.run_on_instances(None, self.init_torrent_dict)
         
         # 加载自动任务
         self.load_auto_tasks()
+
+        # 后台定时刷新仪表板快照
+        self.start_dashboard_refresher()
+
+        # 定时检查配置文件是否被其他进程修改，并更新调度器状态
+        self.scheduler.add_job(
+            func=self._watch_config_file,
+            trigger='interval',
+            seconds=self.config.get('default', {}).get('scheduler', {}).get('config_watch_interval', 10),
+            id='config_watch',
+            name='配置文件变更检查',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        self._write_scheduler_status()
+        return True
+
+    @property
+    def config(self) -> Dict:
+        """当前配置，修改配置请使用config_store.set"""
+        return self.config_store.data
+
+    def _watch_config_file(self):
+        """leader进程中定时执行：配置文件被其他进程修改时增量重新加载配置"""
+        try:
+            if self.config_store.changed_on_disk():
+                self.logger.info("检测到配置文件被修改，重新加载配置")
+                self.reload_config()
+            elif self.config_store.version != self._applied_config_version:
+                self.apply_config()
+            self._write_scheduler_status()
+        except Exception as e:
+            self.logger.error(f"检查配置文件变更时发生错误: {str(e)}")
+
+    def reload_config(self) -> Dict[str, Dict[str, List[str]]]:
+        """从配置文件重新加载配置，并只应用发生变化的部分
+
+        - 只为新增或连接信息变化的qBittorrent实例重新创建客户端并登录，其余实例保留
+          现有的会话、种子镜像和tracker缓存
+        - 规则变化时清空规则编译缓存
+        - 自动任务按差异增量调度（仅leader进程）
+        Returns:
+            Dict: 实例和自动任务的变化
+        """
+        self.config_store.load()
+        changes = self.apply_config()
+        self.logger.info(f"配置已重新加载，实例变化：{changes['instances']}，自动任务变化：{changes['tasks']}")
+        return changes
+
+    def apply_config(self) -> Dict[str, Dict[str, List[str]]]:
+        """将当前版本的配置增量应用到实例、规则缓存和调度器"""
+        version = self.config_store.version
+        changes = {'instances': self.sync_instances(), 'tasks': {}}
+        user_rules = self.get_user_rules()
+        if user_rules != self._applied_user_rules:
+            self.clear_compiled_rules()
+            self._applied_user_rules = user_rules
+        if self.is_leader:
+            changes['tasks'] = self.sync_auto_tasks()
+            self.start_dashboard_refresher()
+        self._applied_config_version = version
+        return changes
+
+    def _write_json_file(self, path: str, data: Dict):
+        """原子地写入JSON文件，供其他进程读取"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _write_scheduler_status(self):
+        """leader进程将调度器状态写入共享文件"""
+        try:
+            self._write_json_file(self.scheduler_status_file, self.get_scheduler_status())
+        except Exception as e:
+            self.logger.error(f"写入调度器状态时发生错误: {str(e)}")
+
+    def get_scheduler_status(self) -> Dict:
+        """获取调度器状态，非leader进程读取leader写入的共享文件"""
+        if not self.is_leader:
+            try:
+                with open(self.scheduler_status_file, 'r', encoding='utf-8') as f:
+                    status = json.load(f)
+            except (OSError, ValueError):
+                status = {'leader_pid': self.leader_lock.leader_pid(), 'jobs': [], 'auto_task_results': []}
+            status['current_pid'] = os.getpid()
+            status['is_leader'] = False
+            return status
+        jobs = []
+        for job in self.scheduler.get_jobs():
+            next_run_time = getattr(job, 'next_run_time', None)
+            jobs.append({
+                'id': job.id,
+                'name': job.name,
+                'next_run_time': next_run_time.strftime('%Y-%m-%d %H:%M:%S') if next_run_time else None
+            })
+        return {
+            'leader_pid': os.getpid(),
+            'current_pid': os.getpid(),
+            'is_leader': True,
+            'updated_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'jobs': jobs,
+            'config_version': self.config_store.version,
+            'run_queue': self.task_run_queue.status(),
+            'auto_task_results': getattr(self, '_auto_task_results', [])
+        }
     
     def _create_config_from_example(self, config_path: str):
         """当配置文件不存在时，从示例文件创建配置文件"""
@@ -119,17 +2751,39 @@ class QBitHelperBasic:
     
     def save_user_config(self, new_config):
         """保存用户配置"""
-        if not self.config.get('user_config'):
-            self.config['user_config'] = {}
-        self.config['user_config'].update(new_config)
+        user_config = dict(self.config.get('user_config') or {})
+        user_config.update(new_config)
         
-        with open(self.config_data, 'w', encoding='utf-8') as f:
-            yaml.safe_dump(self.config, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
+        self.config_store.set('user_config', user_config)
         self.logger.info("用户配置已保存")
+        
+        # 只重新连接连接信息发生变化的实例，立即登录以便尽早发现连接信息错误
+        self.sync_instances(connect=True)
 
     def get_user_rules(self):
         """获取用户规则配置"""
         return self.config.get('user_rules', [])
+
+    def compile_rule(self, rule) -> CompiledRule:
+        """编译单个规则，已编译的规则直接返回"""
+        if isinstance(rule, CompiledRule):
+            return rule
+        key = json.dumps(rule, sort_keys=True, ensure_ascii=False, default=str)
+        with self._compiled_rules_lock:
+            compiled = self._compiled_rules.get(key)
+            if compiled is None:
+                compiled = CompiledRule.compile(rule)
+                self._compiled_rules[key] = compiled
+        return compiled
+
+    def compile_rules(self, rules) -> List[CompiledRule]:
+        """编译规则列表，并按priority排序"""
+        return sorted((self.compile_rule(rule) for rule in rules), key=lambda x: x.priority)
+
+    def clear_compiled_rules(self):
+        """清空预编译规则缓存"""
+        with self._compiled_rules_lock:
+            self._compiled_rules = {}
     
     def save_user_rules(self, new_config):
         """保存用户规则配置"""
@@ -226,10 +2880,9 @@ class QBitHelperBasic:
                 final_rules.append(rule)
         
         # 直接替换整个 user_rules 部分
-        self.config['user_rules'] = final_rules
-        
-        with open(self.config_data, 'w', encoding='utf-8') as f:
-            yaml.safe_dump(self.config, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
+        self.config_store.set('user_rules', final_rules)
+        self.clear_compiled_rules()
+        self._applied_user_rules = final_rules
         self.logger.info("用户规则已保存")
         
     # 新增用户任务相关方法
@@ -281,7 +2934,7 @@ class QBitHelperBasic:
             if isinstance(task, dict):
                 ordered_task = {}
                 # 按照固定顺序添加字段
-                field_order = ['index', 'task_name', 'task_type', 'cron', 'rules', 'status']
+                field_order = ['index', 'task_name', 'task_type', 'cron', 'priority', 'max_instances', 'rules', 'instances', 'status']
                 
                 # 处理索引
                 index = task['index']
@@ -311,42 +2964,87 @@ class QBitHelperBasic:
                 ordered_tasks.append(task)
         
         # 直接替换整个 user_tasks 部分
-        self.config['user_tasks'] = ordered_tasks
-        
-        with open(self.config_data, 'w', encoding='utf-8') as f:
-            yaml.safe_dump(self.config, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
+        self.config_store.set('user_tasks', ordered_tasks)
         self.logger.info("用户任务已保存")
         
         # 重新加载自动任务
         self.reload_auto_tasks()
         
     def reload_auto_tasks(self):
-        """重新加载自动任务到调度器"""
+        """按任务配置的变化增量更新调度器中的自动任务，非leader进程不调度任务"""
+        if not self.is_leader:
+            self.logger.info("当前进程不是调度器leader，自动任务将由leader进程检测到配置变更后重新加载")
+            return
         try:
-            # 清空所有现有的自动任务
-            self.scheduler.remove_all_jobs()
-            
-            # 重新加载自动任务
-            self.load_auto_tasks()
-            
-            self.logger.info("自动任务已重新加载")
+            self.sync_auto_tasks()
+            self._write_scheduler_status()
         except Exception as e:
             self.logger.error(f"重新加载自动任务时发生错误: {str(e)}")
     
+    @staticmethod
+    def _auto_task_job_id(index, task) -> str:
+        """自动任务在调度器中的ID，使用任务的index字段，保证任务顺序变化时ID不变"""
+        return f"auto_task_{task.get('index', index)}"
+    
+    def _enabled_auto_tasks(self) -> Dict[str, Tuple[int, Dict]]:
+        """获取所有启用的自动任务：调度器任务ID -> (任务位置, 任务配置)"""
+        enabled_tasks = {}
+        for index, task in enumerate(self.get_user_tasks().get('tasks', [])):
+            # 只处理自动任务，并且任务状态为启用（status为True）
+            if (task.get('task_type') == 'auto' and 
+                task.get('cron') and 
+                task.get('status', False)):  # 修改默认值为False（禁用）
+                enabled_tasks[self._auto_task_job_id(index, task)] = (index, task)
+        return enabled_tasks
+    
+    def sync_auto_tasks(self) -> Dict[str, List[str]]:
+        """按任务配置的变化增量更新调度器中的自动任务
+
+        新启用的任务加入调度器，被删除或禁用的任务移除，cron变化的任务重新调度；
+        只有规则、实例或名称变化的任务只更新执行参数，不影响下次执行时间。
+        Returns:
+            Dict[str, List[str]]: 新增、移除、重新调度和更新参数的任务名称
+        """
+        enabled_tasks = self._enabled_auto_tasks()
+        changes = {'added': [], 'removed': [], 'rescheduled': [], 'updated': []}
+        
+        for job in self.scheduler.get_jobs():
+            if job.id.startswith('auto_task_') and job.id not in enabled_tasks:
+                self.scheduler.remove_job(job.id)
+                changes['removed'].append(job.name)
+        
+        for job_id, (index, task) in enabled_tasks.items():
+            task_name = task.get('task_name', f'自动任务{index}')
+            job = self.scheduler.get_job(job_id)
+            try:
+                if job is None:
+                    self.add_auto_task_to_scheduler(index, task)
+                    changes['added'].append(task_name)
+                    continue
+                old_index, old_task = job.args
+                if old_task.get('cron') != task.get('cron'):
+                    self.scheduler.reschedule_job(job_id, trigger=CronTrigger.from_crontab(task.get('cron')))
+                    changes['rescheduled'].append(task_name)
+                elif old_task != task:
+                    changes['updated'].append(task_name)
+                if old_task != task or old_index != index:
+                    self.scheduler.modify_job(job_id, args=[index, dict(task)], name=task_name,
+                                              **self._auto_task_job_options(task))
+            except Exception as e:
+                self.logger.error(f"更新自动任务 {task_name} 时发生错误: {str(e)}")
+        
+        if any(changes.values()):
+            self.logger.info(f"自动任务已更新：{changes}")
+        return changes
+    
     def load_auto_tasks(self):
         """加载自动任务到调度器"""
         try:
-            user_tasks = self.get_user_tasks()
-            tasks = user_tasks.get('tasks', [])
-            
-            for index, task in enumerate(tasks):
-                # 只处理自动任务，并且任务状态为启用（status为True）
-                if (task.get('task_type') == 'auto' and 
-                    task.get('cron') and 
-                    task.get('status', False)):  # 修改默认值为False（禁用）
-                    self.add_auto_task_to_scheduler(index, task)
+            enabled_tasks = self._enabled_auto_tasks()
+            for index, task in enabled_tasks.values():
+                self.add_auto_task_to_scheduler(index, task)
             
-            self.logger.info(f"已加载 {len([t for t in tasks if t.get('task_type') == 'auto' and t.get('cron') and t.get('status', False)])} 个自动任务")
+            self.logger.info(f"已加载 {len(enabled_tasks)} 个自动任务")
         except Exception as e:
             self.logger.error(f"加载自动任务时发生错误: {str(e)}")
     
@@ -363,53 +3061,111 @@ class QBitHelperBasic:
             # 创建cron触发器
             trigger = CronTrigger.from_crontab(cron_expression)
             
-            # 生成任务ID，使用时间戳确保唯一性
-            task_id = f"auto_task_{index}_{int(time.time())}"
-            
-            # 添加任务到调度器
+            # 添加任务到调度器，保存任务配置的副本用于比较后续的修改
             self.scheduler.add_job(
-                func=self._execute_auto_task_and_log_result,
+                func=self._run_auto_task_job,
                 trigger=trigger,
-                id=task_id,
-                args=[index, task],
+                id=self._auto_task_job_id(index, task),
+                args=[index, dict(task)],
                 name=task.get('task_name', f'自动任务{index}'),
-                replace_existing=True
+                replace_existing=True,
+                **self._auto_task_job_options(task)
             )
             
             self.logger.info(f"已添加自动任务: {task.get('task_name', f'自动任务{index}')}")
-        except ConflictingIdError:
-            # 如果任务ID冲突，使用毫秒级时间戳重试
-            task_id = f"auto_task_{index}_{int(time.time() * 1000)}"
-            self.scheduler.add_job(
-                func=self._execute_auto_task_and_log_result,
-                trigger=trigger,
-                id=task_id,
-                args=[index, task],
-                name=task.get('task_name', f'自动任务{index}'),
-                replace_existing=True
-            )
-            self.logger.info(f"已添加自动任务: {task.get('task_name', f'自动任务{index}')}(ID冲突后重试)")
         except Exception as e:
             self.logger.error(f"添加自动任务时发生错误: {str(e)}")
             raise  # 重新抛出异常
     
     def remove_auto_task_from_scheduler(self, index):
-        """从调度器中移除自动任务"""
+        """从调度器中移除自动任务
+        Args:
+            index: 任务的index字段
+        """
+        if self.scheduler is None:
+            # 非leader进程没有调度器
+            return
         try:
-            jobs = self.scheduler.get_jobs()
-            for job in jobs:
-                if job.id.startswith(f"auto_task_{index}_"):
-                    self.scheduler.remove_job(job.id)
-                    self.logger.info(f"已从调度器中移除自动任务 ID: {job.id}")
-                    break
+            job_id = f"auto_task_{index}"
+            if self.scheduler.get_job(job_id):
+                self.scheduler.remove_job(job_id)
+                self.logger.info(f"已从调度器中移除自动任务 ID: {job_id}")
         except Exception as e:
             self.logger.error(f"从调度器中移除自动任务 {index} 时发生错误: {str(e)}")
     
-    def _execute_auto_task_and_log_result(self, index, task):
-        """执行自动任务并记录结果的包装函数"""
+    def _auto_task_max_instances(self, task) -> int:
+        """任务允许同时排队和运行的次数，任务未配置时使用default.scheduler.max_instances"""
+        return int(task.get('max_instances') or
+                   self.config.get('default', {}).get('scheduler', {}).get('max_instances', 1))
+
+    def _auto_task_job_options(self, task) -> Dict:
+        """自动任务在调度器中的执行选项：错过的多次触发合并为一次，并限制同时运行的次数"""
+        scheduler_config = self.config.get('default', {}).get('scheduler', {})
+        return {
+            'max_instances': self._auto_task_max_instances(task),
+            'coalesce': scheduler_config.get('coalesce', True),
+            'misfire_grace_time': scheduler_config.get('misfire_grace_time', 60)
+        }
+
+    def _run_auto_task_job(self, index, task):
+        """调度器触发自动任务：启用运行队列时加入队列，否则直接执行"""
+        if not self.config.get('default', {}).get('scheduler', {}).get('run_queue', True):
+            self._execute_auto_task_and_log_result(index, task)
+            return
+        self.task_run_queue.submit(self._auto_task_job_id(index, task),
+                                   task.get('task_name', f'自动任务{index}'),
+                                   (index, task),
+                                   priority=int(task.get('priority', 100)),
+                                   max_instances=self._auto_task_max_instances(task))
+
+    def _run_auto_task_batch(self, items: List[Tuple[int, Dict]]):
+        """执行运行队列中同时到期的一批自动任务
+
+        选择相同实例的任务共享一次种子遍历：合并各任务的规则（按任务优先级排序，同名规则
+        只执行一次）执行一次，再按任务拆分结果分别记录和通知。实例选择按解析后的实例名称
+        比较，写法或顺序不同但选中相同实例的任务也会合并。
+        Args:
+            items: 按优先级排序的(任务位置, 任务配置)列表
+        """
+        groups: Dict[Tuple, List[Tuple[int, Dict]]] = {}
+        for index, task in items:
+            try:
+                key = tuple(self.resolve_instances(task.get('instances')))
+            except ValueError:
+                # 实例选择无效的任务单独执行，由该任务记录错误，不影响同批的其他任务
+                key = (None, index)
+            groups.setdefault(key, []).append((index, task))
+        for instance_names, group in groups.items():
+            if len(group) == 1:
+                self._execute_auto_task_and_log_result(*group[0])
+                continue
+            task_names = [task.get('task_name', f'自动任务{index}') for index, task in group]
+            try:
+                self.logger.info(f"自动任务 {'、'.join(task_names)} 同时到期，共享一次种子遍历")
+                start_time = time.monotonic()
+                task_results = self.opt_instances_shared([self._match_task_rules(task) for index, task in group],
+                                                         list(instance_names), '+'.join(task_names))
+                shared_duration = time.monotonic() - start_time
+            except Exception as e:
+                self.logger.error(f"共享执行自动任务时发生错误，改为逐个执行: {str(e)}")
+                for index, task in group:
+                    self._execute_auto_task_and_log_result(index, task)
+                continue
+            for (index, task), result in zip(group, task_results):
+                self._execute_auto_task_and_log_result(index, task, result, shared_duration)
+
+    def _execute_auto_task_and_log_result(self, index, task, shared_result: Optional[Dict] = None,
+                                          shared_duration: float = 0.0):
+        """执行自动任务并记录结果的包装函数
+
+        shared_duration为共享种子遍历的耗时，计入任务执行耗时指标。
+        """
+        start_time = time.monotonic()
         try:
             # 执行自动任务并获取结果
-            result = self.execute_auto_task(index, task)
+            result = self.execute_auto_task(index, task, shared_result)
+            self._record_task_metrics(task.get('task_name', f'自动任务{index}'), 'auto',
+                                      shared_duration + time.monotonic() - start_time, result)
             
             # 将结果保存到类变量中，供前端获取
             if not hasattr(self, '_auto_task_results'):
@@ -431,9 +3187,12 @@ class QBitHelperBasic:
                 
             # 记录自动任务结果到日志文件
             self._log_task_result(task_result)
+            self._write_scheduler_status()
                 
         except Exception as e:
             self.logger.error(f"执行自动任务 {task.get('task_name', f'自动任务{index}')} 时发生错误: {str(e)}")
+            self._record_task_metrics(task.get('task_name', f'自动任务{index}'), 'auto',
+                                      shared_duration + time.monotonic() - start_time, {'error': str(e)})
             # 即使出错也记录，但标记为失败
             if not hasattr(self, '_auto_task_results'):
                 self._auto_task_results = []
@@ -452,18 +3211,58 @@ class QBitHelperBasic:
                 
             # 记录自动任务结果到日志文件（包括错误）
             self._log_task_result(task_result)
+            self._write_scheduler_status()
     
+    def _record_task_metrics(self, task_name: str, trigger: str, duration: float, result: Dict,
+                             cancelled: bool = False):
+        """记录任务执行次数、结果和耗时指标
+
+        结果分为success（全部成功）、failed（有种子处理失败）、error（任务异常）和cancelled（已取消）。
+        """
+        if self.metrics is None:
+            return
+        if cancelled:
+            outcome = 'cancelled'
+        elif isinstance(result.get('error'), str):
+            outcome = 'error'
+        elif any(isinstance(rule_result, dict) and rule_result.get('failed_count', 0) for rule_result in result.values()):
+            outcome = 'failed'
+        else:
+            outcome = 'success'
+        labels = {'task': task_name, 'trigger': trigger}
+        self.metrics.inc('qbit_helper_task_runs_total', {**labels, 'outcome': outcome})
+        self.metrics.observe('qbit_helper_task_duration_seconds', labels, duration)
+
+    def _record_scheduler_lag(self, event):
+        """调度器提交任务时记录实际提交时间与计划执行时间的差"""
+        if not event.scheduled_run_times:
+            return
+        scheduled = max(event.scheduled_run_times)
+        lag = (datetime.now(scheduled.tzinfo) - scheduled).total_seconds()
+        self.metrics.observe('qbit_helper_scheduler_lag_seconds', {'job': event.job_id}, max(0.0, lag))
+
+    def render_metrics(self) -> str:
+        """输出Prometheus文本格式的运行指标"""
+        for name, instance in self.instances.items():
+            self.metrics.set('qbit_helper_instance_up', {'instance': name}, 1 if instance.connected else 0)
+        return self.metrics.render()
+
+    def _format_run_timing(self, run_timing: Dict) -> str:
+        """将运行的耗时分解格式化为任务结果日志中的一行"""
+        phases = '，'.join(f"{RunTiming.PHASE_LABELS.get(name, name)} {seconds:.2f}s"
+                          for name, seconds in run_timing.get('phases', {}).items())
+        endpoints = sorted(run_timing.get('api_calls_by_endpoint', {}).items(), key=lambda item: -item[1])
+        api_detail = '，'.join(f"{endpoint} {count}" for endpoint, count in endpoints[:3])
+        instance = f"[{run_timing.get('instance')}]" if len(self.instances) > 1 else ''
+        line = (f"耗时{instance}：总计 {run_timing.get('total', 0):.2f}s（{phases}），"
+                f"API请求 {run_timing.get('api_calls', 0)} 次" + (f"（{api_detail}）" if api_detail else '') + "\n")
+        if run_timing.get('profile'):
+            line += f"性能分析：{run_timing['profile']}\n"
+        return line
+
     def _log_task_result(self, task_result):
         """将任务结果记录到日志文件"""
         try:
-            # 确保data目录存在
-            data_dir = 'data'
-            if not os.path.exists(data_dir):
-                os.makedirs(data_dir)
-            
-            # 日志文件路径
-            log_file = os.path.join(data_dir, 'task_results.log')
-            
             # 构建日志条目
             timestamp = task_result.get('timestamp', time.strftime('%Y-%m-%d %H:%M:%S'))
             task_name = task_result.get('task_name', '未知任务')
@@ -473,6 +3272,9 @@ class QBitHelperBasic:
             log_entry = f"[{timestamp}] 任务：{task_name}，结果：\n"
             log_entry_detail = ""
             
+            # 各运行的耗时分解，同一运行的多个规则只记录一次
+            run_timings = {}
+            
             # 遍历每个规则的结果
             for rule_name, rule_result in result.items():
                 # 跳过包含错误信息的条目
@@ -484,7 +3286,13 @@ class QBitHelperBasic:
                 skipped_count = rule_result.get('skipped_count', 0)
                 failed_count = rule_result.get('failed_count', 0)
                 
-                log_entry += f"{rule_name:<15} 已处理：{processed_count:<6} 已跳过：{skipped_count:<6} 已失败：{failed_count}\n"
+                log_entry += f"{rule_name:<15} 已处理：{processed_count:<6} 已跳过：{skipped_count:<6} 已失败：{failed_count}"
+                timing = rule_result.get('timing')
+                if timing:
+                    log_entry += f" 执行：{timing.get('match', 0):.2f}s 修改：{timing.get('mutate', 0):.2f}s"
+                    if timing.get('run'):
+                        run_timings[timing['run'].get('run_id')] = timing['run']
+                log_entry += "\n"
                   
                 # 添加处理详情（如果有）
                 processed_detail = rule_result.get('processed_detail', '')
@@ -495,36 +3303,38 @@ class QBitHelperBasic:
                 failed_detail = rule_result.get('failed_detail', '')
                 if failed_detail:
                     log_entry_detail += f"{failed_detail}\n"
+            for run_timing in run_timings.values():
+                log_entry += self._format_run_timing(run_timing)
             if log_entry_detail:
                 log_entry += f"详情：\n{log_entry_detail}"
                         
-            # 写入日志文件
-            with open(log_file, 'a', encoding='utf-8') as f:
-                f.write(log_entry)
+            # 写入日志文件，同时记录本次运行在日志中的位置
+            self.task_result_log.append(log_entry)
+            self.events.publish('task_result', {'task_name': task_name, 'timestamp': timestamp})
                 
         except Exception as e:
             self.logger.error(f"记录自动任务结果到日志文件时发生错误: {str(e)}")
     
-    def execute_auto_task(self, index, task):
-        """执行自动任务"""
+    def execute_auto_task(self, index, task, shared_result: Optional[Dict] = None):
+        """执行自动任务
+        Args:
+            index: 任务位置
+            task: 任务配置
+            shared_result: 与其他任务共享种子遍历时本任务的结果，为空时单独执行
+        """
         try:
             task_name = task.get('task_name', f'自动任务{index}')
-            rules_string = task.get('rules', '')
-            
-            self.logger.info(f"开始执行自动任务: {task_name}")
             
-            # 解析规则字符串
-            if rules_string:
-                rule_names = rules_string.split('|')
-                # 获取所有用户规则
-                all_rules = self.get_user_rules()
-                # 筛选出匹配的规则
-                matched_rules = [rule for rule in all_rules if rule.get('rule_name') in rule_names]
+            if shared_result is None:
+                self.logger.info(f"开始执行自动任务: {task_name}")
+                
+                # 解析规则字符串，筛选出匹配的规则
+                matched_rules = self._match_task_rules(task)
+                
+                # 在任务选择的实例上执行
+                result = self.opt_instances(matched_rules, task.get('instances'), task_name)
             else:
-                matched_rules = []
-            
-            # 执行任务
-            result = self.opt_all_torrent(matched_rules)
+                result = shared_result
             
             # 计算总体统计信息
             processed_count = 0
@@ -573,6 +3383,7 @@ class QBitHelperBasic:
                     title = f"qBittorrent助手 - 自动任务执行完成但有失败"
                     desp = f"任务名称: {task_name}\n成功处理种子数: {processed_count}\n跳过种子数: {skipped_count}\n失败种子数: {failed_count}\n失败详情: {'; '.join(failed_details)}"
                     self.send_webhook_to_custom(title, desp)
+            return result
         except Exception as e:
             self.logger.error(f"执行自动任务 \"{task.get('task_name', '未命名')}\" 时发生错误: {str(e)}")
             
@@ -587,9 +3398,32 @@ class QBitHelperBasic:
                 title = f"qBittorrent助手 - 自动任务执行异常"
                 desp = f"任务名称: {task.get('task_name', '未命名')}\n错误信息: {str(e)}"
                 self.send_webhook_to_custom(title, desp)
+            return {'error': str(e)}
+
+    def submit_manual_task(self, task_index, instances=None) -> Dict:
+        """在后台执行手动任务，立即返回任务状态（包含job_id）
+        Args:
+            task_index: 任务索引
+            instances: 实例选择，为空时使用任务配置的实例
+        """
+        tasks = self.get_user_tasks().get('tasks', [])
+        if task_index is None or task_index < 0 or task_index >= len(tasks):
+            raise ValueError('任务索引无效')
+        task_name = tasks[task_index].get('task_name', '未命名任务')
+        # 提交前检查实例名称，无效时直接返回错误
+        self.resolve_instances(instances or tasks[task_index].get('instances'))
+        return self.task_jobs.submit(task_name,
+                                     lambda progress: self.execute_manual_task(task_index, instances, progress),
+                                     task_index=task_index)
 
-    def execute_manual_task(self, task_index):
-        """执行手动任务"""
+    def execute_manual_task(self, task_index, instances=None, progress: Optional[TaskProgress] = None):
+        """执行手动任务
+        Args:
+            task_index: 任务索引
+            instances: 实例选择，为空时使用任务配置的实例
+            progress: 任务进度，用于后台执行时查询进度和取消任务
+        """
+        task_name = '未命名任务'
         try:
             # 获取用户任务
             user_tasks = self.get_user_tasks()
@@ -602,24 +3436,22 @@ class QBitHelperBasic:
             # 获取任务信息
             task = tasks[task_index]
             task_name = task.get('task_name', '未命名任务')
-            rules_string = task.get('rules', '')
             
-            # 解析规则字符串
-            if rules_string:
-                rule_names = rules_string.split('|')
-                # 获取所有用户规则
-                all_rules = self.get_user_rules()
-                # 筛选出匹配的规则
-                matched_rules = [rule for rule in all_rules if rule.get('rule_name') in rule_names]
-            else:
-                matched_rules = []
+            # 解析规则字符串，筛选出匹配的规则
+            matched_rules = self._match_task_rules(task)
             
-            self.logger.info(f'执行手动任务："{task_name}"，规则：{[rule.get("rule_name") for rule in matched_rules]}')
-            results = self.opt_all_torrent(matched_rules)
+            instance_names = self.resolve_instances(instances or task.get('instances'))
+            
+            self.logger.info(f'执行手动任务："{task_name}"，规则：{[rule.get("rule_name") for rule in matched_rules]}，实例：{instance_names}')
+            # 手动任务总是处理所有种子
+            start_time = time.monotonic()
+            results = self.opt_instances(matched_rules, instance_names, task_name, progress, incremental=False)
+            cancelled = progress is not None and progress.cancelled
+            self._record_task_metrics(task_name, 'manual', time.monotonic() - start_time, results, cancelled)
             
             # 记录手动任务执行结果到日志文件
             task_result = {
-                'task_name': task_name,
+                'task_name': f'{task_name}（已取消）' if cancelled else task_name,
                 'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
                 'result': results
             }
@@ -627,7 +3459,8 @@ class QBitHelperBasic:
             
             return {
                 'success': True,
-                'message': f'手动任务 "{task_name}" 执行完成'
+                'message': f'手动任务 "{task_name}" 已取消' if cancelled else f'手动任务 "{task_name}" 执行完成',
+                'data': results
             }
             
         except Exception as e:
@@ -641,6 +3474,79 @@ class QBitHelperBasic:
             self._log_task_result(task_result)
             raise
     
+    def plan_manual_task(self, task_index, limit: Optional[int] = 1000, instances=None) -> Dict:
+        """预览任务的执行结果，不对qBittorrent做任何修改
+
+        复用种子镜像和tracker缓存，按opt_all_torrent的逻辑执行任务中的规则，
+        修改操作只记录在dry_run缓冲区中。预览只读取种子，不获取实例锁，
+        不必等待正在执行的任务结束，也不做性能分析。
+        Args:
+            task_index: 任务索引
+            limit: 返回的种子修改明细的最大条数，为空时返回全部
+            instances: 实例选择，为空时使用任务配置的实例
+        Returns:
+            Dict: 各规则的预计处理统计，以及每个种子计划执行的标签/tracker修改
+        """
+        tasks = self.get_user_tasks().get('tasks', [])
+        if task_index is None or task_index < 0 or task_index >= len(tasks):
+            raise ValueError('任务索引无效')
+        task = tasks[task_index]
+        task_name = task.get('task_name', '未命名任务')
+        matched_rules = self._match_task_rules(task)
+        self.logger.info(f'预览任务："{task_name}"，规则：{[rule.get("rule_name") for rule in matched_rules]}')
+
+        def plan_instance():
+            mutation_buffer = MutationBuffer(self.qbit_client, self.logger, dry_run=True)
+            result_sink = self.create_result_sink(matched_rules, task_name, run_log=False)
+            results = self.opt_all_torrent(matched_rules, mutation_buffer=mutation_buffer, result_sink=result_sink)
+            changes = []
+            for torrent_hash, operations in mutation_buffer.planned.items():
+                torrent = self.torrent_mirror.torrents.get(torrent_hash)
+                change = {
+                    'instance': self.instance.name,
+                    'hash': torrent_hash,
+                    'name': torrent.get('name', '') if torrent is not None else ''
+                }
+                for operation in MutationBuffer.TAG_OPERATIONS + MutationBuffer.TRACKER_OPERATIONS:
+                    change[operation] = operations.get(operation, [])
+                changes.append(change)
+            return results, changes
+
+        instance_plans = self.run_on_instances(instances or task.get('instances'), plan_instance)
+        results = self._merge_instance_results({
+            name: plan if isinstance(plan, Exception) else plan[0] for name, plan in instance_plans.items()
+        })
+        changes = [change for plan in instance_plans.values() if not isinstance(plan, Exception) for change in plan[1]]
+        changes.sort(key=lambda x: (x['instance'], x['name']))
+
+        return {
+            'task_name': task_name,
+            'instances': list(instance_plans),
+            'summary': {
+                rule_name: {
+                    'processed_count': rule_result.get('processed_count', 0),
+                    'skipped_count': rule_result.get('skipped_count', 0),
+                    'failed_count': rule_result.get('failed_count', 0),
+                    'match_time': rule_result.get('timing', {}).get('match', 0)
+                }
+                for rule_name, rule_result in results.items() if isinstance(rule_result, dict)
+            },
+            # 各实例运行的耗时分解
+            'timings': list({rule_result['timing']['run']['run_id']: rule_result['timing']['run']
+                             for rule_result in results.values()
+                             if isinstance(rule_result, dict) and rule_result.get('timing', {}).get('run')}.values()),
+            'total_changes': len(changes),
+            'changes': changes[:limit] if limit else changes
+        }
+
+    def _match_task_rules(self, task) -> List[Dict]:
+        """根据任务的rules字符串筛选出匹配的用户规则"""
+        rules_string = task.get('rules', '')
+        if not rules_string:
+            return []
+        rule_names = rules_string.split('|')
+        return [rule for rule in self.get_user_rules() if rule.get('rule_name') in rule_names]
+
     def send_webhook_to_serverchan(self, title: str, desp: str, tags: Optional[str] = None) -> bool:
         """发送消息到Server酱"""
         try:
@@ -747,29 +3653,258 @@ class QBitHelperBasic:
             
         return result
     
+    def get_instance_configs(self) -> List[Dict]:
+        """获取所有qBittorrent实例的配置
+
+        user_config.qbittorrent为默认实例，user_config.qbittorrent_instances中为其他实例，
+        每个实例包含name、host、username、password。
+        """
+        user_config = self.config.get('user_config', {})
+        default_instance = dict(user_config.get('qbittorrent', {}) or {})
+        default_instance['name'] = default_instance.get('name') or DEFAULT_INSTANCE_NAME
+        instance_configs = [default_instance]
+        for instance_config in user_config.get('qbittorrent_instances', []) or []:
+            if isinstance(instance_config, dict) and instance_config.get('host'):
+                instance_configs.append(instance_config)
+        return instance_configs
+
     # 初始化qbit_client
-    def init_qbit_client(self):
+    def init_qbit_client(self, connect: bool = True):
+        """为每个配置的qBittorrent实例创建客户端
+
+        Args:
+            connect: 是否立即并行登录，为False时在第一次请求时登录
+        Returns:
+            bool: 所有实例是否都连接成功
+        """
         try:
-            self.host = self.config.get('user_config', {}).get('qbittorrent', {}).get('host')
-            self.username = self.config.get('user_config', {}).get('qbittorrent', {}).get('username')
-            self.password = self.config.get('user_config', {}).get('qbittorrent', {}).get('password')
-            self.qbit_client = qbittorrentapi.Client(host=self.host, username=self.username, password=self.password)
-            self.qbit_client.auth_log_in()
-            if not self.qbit_client.is_logged_in:
-                raise Exception('登录验证失败')
-            self.logger.info(f"成功连接到qBittorrent，版本：{self.qbit_client.app_version()}")
-            return True
+            self.instances = {}
+            self.sync_instances(connect)
+            return all(instance.connected for instance in self.instances.values())
         except Exception as e:
             self.logger.error(f"初始化qBittorrent客户端失败: {str(e)}")
             return False
 
-    def init_torrent_dict(self):
-        """初始化torrent字典"""
+    def _create_instance(self, name: str, instance_config: Dict) -> QBitInstance:
+        """根据配置创建qBittorrent实例"""
+        tracker_cache_config = self.config.get('default', {}).get('tracker_cache', {})
+        rate_limit_config = self.config.get('default', {}).get('rate_limit', {})
+        connection_config = dict(self.config.get('default', {}).get('connection', {}))
+        if not connection_config.get('pool_maxsize'):
+            # 连接池大小默认覆盖tracker预取和规则执行的线程数
+            execution_workers = self.config.get('default', {}).get('execution', {}).get('workers', 1)
+            connection_config['pool_maxsize'] = tracker_cache_config.get('workers', 8) + execution_workers + 2
+        return QBitInstance(name, instance_config.get('host'),
+                            instance_config.get('username'),
+                            instance_config.get('password'),
+                            self.logger, tracker_cache_config, rate_limit_config,
+                            connection_config,
+                            self.config.get('default', {}).get('file_list_cache', {}),
+                            self.metrics)
+
+    def sync_instances(self, connect: Optional[bool] = None) -> Dict[str, List[str]]:
+        """按配置增量更新qBittorrent实例
+
+        只为新增或连接信息（host、username、password）变化的实例创建新客户端并登录，
+        连接信息未变化的实例保留现有的会话、种子镜像和tracker缓存。
+        Args:
+            connect: 是否立即登录新客户端，为None时只有leader进程立即登录，其他进程在第一次请求时登录
+        Returns:
+            Dict[str, List[str]]: 新增、重新连接和移除的实例名称
+        """
+        instance_configs = {}
+        for index, instance_config in enumerate(self.get_instance_configs()):
+            name = str(instance_config.get('name') or f'实例{index + 1}')
+            if name in instance_configs:
+                self.logger.error(f"qBittorrent实例名称重复：{name}，已忽略")
+                continue
+            instance_configs[name] = instance_config
+
+        changes = {'added': [], 'reconnected': [], 'removed': []}
+        instances = {}
+        for name, instance_config in instance_configs.items():
+            old_instance = self.instances.get(name)
+            credentials = (instance_config.get('host'), instance_config.get('username'), instance_config.get('password'))
+            if old_instance is not None and (old_instance.host, old_instance.username, old_instance.password) == credentials:
+                instances[name] = old_instance
+                continue
+            instances[name] = self._create_instance(name, instance_config)
+            changes['reconnected' if old_instance is not None else 'added'].append(name)
+        changes['removed'] = [name for name in self.instances if name not in instances]
+        self.instances = instances
+
+        new_instances = changes['added'] + changes['reconnected']
+        if new_instances and (self.is_leader if connect is None else connect):
+            self.run_on_instances(new_instances, lambda: self.instance.connect())
+        return changes
+
+    @property
+    def instance(self) -> QBitInstance:
+        """当前线程正在处理的qBittorrent实例，未指定时为默认实例"""
+        instance = getattr(self._instance_local, 'instance', None)
+        if instance is None:
+            if not self.instances:
+                raise Exception('未配置qBittorrent实例')
+            instance = next(iter(self.instances.values()))
+        return instance
+
+    @property
+    def qbit_client(self) -> ManagedClient:
+        return self.instance.qbit_client
+
+    @property
+    def torrent_mirror(self) -> TorrentMirror:
+        return self.instance.torrent_mirror
+
+    @property
+    def tracker_cache(self) -> TrackerCache:
+        return self.instance.tracker_cache
+
+    @property
+    def file_list_cache(self) -> FileListCache:
+        return self.instance.file_list_cache
+
+    @property
+    def torrent_dict(self) -> Dict[str, List[str]]:
+        return self.instance.torrent_dict
+
+    @torrent_dict.setter
+    def torrent_dict(self, value: Dict[str, List[str]]):
+        self.instance.torrent_dict = value
+
+    def resolve_instances(self, selector=None) -> List[str]:
+        """解析实例选择
+
+        Args:
+            selector: 实例名称列表，或以|分隔的实例名称字符串，为空或'all'时选择所有实例
+        Returns:
+            List[str]: 按配置顺序排列的实例名称
+        """
+        if not selector or selector == 'all':
+            return list(self.instances)
+        names = selector.split('|') if isinstance(selector, str) else list(selector)
+        names = {name.strip() for name in names if name and name.strip()}
+        unknown = names - set(self.instances)
+        if unknown:
+            raise ValueError(f"未知的qBittorrent实例：{', '.join(sorted(unknown))}")
+        return [name for name in self.instances if name in names]
+
+    def _call_on_instance(self, instance: QBitInstance, func, *args, **kwargs):
+        """在当前线程中切换到指定实例后调用func"""
+        previous = getattr(self._instance_local, 'instance', None)
+        self._instance_local.instance = instance
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._instance_local.instance = previous
+
+    def run_on_instances(self, selector, func, *args, **kwargs) -> Dict[str, Any]:
+        """在选中的每个实例上执行func，多个实例时使用线程池并行执行
+
+        func中通过self.qbit_client、self.torrent_mirror等访问的是当前执行的实例。
+        Args:
+            selector: 实例选择，见resolve_instances
+            func: 要执行的函数
+        Returns:
+            Dict[str, Any]: 实例名称 -> func的返回值，执行异常时为异常对象
+        """
+        names = self.resolve_instances(selector)
+        results: Dict[str, Any] = {}
+        if len(names) <= 1:
+            for name in names:
+                try:
+                    results[name] = self._call_on_instance(self.instances[name], func, *args, **kwargs)
+                except Exception as e:
+                    self.logger.error(f"在qBittorrent实例 {name} 上执行时发生错误: {str(e)}")
+                    results[name] = e
+            return results
+        max_workers = self.config.get('default', {}).get('instances', {}).get('workers', 4)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(names))),
+                                thread_name_prefix='qbit-instance') as executor:
+            futures = {name: executor.submit(self._call_on_instance, self.instances[name], func, *args, **kwargs)
+                       for name in names}
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    self.logger.error(f"在qBittorrent实例 {name} 上执行时发生错误: {str(e)}")
+                    results[name] = e
+        return results
+
+    def _instance_label(self, name: str, key: str) -> str:
+        """配置了多个实例时，在结果的键前加上实例名称"""
+        return f"[{name}] {key}" if len(self.instances) > 1 else key
+
+    def _merge_instance_results(self, results: Dict[str, Any]) -> Dict:
+        """按实例汇总各实例的规则处理结果，多个实例时结果的键形如 [实例名] 规则名"""
+        merged = {}
+        for name, result in results.items():
+            if isinstance(result, Exception):
+                merged[self._instance_label(name, 'error')] = str(result)
+                continue
+            for rule_name, rule_result in result.items():
+                merged[self._instance_label(name, rule_name)] = rule_result
+        return merged
+
+    def _opt_instance(self, rules, run_name: str = '', progress: Optional[TaskProgress] = None,
+                      incremental: Optional[bool] = None) -> Dict:
+        """在当前实例上执行规则，单独记录运行日志"""
+        instance_run_name = run_name
+        if len(self.instances) > 1:
+            instance_run_name = f"{run_name}@{self.instance.name}"
+        with self.instance.lock:
+            return self.opt_all_torrent(rules, result_sink=self.create_result_sink(rules, instance_run_name),
+                                        progress=progress, incremental=incremental)
+
+    def opt_instances(self, rules, selector=None, run_name: str = '', progress: Optional[TaskProgress] = None,
+                      incremental: Optional[bool] = None) -> Dict:
+        """在选中的实例上并行执行规则，每个实例单独记录运行日志，结果按实例汇总"""
+        return self._merge_instance_results(self.run_on_instances(selector, self._opt_instance, rules, run_name,
+                                                                  progress, incremental))
+
+    def opt_instances_shared(self, rules_list: List[List[Dict]], selector=None, run_name: str = '') -> List[Dict]:
+        """多个任务在选中的实例上共享一次种子遍历，返回每个任务各自的结果
+
+        Args:
+            rules_list: 每个任务的规则列表，同名规则只执行一次
+            selector: 实例选择，见resolve_instances
+            run_name: 运行名称
+        Returns:
+            List[Dict]: 与rules_list一一对应的结果，格式同opt_instances
+        """
+        combined_rules = []
+        rule_names = set()
+        for rules in rules_list:
+            for rule in rules:
+                if rule.get('rule_name') not in rule_names:
+                    rule_names.add(rule.get('rule_name'))
+                    combined_rules.append(rule)
+        instance_results = self.run_on_instances(selector, self._opt_instance, combined_rules, run_name)
+        task_results = []
+        for rules in rules_list:
+            task_rule_names = {rule.get('rule_name') for rule in rules}
+            task_results.append(self._merge_instance_results({
+                name: result if isinstance(result, Exception) else
+                {rule_name: rule_result for rule_name, rule_result in result.items() if rule_name in task_rule_names}
+                for name, result in instance_results.items()
+            }))
+        return task_results
+
+    def init_torrent_dict(self, torrents: Optional[List[Any]] = None, fetch_file_lists: bool = False):
+        """初始化torrent字典：内容指纹 -> 具有相同内容的种子hash列表
+        Args:
+            torrents: 种子列表，为空时从种子镜像获取
+            fetch_file_lists: 是否为尚未缓存指纹的种子获取文件列表，为False时这些种子不计入字典
+        """
         try:
             self.torrent_dict = {}
-            torrents = self.qbit_client.torrents_info()
+            if torrents is None:
+                torrents = self.torrent_mirror.get_torrents()
+            self.file_list_cache.prefetch(torrents, fetch_missing=fetch_file_lists)
             for torrent in torrents:
-                identifier = f"{torrent.save_path}_{torrent.name}_{torrent.size}"
+                identifier = self.file_list_cache.get(torrent.hash)
+                if identifier is None:
+                    continue
                 if identifier not in self.torrent_dict:
                     self.torrent_dict[identifier] = []
                 self.torrent_dict[identifier].append(torrent.hash)
@@ -779,8 +3914,9 @@ class QBitHelperBasic:
 
     # 获取种子信息
     def get_dashboard_info(self) -> DashboardInfo:
-        """获取用于在dashboard呈现的信息"""
-        torrents = self.qbit_client.torrents_info()
+        """获取当前实例用于在dashboard呈现的信息"""
+        torrents = self.torrent_mirror.get_torrents()
+        self.tracker_cache.prefetch(torrents)
         total_torrents = len(torrents)
         total_trackers = 0
         non_working_trackers = 0
@@ -790,7 +3926,7 @@ class QBitHelperBasic:
 
         for torrent in torrents:
             # 统计tracker信息，不统计被禁用的tracker
-            trackers = torrent.trackers
+            trackers = self.tracker_cache.get(torrent)
             for tracker in trackers:
                 if tracker.status == 0:  # 0表示禁用
                     continue
@@ -798,6 +3934,7 @@ class QBitHelperBasic:
                 if tracker.status != 2:
                     non_working_trackers += 1
                     non_working_trackers_detail.append({
+                            'instance': self.instance.name,
                             'url': tracker.url[:50] + ('...' if len(tracker.url) > 50 else ''),
                             'torrent_name': torrent.name[:50] + ('...' if len(torrent.name) > 50 else ''),
                             'tracker_msg': tracker.msg[:50] + ('...' if len(tracker.msg) > 50 else '')
@@ -827,13 +3964,176 @@ class QBitHelperBasic:
             tag_counts=tag_counts,
             non_working_trackers_detail=non_working_trackers_detail
         )
+        rate_limiter = self.instance.rate_limiter
+        if rate_limiter is not None:
+            dashinfo.request_rates = {
+                self.instance.name: {operation: stats['rate'] for operation, stats in rate_limiter.stats().items()}
+            }
         return dashinfo
 
-    def duplicate_tag_opt_single_torrent_single_rule(self, torrent, rule) -> Dict[str, str]:
+    def _apply_mutation(self, mutation_buffer: Optional[MutationBuffer], operation: str, value: str,
+                        torrent: Any, result: Dict, success_detail: str, failed_detail: str):
+        """提交一次修改操作，传入缓冲区时等待批量提交，否则立即执行"""
+        result['detail'] = success_detail
+        if mutation_buffer is not None:
+            mutation_buffer.add(operation, value, torrent.hash, result, failed_detail)
+            return
+        mutation_buffer = MutationBuffer(self.qbit_client, self.logger, tracker_cache=self.tracker_cache)
+        mutation_buffer.add(operation, value, torrent.hash, result, failed_detail)
+        mutation_buffer.flush()
+
+    def _tracker_urls(self, torrent: Any, mutation_buffer: Optional[MutationBuffer] = None) -> List[str]:
+        """种子的tracker URL，包括同一次运行中先执行的规则缓存在mutation_buffer中、尚未提交的修改"""
+        urls = [tracker.url for tracker in self.tracker_cache.get(torrent)]
+        if mutation_buffer is None:
+            return urls
+        return mutation_buffer.tracker_urls(torrent.hash, urls)
+
+    def start_dashboard_refresher(self):
+        """按配置的间隔在调度器中添加仪表板快照刷新任务，间隔为0时不在后台刷新"""
+        interval = self.config.get('default', {}).get('dashboard', {}).get('refresh_interval', 60)
+        if not interval or interval <= 0:
+            if self.scheduler.get_job('dashboard_refresh'):
+                self.scheduler.remove_job('dashboard_refresh')
+            return
+        self.scheduler.add_job(
+            func=self.refresh_dashboard_snapshot,
+            trigger='interval',
+            seconds=interval,
+            id='dashboard_refresh',
+            name='仪表板快照刷新',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        self.logger.info(f"已启动仪表板快照后台刷新，间隔 {interval} 秒")
+
+    def refresh_dashboard_snapshot(self) -> Optional[DashboardSnapshot]:
+        """重新计算仪表板信息并更新快照，内容不变时保持原版本号"""
+        with self._dashboard_lock:
+            try:
+                start_time = time.time()
+                # 并行获取各实例的信息，获取失败的实例不计入汇总
+                instance_infos = {name: info for name, info in self.run_on_instances(None, self.get_dashboard_info).items()
+                                  if isinstance(info, DashboardInfo)}
+                if not instance_infos:
+                    raise Exception('所有qBittorrent实例均获取失败')
+                info = DashboardInfo.merge(instance_infos.values())
+                refresh_duration = time.time() - start_time
+                if self.metrics is not None:
+                    self.metrics.observe('qbit_helper_dashboard_refresh_duration_seconds', {}, refresh_duration)
+                payload = json.dumps({name: instance_info.__dict__ for name, instance_info in instance_infos.items()},
+                                     sort_keys=True, ensure_ascii=False)
+                version = hashlib.sha1(payload.encode('utf-8')).hexdigest()
+                snapshot = self._dashboard_snapshot
+                if snapshot is not None and snapshot.version == version:
+                    snapshot.updated_at = time.time()
+                    snapshot.refresh_duration = refresh_duration
+                else:
+                    self._dashboard_snapshot = DashboardSnapshot(info=info, version=version,
+                                                                 updated_at=time.time(),
+                                                                 refresh_duration=refresh_duration,
+                                                                 instances=instance_infos)
+                    if self.is_leader:
+                        self._publish_dashboard_delta(snapshot, self._dashboard_snapshot)
+                # leader进程将快照写入共享文件，供其他worker直接读取
+                if self.is_leader:
+                    snapshot = self._dashboard_snapshot
+                    self._write_json_file(self.dashboard_snapshot_file, {
+                        'info': snapshot.info.__dict__,
+                        'instances': {name: instance_info.__dict__ for name, instance_info in snapshot.instances.items()},
+                        'version': snapshot.version,
+                        'updated_at': snapshot.updated_at,
+                        'refresh_duration': snapshot.refresh_duration
+                    })
+                self.logger.debug(f"仪表板快照已刷新，耗时 {refresh_duration:.2f} 秒")
+            except Exception as e:
+                self.logger.error(f"刷新仪表板快照时发生错误: {str(e)}")
+            return self._dashboard_snapshot
+
+    def _publish_dashboard_delta(self, old: Optional[DashboardSnapshot], new: DashboardSnapshot):
+        """发布仪表板变化事件，只包含汇总信息中发生变化的字段"""
+        old_info = old.info.__dict__ if old is not None else {}
+        changes = {key: value for key, value in new.info.__dict__.items() if old_info.get(key) != value}
+        self.events.publish('dashboard', {
+            'version': new.version,
+            'updated_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(new.updated_at)),
+            'instances': list(new.instances),
+            'changes': changes
+        })
+
+    def _load_shared_dashboard_snapshot(self, max_age: float) -> Optional[DashboardSnapshot]:
+        """读取leader进程写入的仪表板快照，文件不存在或过旧时返回None"""
+        try:
+            mtime = os.path.getmtime(self.dashboard_snapshot_file)
+            if mtime != self._dashboard_snapshot_mtime:
+                with open(self.dashboard_snapshot_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self._dashboard_snapshot = DashboardSnapshot(info=DashboardInfo(**data['info']),
+                                                             version=data['version'],
+                                                             updated_at=data['updated_at'],
+                                                             refresh_duration=data['refresh_duration'],
+                                                             instances={name: DashboardInfo(**instance_info)
+                                                                        for name, instance_info in data.get('instances', {}).items()})
+                self._dashboard_snapshot_mtime = mtime
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        snapshot = self._dashboard_snapshot
+        if snapshot is None or time.time() - snapshot.updated_at > max_age:
+            return None
+        return snapshot
+
+    def get_dashboard_snapshot(self) -> DashboardSnapshot:
+        """获取仪表板快照，后台刷新未启用或尚无快照时同步刷新
+
+        非leader进程优先使用leader写入的共享快照，共享快照过旧时才自行计算。
+        """
+        snapshot = self._dashboard_snapshot
+        interval = self.config.get('default', {}).get('dashboard', {}).get('refresh_interval', 60)
+        if interval and interval > 0 and not self.is_leader:
+            snapshot = self._load_shared_dashboard_snapshot(max_age=max(interval * 3, 300))
+        if snapshot is None or not interval or interval <= 0:
+            snapshot = self.refresh_dashboard_snapshot()
+        if snapshot is None:
+            raise Exception('获取仪表板信息失败')
+        return snapshot
+
+    def select_dashboard_info(self, snapshot: DashboardSnapshot, selector=None) -> Tuple[DashboardInfo, str]:
+        """从快照中选出部分实例的仪表板信息
+
+        Args:
+            snapshot: 仪表板快照
+            selector: 实例选择，见resolve_instances，为空时返回所有实例的汇总
+        Returns:
+            Tuple[DashboardInfo, str]: 选中实例的汇总信息，以及对应的版本号
+        """
+        names = self.resolve_instances(selector)
+        if not selector or set(names) == set(snapshot.instances):
+            return snapshot.info, snapshot.version
+        info = DashboardInfo.merge(snapshot.instances[name] for name in names if name in snapshot.instances)
+        version = hashlib.sha1(f"{snapshot.version}:{'|'.join(names)}".encode('utf-8')).hexdigest()
+        return info, version
+
+    def get_instances_status(self) -> List[Dict]:
+        """获取所有qBittorrent实例的名称、地址、连接状态、退避状态和请求限速统计"""
+        return [{'name': instance.name, 'host': instance.host, **instance.qbit_client.status(),
+                 'rate_limit': instance.rate_limiter.stats() if instance.rate_limiter is not None else None}
+                for instance in self.instances.values()]
+
+    def reconnect_instances(self, selector=None) -> Dict[str, bool]:
+        """重新登录选中的qBittorrent实例，不重建客户端和种子镜像
+
+        Returns:
+            Dict[str, bool]: 实例名称 -> 是否连接成功
+        """
+        return {name: result is True for name, result in self.run_on_instances(selector, lambda: self.instance.connect()).items()}
+
+    def duplicate_tag_opt_single_torrent_single_rule(self, torrent, rule, mutation_buffer: Optional[MutationBuffer] = None) -> Dict[str, str]:
         """给单个种子打辅种标签或移除辅种标签
         Args:
             torrent: 种子对象
             rule: 规则对象
+            mutation_buffer: 修改操作缓冲区，为空时立即执行修改
         Returns:
             Dict[str, str]: 返回操作结果状态和详情
         """
@@ -845,10 +4145,10 @@ class QBitHelperBasic:
             # 获取操作类型
             opt_type = rule.get('opt_type', 'add')
             
-            # 获取当前种子的标识符
-            identifier = f"{torrent.save_path}_{torrent.name}_{torrent.size}"
+            # 获取当前种子的内容指纹
+            identifier = self.file_list_cache.get(torrent.hash)
             
-            # 复用现有逻辑检查该标识符是否在torrent_dict中且有重复
+            # 检查该指纹是否在torrent_dict中且有重复
             if identifier in self.torrent_dict and len(self.torrent_dict[identifier]) > 1:
                 # 计算辅种数
                 duplicate_count = len(self.torrent_dict[identifier])
@@ -860,10 +4160,9 @@ class QBitHelperBasic:
                     # 检查当前种子是否已包含该标签
                     if duplicate_tag not in torrent.tags:
                         # 为当前种子添加辅种标签
-                        self.qbit_client.torrents_add_tags(tags=duplicate_tag, torrent_hashes=torrent.hash)
-                        self.logger.info(f"为种子 {torrent.name} 添加辅种标签：{duplicate_tag}")
-                        result['status'] = 'processed'
-                        result['detail'] = f'为种子 {torrent.name} 添加辅种标签：{duplicate_tag} 成功'
+                        self._apply_mutation(mutation_buffer, 'add_tags', duplicate_tag, torrent, result,
+                                             f'为种子 {torrent.name} 添加辅种标签：{duplicate_tag} 成功',
+                                             f'为种子 {torrent.name} 添加辅种标签：{duplicate_tag} 失败')
                     else:
                         self.logger.debug(f"种子 {torrent.name} 已存在辅种标签：{duplicate_tag}，无需重复添加")
                         result['status'] = 'skipped'
@@ -872,10 +4171,9 @@ class QBitHelperBasic:
                     # 检查当前种子是否包含辅种标签
                     if duplicate_tag in torrent.tags:
                         # 为当前种子移除辅种标签
-                        self.qbit_client.torrents_remove_tags(tags=duplicate_tag, torrent_hashes=torrent.hash)
-                        self.logger.info(f"为种子 {torrent.name} 移除辅种标签：{duplicate_tag}")
-                        result['status'] = 'processed'
-                        result['detail'] = f'为种子 {torrent.name} 移除辅种标签：{duplicate_tag} 成功'
+                        self._apply_mutation(mutation_buffer, 'remove_tags', duplicate_tag, torrent, result,
+                                             f'为种子 {torrent.name} 移除辅种标签：{duplicate_tag} 成功',
+                                             f'为种子 {torrent.name} 移除辅种标签：{duplicate_tag} 失败')
                     else:
                         self.logger.debug(f"种子 {torrent.name} 不存在辅种标签：{duplicate_tag}，无需移除")
                         result['status'] = 'skipped'
@@ -896,7 +4194,7 @@ class QBitHelperBasic:
             
         return result
     
-    def tag_opt_rule_check(self, torrent: Any, rule: Dict) -> bool:
+    def tag_opt_rule_check(self, torrent: Any, rule: Dict, mutation_buffer: Optional[MutationBuffer] = None) -> bool:
         """检查当前torrent是否匹配到规则
         
         匹配规则说明：
@@ -906,36 +4204,29 @@ class QBitHelperBasic:
         Args:
             torrent: 种子对象
             rule: 规则字典
+            mutation_buffer: 修改操作缓冲区，其中尚未提交的tracker修改视为已生效
             
         Returns:
             bool: 是否匹配到规则
         """
-        # 获取规则中的匹配条件
-        trackers_match = rule.get('trackers', '')
+        # 获取预编译的匹配条件
+        tracker_matcher = self.compile_rule(rule).tracker_matcher
         
         # 标记条件匹配状态，默认为True表示空条件视为匹配成功
         trackers_condition_met = True
 
-        # 检查tracker匹配条件
-        if trackers_match:
-            trackers = torrent.trackers
-            tracker_keywords = [k.strip() for k in trackers_match.split('|') if k.strip()]
-            
-            # 检查是否有任何tracker关键字匹配（或关系）
-            trackers_condition_met = False
-            for tracker in trackers:
-                if any(keyword in tracker.url for keyword in tracker_keywords):
-                    trackers_condition_met = True
-                    break
+        # 检查tracker匹配条件，任一tracker包含任一关键字即匹配（或关系）
+        if tracker_matcher is not None:
+            trackers_condition_met = tracker_matcher.search_any(self._tracker_urls(torrent, mutation_buffer))
         
-        # 两个条件之间是与关系，需要同时满足
         return trackers_condition_met
     
-    def tag_opt_single_torrent_single_rule(self, torrent: Any, rule) -> Dict:
+    def tag_opt_single_torrent_single_rule(self, torrent: Any, rule, mutation_buffer: Optional[MutationBuffer] = None) -> Dict:
         """处理单个种子的单个标签规则
         Args:
             torrent: 种子对象
             rule: 规则
+            mutation_buffer: 修改操作缓冲区，为空时立即执行修改
         Returns:
             status: 操作结果：processed, failed, skipped （成功、失败、跳过/无需处理）
             detail: 操作详情
@@ -949,7 +4240,7 @@ class QBitHelperBasic:
             self.logger.debug(f'处理种子: {torrent.name}, 操作规则: {rule_name}')
                 
              # 检查规则是否匹配
-            if self.tag_opt_rule_check(torrent, rule):
+            if self.tag_opt_rule_check(torrent, rule, mutation_buffer):
                 self.logger.debug(f'种子 {torrent.name} 匹配到规则 {rule_name}')
                 # 该种子和规则匹配上，则根据规则进行操作
                 # 读取该种子的所有tag
@@ -967,30 +4258,20 @@ class QBitHelperBasic:
                     
                 if rule.get('opt_type') == 'add': # 添加标签
                     if tag_to_process not in torrent_tags:
-                        try:
-                            self.qbit_client.torrents_add_tags(tags=tag_to_process, torrent_hashes=torrent.hash)
-                            result['status'] = 'processed'
-                            result['detail'] = f'为种子 {torrent.name} 执行规则 {rule_name} 成功'
-                            self.logger.info(f'为种子 {torrent.name} 添加标签: {tag_to_process} (规则: {rule_name})')
-                        except Exception as e:
-                            result['status'] = 'failed'
-                            result['detail'] = f'为种子 {torrent.name} 执行规则 {rule_name} 失败'
-                            self.logger.error(f'为种子 {torrent.name} 添加标签 {tag_to_process} 失败: {str(e)}')
+                        self.logger.debug(f'为种子 {torrent.name} 添加标签: {tag_to_process} (规则: {rule_name})')
+                        self._apply_mutation(mutation_buffer, 'add_tags', tag_to_process, torrent, result,
+                                             f'为种子 {torrent.name} 执行规则 {rule_name} 成功',
+                                             f'为种子 {torrent.name} 执行规则 {rule_name} 失败')
                     else:
                         result['status'] = 'skipped'
                         result['detail'] = f'种子 {torrent.name} 已存在标签: {tag_to_process}，无需重复添加'
                         self.logger.debug(f'种子 {torrent.name} 已存在标签: {tag_to_process}，无需重复添加')
                 else:  # 移除标签
                     if tag_to_process in torrent_tags:
-                        try:
-                            self.qbit_client.torrents_remove_tags(tags=tag_to_process, torrent_hashes=torrent.hash)
-                            result['status'] = 'processed'
-                            result['detail'] = f'为种子 {torrent.name} 执行规则 {rule_name} 成功'
-                            self.logger.info(f'从种子 {torrent.name} 移除标签: {tag_to_process} (规则: {rule_name})')
-                        except Exception as e:
-                            result['status'] = 'failed'
-                            result['detail'] = f'为种子 {torrent.name} 执行规则 {rule_name} 失败'
-                            self.logger.error(f'从种子 {torrent.name} 移除标签 {tag_to_process} 失败: {str(e)}')
+                        self.logger.debug(f'从种子 {torrent.name} 移除标签: {tag_to_process} (规则: {rule_name})')
+                        self._apply_mutation(mutation_buffer, 'remove_tags', tag_to_process, torrent, result,
+                                             f'为种子 {torrent.name} 执行规则 {rule_name} 成功',
+                                             f'为种子 {torrent.name} 执行规则 {rule_name} 失败')
                     else:
                         result['status'] = 'skipped'
                         result['detail'] = f'种子 {torrent.name} 不存在标签: {tag_to_process}，无需移除'
@@ -1006,7 +4287,7 @@ class QBitHelperBasic:
                 'detail': f'处理种子 {torrent.name} 时发生错误'
             }
         
-    def tracker_opt_rule_check(self, torrent: Any, rule: Dict) -> bool:
+    def tracker_opt_rule_check(self, torrent: Any, rule: Dict, mutation_buffer: Optional[MutationBuffer] = None) -> bool:
         """检查当前torrent是否匹配到规则
         
         匹配规则说明：
@@ -1019,51 +4300,38 @@ class QBitHelperBasic:
         Args:
             torrent: 种子对象
             rule: 规则字典
+            mutation_buffer: 修改操作缓冲区，其中尚未提交的tracker修改视为已生效
             
         Returns:
             bool: 是否匹配到规则
         """
-        # 获取规则中的匹配条件
-        tags_match = rule.get('tags', '')
-        trackers_match = rule.get('trackers', '')
+        # 获取预编译的匹配条件
+        compiled_rule = self.compile_rule(rule)
+        tag_matcher = compiled_rule.tag_matcher
+        tracker_matcher = compiled_rule.tracker_matcher
         
         # 标记条件匹配状态，默认为True表示空条件视为匹配成功
         tags_condition_met = True
         trackers_condition_met = True
         
-        # 检查标签匹配条件
-        if tags_match:
+        # 检查标签匹配条件，任一标签包含任一关键字即匹配（或关系）
+        if tag_matcher is not None:
             torrent_tags = torrent.tags.split(',') if torrent.tags else []
-            tag_keywords = [k.strip() for k in tags_match.split('|') if k.strip()]
-            
-            # 检查是否有任何标签关键字匹配（或关系）
-            tags_condition_met = False
-            for tag in torrent_tags:
-                tag = tag.strip()
-                if any(keyword in tag for keyword in tag_keywords):
-                    tags_condition_met = True
-                    break
+            tags_condition_met = tag_matcher.search_any(tag.strip() for tag in torrent_tags)
         
-        # 检查tracker匹配条件
-        if trackers_match:
-            trackers = torrent.trackers
-            tracker_keywords = [k.strip() for k in trackers_match.split('|') if k.strip()]
-            
-            # 检查是否有任何tracker关键字匹配（或关系）
-            trackers_condition_met = False
-            for tracker in trackers:
-                if any(keyword in tracker.url for keyword in tracker_keywords):
-                    trackers_condition_met = True
-                    break
+        # 检查tracker匹配条件，任一tracker包含任一关键字即匹配（或关系）
+        if tracker_matcher is not None:
+            trackers_condition_met = tracker_matcher.search_any(self._tracker_urls(torrent, mutation_buffer))
         
         # 两个条件之间是与关系，需要同时满足
         return tags_condition_met and trackers_condition_met
         
-    def tracker_opt_single_torrent_single_rule(self, torrent: Any, rule: Dict) -> Dict:
+    def tracker_opt_single_torrent_single_rule(self, torrent: Any, rule: Dict, mutation_buffer: Optional[MutationBuffer] = None) -> Dict:
         """处理单个种子的单个跟踪器规则
         Args:
             torrent: 种子对象
             rule: 规则
+            mutation_buffer: 修改操作缓冲区，为空时立即执行修改
         Returns:
             status: 操作结果：processed, failed, skipped （成功、失败、跳过/无需处理）
             detail: 操作详情
@@ -1077,12 +4345,12 @@ class QBitHelperBasic:
             self.logger.debug(f'处理种子: {torrent.name}, 操作: {rule_name}')
                 
              # 检查规则是否匹配
-            if self.tracker_opt_rule_check(torrent, rule):
+            if self.tracker_opt_rule_check(torrent, rule, mutation_buffer):
                 self.logger.debug(f'种子 {torrent.name} 匹配到规则 {rule_name}')
                 # 该种子和规则匹配上，则根据规则进行操作
                 tracker_to_process = rule.get('tracker', '').strip()
                 opt_type = rule.get('opt_type', '').lower()
-                current_trackers = [t.url for t in torrent.trackers]
+                current_trackers = self._tracker_urls(torrent, mutation_buffer)
                 # 如果tracker_to_process为空，则记录日志并结束处理
                 if not tracker_to_process:
                     result['status'] = 'skipped'
@@ -1092,30 +4360,20 @@ class QBitHelperBasic:
                 
                 if opt_type == 'add': # 添加tracker
                     if tracker_to_process not in current_trackers:
-                        try:
-                            self.qbit_client.torrents_add_trackers(torrent_hash=torrent.hash, urls=[tracker_to_process])
-                            result['status'] = 'processed'
-                            result['detail'] = f'为种子 {torrent.name} 执行规则 {rule_name} 成功'
-                            self.logger.info(f'为种子 {torrent.name} 添加tracker: {tracker_to_process} (规则: {rule_name})')
-                        except Exception as e:
-                            result['status'] = 'failed'
-                            result['detail'] = f'为种子 {torrent.name} 执行规则 {rule_name} 失败'
-                            self.logger.error(f'为种子 {torrent.name} 添加tracker {tracker_to_process} 失败: {str(e)}')
+                        self.logger.debug(f'为种子 {torrent.name} 添加tracker: {tracker_to_process} (规则: {rule_name})')
+                        self._apply_mutation(mutation_buffer, 'add_trackers', tracker_to_process, torrent, result,
+                                             f'为种子 {torrent.name} 执行规则 {rule_name} 成功',
+                                             f'为种子 {torrent.name} 执行规则 {rule_name} 失败')
                     else:
                         result['status'] = 'skipped'
                         result['detail'] = f'种子 {torrent.name} 已存在tracker: {tracker_to_process}，无需重复添加'
                         self.logger.debug(f'种子 {torrent.name} 已存在tracker: {tracker_to_process}，无需重复添加 (规则: {rule_name})') 
                 elif opt_type == 'remove':  # 移除tracker
                     if tracker_to_process in current_trackers:
-                        try:
-                            self.qbit_client.torrents_remove_trackers(torrent_hash=torrent.hash, urls=[tracker_to_process])
-                            result['status'] = 'processed'
-                            result['detail'] = f'为种子 {torrent.name} 执行规则 {rule_name} 成功'
-                            self.logger.info(f'从种子 {torrent.name} 移除tracker: {tracker_to_process} (规则: {rule_name})')
-                        except Exception as e:
-                            result['status'] = 'failed'
-                            result['detail'] = f'为种子 {torrent.name} 执行规则 {rule_name} 失败'
-                            self.logger.error(f'从种子 {torrent.name} 移除tracker {tracker_to_process} 失败: {str(e)}')
+                        self.logger.debug(f'从种子 {torrent.name} 移除tracker: {tracker_to_process} (规则: {rule_name})')
+                        self._apply_mutation(mutation_buffer, 'remove_trackers', tracker_to_process, torrent, result,
+                                             f'为种子 {torrent.name} 执行规则 {rule_name} 成功',
+                                             f'为种子 {torrent.name} 执行规则 {rule_name} 失败')
                     else:
                         result['status'] = 'skipped'
                         result['detail'] = f'种子 {torrent.name} 不存在tracker: {tracker_to_process}，无需移除'
@@ -1133,12 +4391,15 @@ class QBitHelperBasic:
                 'detail': f'处理种子 {torrent.name} 时发生错误: {str(e)}'
             }
 
-    def opt_single_torrent(self, torrent, rules) -> Dict:
+    def opt_single_torrent(self, torrent, rules, mutation_buffer: Optional[MutationBuffer] = None,
+                           timing: Optional[RunTiming] = None) -> Dict:
         """根据传入的rules，处理单个的torrent
         
         Args:
             torrent: 种子对象
             rules: 规则列表
+            mutation_buffer: 修改操作缓冲区，为空时立即执行修改
+            timing: 耗时分解，为空时不记录规则的执行耗时
             
         Returns:
             Dict: 每个规则的处理结果
@@ -1149,21 +4410,22 @@ class QBitHelperBasic:
         results = {}
         
         try:
-            # 先根据priority排序规则
-            rules_sorted = sorted(rules, key=lambda x: x.get('priority', 0))
+            # 编译规则并根据priority排序，已编译的规则直接复用
+            rules_sorted = self.compile_rules(rules)
             for rule in rules_sorted:
                 rule_name = rule.get('rule_name', '未命名规则')
                 rule_type = rule.get('rule_type', '')
                 results[rule_name] = {'status': '', 'detail': ''}
+                start_time = time.perf_counter()
                 
                 try:
                     # 根据规则类型调用相应的处理函数
                     if rule_type == 'tag_opt':
-                        results[rule_name] = self.tag_opt_single_torrent_single_rule(torrent, rule)
+                        results[rule_name] = self.tag_opt_single_torrent_single_rule(torrent, rule, mutation_buffer)
                     elif rule_type == 'tracker_opt':
-                        results[rule_name] = self.tracker_opt_single_torrent_single_rule(torrent, rule)
+                        results[rule_name] = self.tracker_opt_single_torrent_single_rule(torrent, rule, mutation_buffer)
                     elif rule_type == 'duplicate_tag_opt':
-                        results[rule_name] = self.duplicate_tag_opt_single_torrent_single_rule(torrent, rule)
+                        results[rule_name] = self.duplicate_tag_opt_single_torrent_single_rule(torrent, rule, mutation_buffer)
                     else:
                         results[rule_name] = {
                             'status': 'skipped',
@@ -1178,6 +4440,8 @@ class QBitHelperBasic:
                         'detail': error_msg
                     }
                     self.logger.error(error_msg)
+                if timing is not None:
+                    timing.add_rule(rule_name, 'match', time.perf_counter() - start_time)
             
             return results
         except Exception as e:
@@ -1193,58 +4457,473 @@ class QBitHelperBasic:
                 }
             }
 
-    def opt_all_torrent(self, rules) -> Dict:
+    def _start_profiler(self):
+        """按配置default.profiling.mode开始对本次运行做性能分析，未开启时返回None
+
+        cprofile使用标准库cProfile，pyinstrument需要安装pyinstrument，未安装时改用cProfile。
+        两者都只分析调用线程，tracker预取和并发执行规则的工作线程不在其中。
+        """
+        mode = self.config.get('default', {}).get('profiling', {}).get('mode', 'none')
+        if mode not in ('cprofile', 'pyinstrument'):
+            return None
+        try:
+            if mode == 'pyinstrument':
+                try:
+                    from pyinstrument import Profiler
+                    profiler = Profiler()
+                    profiler.start()
+                    return profiler
+                except ImportError:
+                    self.logger.warning('未安装pyinstrument，改用cProfile进行性能分析')
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        except Exception as e:
+            # 同一时间只能有一个分析器，多个实例并行执行时其余实例不做分析
+            self.logger.warning(f'开始性能分析失败: {str(e)}')
+            return None
+
+    def _stop_profiler(self, profiler, run_id: str) -> Optional[str]:
+        """结束性能分析并写入data/profiling.dir，返回文件路径"""
+        if profiler is None:
+            return None
+        profiling_config = self.config.get('default', {}).get('profiling', {})
+        profile_dir = os.path.join('data', profiling_config.get('dir', 'profiles'))
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            self._cleanup_profiles(profile_dir, profiling_config.get('keep', 20))
+            path = os.path.join(profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{run_id[:6]}")
+            if hasattr(profiler, 'output_html'):
+                profiler.stop()
+                path += '.html'
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(profiler.output_html())
+            else:
+                profiler.disable()
+                path += '.prof'
+                profiler.dump_stats(path)
+            self.logger.info(f'性能分析结果已写入 {path}')
+            return path
+        except Exception as e:
+            self.logger.error(f'写入性能分析结果时发生错误: {str(e)}')
+            return None
+
+    def _cleanup_profiles(self, profile_dir: str, keep: int):
+        """删除超出保留数量的旧性能分析文件"""
+        profiles = sorted(f for f in os.listdir(profile_dir) if f.endswith(('.prof', '.html')))
+        # 为即将创建的文件预留一个位置
+        for filename in profiles[:max(0, len(profiles) - (keep - 1))] if keep > 0 else []:
+            os.remove(os.path.join(profile_dir, filename))
+
+    def create_result_sink(self, rules, run_name: str = '', run_log: bool = True) -> TaskResultSink:
+        """根据配置创建任务结果收集器
+        Args:
+            rules: 规则列表
+            run_name: 运行名称，一般为任务名称
+            run_log: 是否写入JSONL运行日志
+        """
+        result_config = self.config.get('default', {}).get('task_results', {})
+        run_log_path = None
+        if run_log:
+            run_log_dir = os.path.join('data', result_config.get('run_log_dir', 'task_runs'))
+            run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+            run_log_path = os.path.join(run_log_dir, f'{run_id}.jsonl')
+            self._cleanup_run_logs(run_log_dir, result_config.get('run_log_keep', 100))
+        return TaskResultSink(
+            [rule.get('rule_name', '未命名规则') for rule in rules],
+            run_log_path=run_log_path,
+            run_name=run_name,
+            detail_limit=result_config.get('detail_limit', 200),
+            skipped_detail=result_config.get('skipped_detail', 'sample'),
+            skipped_sample=result_config.get('skipped_sample', 100)
+        )
+
+    def _cleanup_run_logs(self, run_log_dir: str, keep: int):
+        """删除超出保留数量的旧运行日志"""
+        try:
+            if keep <= 0 or not os.path.isdir(run_log_dir):
+                return
+            run_logs = sorted(f for f in os.listdir(run_log_dir) if f.endswith('.jsonl'))
+            # 为即将创建的运行日志预留一个位置
+            for filename in run_logs[:max(0, len(run_logs) - (keep - 1))]:
+                os.remove(os.path.join(run_log_dir, filename))
+        except Exception as e:
+            self.logger.error(f"清理运行日志时发生错误: {str(e)}")
+
+    def _rule_candidates(self, rule: CompiledRule, torrent_hashes: Set[str]) -> Optional[Set[str]]:
+        """根据倒排索引计算规则可能匹配到的种子hash集合
+
+        Returns:
+            Optional[Set[str]]: 候选种子hash集合，为None时表示所有种子都是候选
+        """
+        index = self.torrent_mirror.index
+        candidates = None
+        if rule.rule_type == 'duplicate_tag_opt':
+            candidates = {h for hashes in self.torrent_dict.values() if len(hashes) > 1 for h in hashes}
+        elif rule.rule_type in ('tag_opt', 'tracker_opt'):
+            # 标签条件和tracker条件之间为与关系，候选集合取交集
+            if rule.tag_matcher is not None:
+                candidates = index.match_tags(rule.tag_matcher)
+            if rule.tracker_matcher is not None:
+                tracker_candidates = index.match_trackers(rule.tracker_matcher, torrent_hashes)
+                candidates = tracker_candidates if candidates is None else candidates & tracker_candidates
+            # 移除标签的规则只可能作用于已有该标签的种子
+            if rule.rule_type == 'tag_opt' and rule.opt_type != 'add' and rule.get('tag'):
+                with_tag = index.hashes_for_tag(rule.get('tag'))
+                candidates = with_tag if candidates is None else candidates & with_tag
+        return candidates & torrent_hashes if candidates is not None else None
+
+    @staticmethod
+    def _tracker_rule_chains(compiled_rules: List[CompiledRule]) -> Dict[int, List[int]]:
+        """找出依赖先执行规则所添加tracker的规则
+
+        Returns:
+            Dict[int, List[int]]: 规则位置 -> 在其之前执行、添加的tracker能被该规则tracker条件匹配到的规则位置
+        """
+        chains = {}
+        for i, rule in enumerate(compiled_rules):
+            if rule.tracker_matcher is None:
+                continue
+            earlier = [j for j, other in enumerate(compiled_rules[:i])
+                       if other.rule_type == 'tracker_opt' and other.opt_type.lower() == 'add'
+                       and other.get('tracker', '').strip() and rule.tracker_matcher.search(other.get('tracker', '').strip())]
+            if earlier:
+                chains[i] = earlier
+        return chains
+
+    def _run_torrent_jobs(self, torrent_jobs: List[Tuple[Any, List[CompiledRule]]],
+                          mutation_buffer: Optional[MutationBuffer], merge_result,
+                          progress: Optional[TaskProgress] = None, timing: Optional[RunTiming] = None):
+        """对每个种子执行opt_single_torrent，并通过merge_result合并结果
+
+        配置default.execution.workers大于1时使用线程池并发执行，同时在执行中的种子数
+        不超过max_in_flight。每个种子内的规则仍在同一线程中按优先级依次执行，
+        merge_result只在调用线程中执行，因此合并结果无需额外加锁。
+        Args:
+            torrent_jobs: (种子, 该种子的候选规则)列表
+            mutation_buffer: 修改操作缓冲区
+            merge_result: 合并单个种子处理结果的函数，参数为(种子, 结果)
+            progress: 任务进度，任务被取消后不再处理新的种子
+            timing: 耗时分解，记录每个规则的执行耗时
+        """
+        execution_config = self.config.get('default', {}).get('execution', {})
+        workers = int(execution_config.get('workers', 1) or 1)
+        if workers <= 1 or len(torrent_jobs) <= 1:
+            for torrent, torrent_rules in torrent_jobs:
+                if progress is not None and progress.cancelled:
+                    self.logger.info('任务已取消，停止处理剩余种子')
+                    break
+                merge_result(torrent, self.opt_single_torrent(torrent, torrent_rules, mutation_buffer, timing))
+                if progress is not None:
+                    progress.advance()
+            return
+
+        max_in_flight = max(workers, int(execution_config.get('max_in_flight', workers * 4) or workers))
+        self.logger.info(f'并发处理 {len(torrent_jobs)} 个种子，线程数：{workers}，最大并发种子数：{max_in_flight}')
+        # 工作线程需要绑定与调用线程相同的qBittorrent实例
+        instance = self.instance
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='opt-torrent') as executor:
+            jobs = iter(torrent_jobs)
+            while True:
+                if progress is not None and progress.cancelled and jobs is not None:
+                    self.logger.info('任务已取消，停止处理剩余种子')
+                    jobs = None
+                for torrent, torrent_rules in jobs or ():
+                    future = RunTiming.submit(executor, self._call_on_instance, instance, self.opt_single_torrent,
+                                              torrent, torrent_rules, mutation_buffer, timing)
+                    in_flight[future] = torrent
+                    if len(in_flight) >= max_in_flight:
+                        break
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merge_result(in_flight.pop(future), future.result())
+                    if progress is not None:
+                        progress.advance()
+
+    @staticmethod
+    def _field_fingerprint(torrent) -> str:
+        """种子规则相关字段的指纹：标签、tracker、保存路径、名称和大小
+
+        tracker以种子列表中的当前tracker和tracker数量代替完整的tracker列表，
+        避免为未变化的种子获取tracker列表；只替换tracker地址的变化由定期全量处理兜底。
+        """
+        tags = sorted(tag.strip() for tag in (torrent.get('tags') or '').split(',') if tag.strip())
+        fields = [tags, torrent.get('tracker'), torrent.get('trackers_count'),
+                  torrent.get('save_path'), torrent.get('name'), torrent.get('size')]
+        return hashlib.sha1(json.dumps(fields, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()[:16]
+
+    def _incremental_enabled(self, incremental: Optional[bool], mutation_buffer: MutationBuffer) -> bool:
+        """增量模式需要状态存储，预览时始终处理所有种子"""
+        if incremental is None:
+            incremental = self.config.get('default', {}).get('incremental', {}).get('enabled', False)
+        return bool(incremental) and self.state_store is not None and not mutation_buffer.dry_run
+
+    def _incremental_scopes(self, compiled_rules: List[CompiledRule], torrents: List[Any]) -> List[Optional[Set[str]]]:
+        """计算增量模式下每个规则需要处理的种子hash集合
+
+        没有检查点、规则定义变化或距上次全量处理超过default.incremental.full_sweep_interval秒
+        的规则返回None（处理所有种子）。辅种规则的结果还取决于相同内容的其他种子，
+        变化或删除的种子所在的辅种组全部重新处理。
+        """
+        full_sweep_interval = self.config.get('default', {}).get('incremental', {}).get('full_sweep_interval', 86400)
+        checkpoints = self.state_store.get_rule_checkpoints(self.instance.name)
+        field_fingerprints = {torrent.hash: self._field_fingerprint(torrent) for torrent in torrents}
+        changes_since: Dict[float, Tuple[Set[str], Set[str]]] = {}
+        now = time.time()
+        scopes = []
+        for rule in compiled_rules:
+            checkpoint = checkpoints.get(rule.rule_name)
+            if (checkpoint is None or checkpoint['rule_version'] != rule.version or
+                    (full_sweep_interval and now - checkpoint['full_sweep_at'] >= full_sweep_interval)):
+                scopes.append(None)
+                continue
+            since = checkpoint['evaluated_at']
+            if since not in changes_since:
+                changes_since[since] = self.state_store.changed_torrents(self.instance.name, field_fingerprints, since)
+            changed, removed_fingerprints = changes_since[since]
+            scope = set(changed)
+            if rule.rule_type == 'duplicate_tag_opt':
+                group_fingerprints = {self.file_list_cache.get(torrent_hash) for torrent_hash in changed}
+                for fingerprint in (group_fingerprints | removed_fingerprints) - {None}:
+                    scope.update(self.torrent_dict.get(fingerprint, []))
+            scopes.append(scope)
+        incremental_count = sum(1 for scope in scopes if scope is not None)
+        if incremental_count:
+            self.logger.info(f'增量模式：{incremental_count} 个规则只处理变化的种子，'
+                             f'{len(scopes) - incremental_count} 个规则全量处理')
+        return scopes
+
+    def _torrent_state(self, torrent) -> Tuple[str, Optional[str], Optional[str], str]:
+        """种子的紧凑状态：(标签, tracker主机名, 内容指纹, 规则相关字段指纹)，tracker列表未缓存时主机名为None"""
+        trackers = self.tracker_cache.peek(torrent.hash)
+        hosts = None
+        if trackers is not None:
+            hosts = ','.join(sorted({urlsplit(tracker.url).hostname or '' for tracker in trackers
+                                     if str(tracker.url).startswith(('http', 'udp'))} - {''}))
+        tags = sorted(tag.strip() for tag in (torrent.tags or '').split(',') if tag.strip())
+        return ','.join(tags), hosts, self.file_list_cache.get(torrent.hash), self._field_fingerprint(torrent)
+
+    def _save_run_state(self, rules, applications: List[Tuple[str, str, str, str]], run_name: str = '',
+                        checkpoints: Optional[List[Tuple[str, str, float, bool]]] = None):
+        """运行结束后将当前实例的种子状态、规则执行记录和规则检查点写入状态存储"""
+        if self.state_store is None:
+            return
+        try:
+            # 增量同步一次种子镜像，记录本次修改后的状态
+            torrents = self.torrent_mirror.get_torrents()
+            rule_versions = {rule.get('rule_name'): CompiledRule.rule_version(rule) for rule in rules}
+            rows = [(torrent_hash, rule_name, rule_versions.get(rule_name, ''), status, detail)
+                    for torrent_hash, rule_name, status, detail in applications if status in ('processed', 'failed')]
+            failed_hashes = {torrent_hash for torrent_hash, _, status, _ in applications if status == 'failed'}
+            state_count, application_count = self.state_store.save_run(
+                self.instance.name, {torrent.hash: self._torrent_state(torrent) for torrent in torrents}, rows, run_name,
+                checkpoints=checkpoints, force_changed=failed_hashes)
+            self.logger.debug(f'状态存储已更新：{state_count} 个种子状态，{application_count} 条执行记录')
+        except Exception as e:
+            self.logger.error(f'写入状态存储时发生错误: {str(e)}')
+
+    def _merge_with_progress_events(self, merge_result, run_event: Dict, result_sink: TaskResultSink):
+        """包装merge_result，处理种子的同时按间隔发布task_progress事件"""
+        interval = self.config.get('default', {}).get('events', {}).get('progress_interval', 1)
+        last_publish = [time.time()]
+
+        def merge_and_publish(torrent, result):
+            merge_result(torrent, result)
+            run_event['done'] += 1
+            now = time.time()
+            if now - last_publish[0] >= interval or run_event['done'] >= run_event['total']:
+                last_publish[0] = now
+                self.events.publish('task_progress', {**run_event, 'counts': result_sink.counts})
+        return merge_and_publish
+
+    def opt_all_torrent(self, rules, mutation_buffer: Optional[MutationBuffer] = None,
+                        result_sink: Optional[TaskResultSink] = None,
+                        progress: Optional[TaskProgress] = None,
+                        incremental: Optional[bool] = None) -> Dict:
         """根据传入的rules，处理所有torrent。
+
+        每个规则先通过倒排索引得到候选种子，只对候选种子执行该规则，其余种子
+        直接计为跳过。标签和tracker的修改先写入修改操作缓冲区，全部种子处理
+        完成后按(操作, 标签或tracker)分组批量提交，再合并这些修改的处理结果。
+        同一种子上后执行的规则按叠加了缓冲区中tracker修改的tracker列表匹配，
+        先执行的规则添加的tracker能让种子成为后续规则的候选。
+        增量模式下，规则定义未变化且未到全量处理时间的规则只处理自该规则上次运行后
+        新增或规则相关字段变化的种子。
         Args:
             rules: 规则列表
+            mutation_buffer: 修改操作缓冲区，为空时新建；传入dry_run缓冲区时不修改任何种子
+            result_sink: 任务结果收集器，为空时按配置新建
+            progress: 任务进度，记录已处理的种子数，任务被取消后不再处理新的种子
+            incremental: 是否使用增量模式，为None时使用配置default.incremental.enabled
         Returns:
             Dict: 包含处理结果的字典
         """
+        # 耗时分解和本次运行的请求数；无论运行如何结束，都要清除当前线程上的运行标记
+        timing = RunTiming()
+        with timing.activate():
+            return self._opt_all_torrent(rules, mutation_buffer, result_sink, progress, incremental, timing)
+
+    def _opt_all_torrent(self, rules, mutation_buffer: Optional[MutationBuffer],
+                         result_sink: Optional[TaskResultSink], progress: Optional[TaskProgress],
+                         incremental: Optional[bool], timing: RunTiming) -> Dict:
+        """opt_all_torrent的实现，timing为已在当前上下文中标记的本次运行"""
         self.logger.info(f'开始处理所有种子')
-        # 初始化结果
-        results = {}
-        
-        # 为每个规则初始化结果结构
-        for rule in rules:
-            rule_name = rule.get('rule_name', '未命名规则')
-            results[rule_name] = {
-                'processed_count': 0,
-                'processed_detail': '',
-                'skipped_count': 0,
-                'skipped_detail': '',
-                'failed_count': 0,
-                'failed_detail': ''
-            }
+        # 初始化结果收集器，计数保存在内存中，逐条记录写入运行日志
+        if result_sink is None:
+            result_sink = self.create_result_sink(rules)
         
+        # 修改操作缓冲区，以及等待缓冲区提交后才能确定状态的结果
+        if mutation_buffer is None:
+            chunk_size = self.config.get('default', {}).get('mutation', {}).get('chunk_size', 500)
+            mutation_buffer = MutationBuffer(self.qbit_client, self.logger, chunk_size=chunk_size, tracker_cache=self.tracker_cache)
+        pending_results = []
+        # 预览（dry_run）不发布任务进度事件
+        publish_events = not mutation_buffer.dry_run
+        run_event = {'run_id': uuid.uuid4().hex, 'run_name': result_sink.run_name,
+                     'instance': self.instance.name, 'total': 0, 'done': 0}
+        # 规则执行记录：(种子hash, 规则名称, 状态, 详情)，只记录处理成功和失败的
+        applications = []
+        # 规则检查点的时间为本次运行开始的时间，运行期间变化的种子下次仍会被处理
+        started_at = time.time()
+        compiled_rules, rule_scopes = [], []
+        completed = False
+        # 可选地对整个运行做性能分析，预览不写入分析结果
+        mutation_timings_offset = len(mutation_buffer.timings)
+        profiler = self._start_profiler() if not mutation_buffer.dry_run else None
+
         try:
-            # 每次都初始化字典
-            self.init_torrent_dict()
-            torrents = self.qbit_client.torrents_info()
+            # 本次运行只编译一次规则
+            compiled_rules = self.compile_rules(rules)
+
+            # 从种子镜像增量获取种子列表，存在辅种规则时获取新种子的文件列表并初始化辅种字典
+            torrents = self.torrent_mirror.get_torrents()
+            timing.mark('fetch')
+            self.init_torrent_dict(torrents, fetch_file_lists=any(rule.get('rule_type') == 'duplicate_tag_opt' for rule in rules))
+            timing.mark('file_lists')
             self.logger.info(f'共获取到 {len(torrents)} 个种子')
 
-            # 逐个处理种子
-            for torrent in torrents:
-                result = self.opt_single_torrent(torrent, rules)
-                
-                # 合并处理结果
+            # 增量模式下每个规则需要处理的种子范围，为None时处理所有种子
+            rule_scopes = [None] * len(compiled_rules)
+            if self._incremental_enabled(incremental, mutation_buffer):
+                rule_scopes = self._incremental_scopes(compiled_rules, torrents)
+                timing.mark('incremental')
+
+            # 存在依赖tracker的规则时，批量预取处理范围内种子的tracker列表
+            tracker_scopes = [scope for rule, scope in zip(compiled_rules, rule_scopes)
+                              if rule.rule_type == 'tracker_opt' or (rule.rule_type == 'tag_opt' and rule.get('trackers'))]
+            if tracker_scopes:
+                self.tracker_cache.prefetch(torrents, None if any(scope is None for scope in tracker_scopes)
+                                            else set().union(*tracker_scopes))
+            timing.mark('trackers')
+
+            # 通过倒排索引计算每个规则的候选种子，未命中的种子直接计为跳过
+            torrent_hashes = {torrent.hash for torrent in torrents}
+            rule_candidates = [self._rule_candidates(rule, torrent_hashes) for rule in compiled_rules]
+            # 先执行的规则添加的tracker可能让种子成为后续规则的候选，候选集合按规则顺序合并
+            rule_chains = self._tracker_rule_chains(compiled_rules)
+            for i, earlier in rule_chains.items():
+                for j in earlier:
+                    if rule_candidates[i] is None or rule_candidates[j] is None:
+                        rule_candidates[i] = None
+                        break
+                    rule_candidates[i] = rule_candidates[i] | rule_candidates[j]
+            for rule, candidates in zip(compiled_rules, rule_candidates):
+                if candidates is None:
+                    continue
+                pruned_count = len(torrent_hashes) - len(candidates)
+                result_sink.record_skipped_bulk(rule.rule_name, pruned_count,
+                                                f"{pruned_count} 个种子不在规则 {rule.rule_name} 的候选范围内，无需处理")
+                self.logger.debug(f'规则 {rule.rule_name} 的候选种子数：{len(candidates)}')
+
+            # 增量模式下，候选种子中自规则上次运行后未变化的种子直接计为跳过
+            for i, (rule, scope) in enumerate(zip(compiled_rules, rule_scopes)):
+                if scope is None:
+                    continue
+                candidates = rule_candidates[i] if rule_candidates[i] is not None else torrent_hashes
+                rule_candidates[i] = candidates & scope
+                for j in rule_chains.get(i, ()):
+                    rule_candidates[i] |= rule_candidates[j] if rule_candidates[j] is not None else candidates
+                unchanged_count = len(candidates) - len(rule_candidates[i])
+                result_sink.record_skipped_bulk(rule.rule_name, unchanged_count,
+                                                f"{unchanged_count} 个种子自规则 {rule.rule_name} 上次运行后未变化，无需处理")
+                self.logger.debug(f'规则 {rule.rule_name} 增量处理的种子数：{len(rule_candidates[i])}')
+
+            # 只访问至少是一个规则候选的种子
+            if any(candidates is None for candidates in rule_candidates):
+                visit_torrents = torrents
+            else:
+                visit_hashes = set().union(*rule_candidates)
+                visit_torrents = [torrent for torrent in torrents if torrent.hash in visit_hashes]
+
+            # 处理每个种子，只执行以该种子为候选的规则（保持优先级顺序）
+            def merge_result(torrent, result):
                 for rule_name, rule_result in result.items():
-                    if rule_name in results:
-                        rule_status = rule_result.get('status', '')
-                        rule_detail = rule_result.get('detail', '')
-                        if rule_detail:
-                            format_rule_detail = f" - {rule_detail}\n"
-
-                        if rule_status == 'processed':
-                            results[rule_name]['processed_count'] += 1
-                            results[rule_name]['processed_detail'] += format_rule_detail
-                        elif rule_status == 'failed':
-                            results[rule_name]['failed_count'] += 1
-                            results[rule_name]['failed_detail'] += format_rule_detail
-                        elif rule_status == 'skipped':
-                            results[rule_name]['skipped_count'] += 1
-                            results[rule_name]['skipped_detail'] += format_rule_detail
-            return results
+                    if rule_result.get('status') == 'pending':
+                        pending_results.append((rule_name, rule_result, torrent))
+                    else:
+                        result_sink.record(rule_name, rule_result, torrent)
+                        applications.append((torrent.hash, rule_name, rule_result.get('status'), rule_result.get('detail', '')))
+
+            torrent_jobs = []
+            for torrent in visit_torrents:
+                torrent_rules = [rule for rule, candidates in zip(compiled_rules, rule_candidates)
+                                 if candidates is None or torrent.hash in candidates]
+                if torrent_rules:
+                    torrent_jobs.append((torrent, torrent_rules))
+            if progress is not None:
+                # 不需要逐个处理的种子直接计为已完成
+                progress.attach(result_sink)
+                progress.add_total(len(torrents))
+                progress.advance(len(torrents) - len(torrent_jobs))
+            if publish_events:
+                run_event['total'] = len(torrents)
+                run_event['done'] = len(torrents) - len(torrent_jobs)
+                self.events.publish('task_start', run_event)
+                merge_result = self._merge_with_progress_events(merge_result, run_event, result_sink)
+            timing.mark('candidates')
+            self._run_torrent_jobs(torrent_jobs, mutation_buffer, merge_result, progress, timing)
+            timing.mark('match')
+            completed = progress is None or not progress.cancelled
         except Exception as e:
             error_msg = f'处理所有种子时发生错误: {str(e)}'
             self.logger.exception(error_msg)
-            return results
\ No newline at end of file
+        finally:
+            # 批量提交缓冲区中的修改，并合并其处理结果
+            mutation_buffer.flush()
+            timing.mark('mutate')
+            for rule_name, rule_result, torrent in pending_results:
+                result_sink.record(rule_name, rule_result, torrent)
+                applications.append((torrent.hash, rule_name, rule_result.get('status'), rule_result.get('detail', '')))
+            # 每组修改的提交耗时按修改数分摊到对应的规则
+            pending_rules = {id(rule_result): rule_name for rule_name, rule_result, _ in pending_results}
+            for duration, group_results in mutation_buffer.timings[mutation_timings_offset:]:
+                for rule_result in group_results:
+                    if id(rule_result) in pending_rules:
+                        timing.add_rule(pending_rules[id(rule_result)], 'mutate', duration / len(group_results))
+            if not mutation_buffer.dry_run and self.metrics is not None:
+                for rule_name, counts in result_sink.counts.items():
+                    for status, count in counts.items():
+                        if count:
+                            self.metrics.inc('qbit_helper_rule_torrents_total',
+                                             {'instance': self.instance.name, 'rule': rule_name, 'status': status}, count)
+            if not mutation_buffer.dry_run:
+                # 完整运行结束后更新规则检查点，处理失败的种子下次增量运行时重新处理
+                checkpoints = [(rule.rule_name, rule.version, started_at, scope is None)
+                               for rule, scope in zip(compiled_rules, rule_scopes)] if completed else None
+                self._save_run_state(rules, applications, result_sink.run_name, checkpoints)
+                timing.mark('state')
+            api_calls = timing.api_call_counts()
+            result_sink.timing = timing
+            result_sink.run_timing = timing.to_dict(run_id=run_event['run_id'], instance=self.instance.name,
+                                                    api_calls=sum(api_calls.values()), api_calls_by_endpoint=api_calls,
+                                                    profile=self._stop_profiler(profiler, run_event['run_id']))
+            result_sink.close()
+            if publish_events:
+                self.events.publish('task_finish', {**run_event, 'counts': result_sink.counts,
+                                                    'timing': result_sink.run_timing,
+                                                    'cancelled': progress is not None and progress.cancelled})
+        return result_sink.results()
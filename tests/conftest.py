@@ -0,0 +1,90 @@
+import logging
+import os
+import subprocess
+import sys
+
+import pytest
+import yaml
+
+# 测试直接导入仓库根目录下的模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import benchmark
+
+# 在另一个进程中持有leader锁，直到标准输入关闭
+HOLD_LOCK = '''
+import fcntl, sys
+f = open(sys.argv[1], 'a+')
+fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+print('locked', flush=True)
+sys.stdin.read()
+'''
+
+
+@pytest.fixture
+def logger():
+    return logging.getLogger('qbit-helper-test')
+
+
+@pytest.fixture
+def fake_qbittorrent():
+    """本地模拟的qBittorrent WebUI（见benchmark.py），种子库为固定随机数种子生成的40个种子"""
+    server = benchmark.start_fake_server(benchmark.FakeLibrary(40))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_helper(tmp_path, monkeypatch, fake_qbittorrent):
+    """在临时data目录中按示例配置创建连接模拟WebUI的QBitHelperBasic
+
+    default中的配置节按键合并到示例配置；默认关闭运行指标和仪表板后台刷新，
+    避免退出时向其他目录写入文件。
+    """
+    import qbit_helper
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data', exist_ok=True)
+    config_path = str(tmp_path / 'data' / 'config.yaml')
+    helpers = []
+
+    def make(rules=(), tasks=(), instances=None, **default):
+        with open(os.path.join(ROOT, 'data', 'config_example.yaml'), 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f)
+        default = {'metrics': {'enabled': False}, 'dashboard': {'refresh_interval': 0}, **default}
+        for section, values in default.items():
+            config['default'][section] = {**(config['default'].get(section) or {}), **values}
+        host = f'http://127.0.0.1:{fake_qbittorrent.server_address[1]}'
+        config['user_config']['qbittorrent'] = {'host': host, 'username': 'admin', 'password': 'admin'}
+        config['user_config']['qbittorrent_instances'] = [dict(instance, host=instance.get('host', host))
+                                                          for instance in instances or []]
+        config['user_rules'] = list(rules)
+        config['user_tasks'] = list(tasks)
+        with open(config_path, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(config, f, allow_unicode=True)
+        helper = qbit_helper.QBitHelperBasic(config_path)
+        helpers.append(helper)
+        return helper
+
+    yield make
+    for helper in helpers:
+        helper.config_store.flush()
+        # 停止调度器和后台线程，避免在其他测试的目录中执行
+        helper.shutdown()
+
+
+@pytest.fixture
+def leader_lock_holder(tmp_path):
+    """在另一个进程中持有tmp_path/data下的leader锁，关闭其标准输入后释放"""
+    os.makedirs(tmp_path / 'data', exist_ok=True)
+    holder = subprocess.Popen([sys.executable, '-c', HOLD_LOCK, str(tmp_path / 'data' / 'scheduler.lock')],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == 'locked'
+        yield holder
+    finally:
+        if not holder.stdin.closed:
+            holder.stdin.close()
+        holder.wait(5)
+        holder.stdout.close()
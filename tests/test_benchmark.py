@@ -0,0 +1,82 @@
+import benchmark
+import pytest
+import requests
+
+
+def test_library_deterministic():
+    first, second = benchmark.FakeLibrary(50, seed=3), benchmark.FakeLibrary(50, seed=3)
+    assert first.torrents == second.torrents and first.trackers == second.trackers
+    assert benchmark.FakeLibrary(50, seed=4).torrents != first.torrents
+    # 部分种子是辅种：文件大小相同
+    sizes = [tuple(f['size'] for f in files) for files in first.files.values()]
+    assert len(set(sizes)) < len(sizes)
+
+    first.edit_tags([next(iter(first.torrents))], ['bench'], add=True)
+    first.reset()
+    assert first.torrents == second.torrents and first.rid == second.rid
+
+
+def test_maindata_incremental():
+    library = benchmark.FakeLibrary(20)
+    full = library.maindata(0)
+    assert full['full_update'] and len(full['torrents']) == 20
+    # 没有变化时返回空的增量数据
+    assert library.maindata(full['rid']) == {'rid': full['rid'], 'torrents': {}, 'torrents_removed': []}
+    torrent_hash = next(iter(library.torrents))
+    library.edit_tags([torrent_hash], ['bench'], add=True)
+    library.edit_trackers(torrent_hash, ['https://bench.example/announce'], add=True)
+    delta = library.maindata(full['rid'])
+    assert 'full_update' not in delta
+    assert list(delta['torrents']) == [torrent_hash]
+    assert delta['torrents'][torrent_hash]['tags'].endswith('bench')
+    # 未知的rid返回全量数据
+    assert library.maindata(library.rid + 5)['full_update']
+
+
+@pytest.fixture
+def server():
+    server = benchmark.start_fake_server(benchmark.FakeLibrary(10))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server, endpoint):
+    return f'http://127.0.0.1:{server.server_address[1]}/{endpoint}'
+
+
+def test_server_api_and_stats(server):
+    session = requests.Session()
+    assert session.post(url(server, 'api/v2/auth/login'), data={'username': 'admin'}).text == 'Ok.'
+    torrents = session.get(url(server, 'api/v2/torrents/info')).json()
+    assert len(torrents) == 10
+    torrent_hash = torrents[0]['hash']
+    session.post(url(server, 'api/v2/torrents/addTags'), data={'hashes': torrent_hash, 'tags': 'a,b'})
+    assert server.library.torrents[torrent_hash]['tags'].endswith('a, b')
+    assert session.get(url(server, 'api/v2/not/found')).status_code == 404
+
+    stats = session.get(url(server, '_bench/reset_stats')).json()
+    assert stats == {'auth/login': 1, 'torrents/info': 1, 'torrents/addTags': 1, 'not/found': 1}
+    assert session.get(url(server, '_bench/stats')).json() == {}
+
+
+def test_server_injects_errors(server):
+    server.error_rate = 1
+    assert requests.post(url(server, 'api/v2/auth/login')).status_code == 200
+    assert requests.get(url(server, 'api/v2/torrents/info')).status_code == 500
+
+
+def test_run_benchmarks_small():
+    result = benchmark.run_benchmarks([30], ['tag_task', 'dashboard'], repeat=2, timeout=120)
+    assert result['config']['sizes'] == [30]
+    assert [(r['scenario'], r['torrents']) for r in result['results']] == [('tag_task', 30), ('dashboard', 30)]
+    for scenario_result in result['results']:
+        assert 'error' not in scenario_result
+        steps = {step['step']: step for step in scenario_result['steps']}
+        assert list(steps) == ['setup', 'cold', 'warm1']
+        assert all('error' not in step for step in steps.values())
+        assert steps['cold']['api_calls'] == sum(steps['cold']['api_calls_by_endpoint'].values())
+    tag_steps = {step['step']: step for step in result['results'][0]['steps']}
+    assert tag_steps['cold']['api_calls_by_endpoint'].get('torrents/addTags')
+    # 第二次执行时修改已完成，不再调用修改接口
+    assert not tag_steps['warm1']['api_calls_by_endpoint'].get('torrents/addTags')
@@ -0,0 +1,53 @@
+import pytest
+
+BACKUP = 'https://backup.example/announce'
+ADD_BACKUP = {'rule_name': '添加备用tracker', 'rule_type': 'tracker_opt', 'priority': 1, 'opt_type': 'add',
+              'tags': '', 'trackers': 'tracker.alpha.org', 'tracker': BACKUP}
+TAG_BACKUP = {'rule_name': '标记备用tracker', 'rule_type': 'tag_opt', 'priority': 2, 'opt_type': 'add',
+              'trackers': 'backup.example', 'tag': 'backup'}
+REMOVE_BACKUP = {'rule_name': '移除备用tracker', 'rule_type': 'tracker_opt', 'priority': 3, 'opt_type': 'remove',
+                 'tags': '', 'trackers': 'backup.example', 'tracker': BACKUP}
+TAG_LEFTOVER = {'rule_name': '标记残留tracker', 'rule_type': 'tag_opt', 'priority': 4, 'opt_type': 'add',
+                'trackers': 'backup.example', 'tag': 'leftover'}
+
+
+def alpha_hashes(library):
+    return {h for h, trackers in library.trackers.items()
+            if any('tracker.alpha.org' in t['url'] for t in trackers)}
+
+
+def tagged(library, tag):
+    return {h for h, t in library.torrents.items() if tag in t['tags'].split(', ')}
+
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_later_rule_sees_added_tracker(make_helper, fake_qbittorrent, incremental):
+    helper = make_helper(rules=[ADD_BACKUP, TAG_BACKUP])
+    library = fake_qbittorrent.library
+    expected = alpha_hashes(library)
+    assert expected and not tagged(library, 'backup')
+
+    helper.opt_all_torrent([ADD_BACKUP, TAG_BACKUP], incremental=incremental)
+    # 添加tracker在规则执行完后才提交，同一次运行中后执行的规则仍按添加后的tracker匹配
+    assert {h for h, trackers in library.trackers.items() if BACKUP in [t['url'] for t in trackers]} == expected
+    assert tagged(library, 'backup') == expected
+
+
+def test_later_rule_sees_removed_tracker(make_helper, fake_qbittorrent):
+    rules = [ADD_BACKUP, REMOVE_BACKUP, TAG_LEFTOVER]
+    helper = make_helper(rules=rules)
+    library = fake_qbittorrent.library
+
+    helper.opt_all_torrent(rules)
+    # 先添加后移除的tracker按顺序提交，后续规则看不到已移除的tracker
+    assert not any(BACKUP in [t['url'] for t in trackers] for trackers in library.trackers.values())
+    assert not tagged(library, 'leftover')
+
+
+def test_plan_includes_chained_changes(make_helper, fake_qbittorrent):
+    helper = make_helper(rules=[ADD_BACKUP, TAG_BACKUP],
+                         tasks=[{'task_name': '预览', 'rules': '添加备用tracker|标记备用tracker'}])
+    plan = helper.plan_manual_task(0)
+    expected = alpha_hashes(fake_qbittorrent.library)
+    assert {c['hash'] for c in plan['changes'] if c['add_trackers'] == [BACKUP]} == expected
+    assert {c['hash'] for c in plan['changes'] if 'backup' in c['add_tags']} == expected
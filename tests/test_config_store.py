@@ -0,0 +1,46 @@
+import time
+
+import yaml
+
+from qbit_helper import ConfigStore
+
+
+def make_store(tmp_path, debounce):
+    path = tmp_path / 'config.yaml'
+    path.write_text(yaml.safe_dump({'user_rules': [], 'user_tasks': []}), encoding='utf-8')
+    return ConfigStore(str(path), debounce=debounce), path
+
+
+def read(path):
+    return yaml.safe_load(path.read_text(encoding='utf-8'))
+
+
+def test_same_value_keeps_version(tmp_path):
+    store, _ = make_store(tmp_path, debounce=0)
+    version = store.version
+    store.set('user_rules', [])
+    assert store.version == version
+    store.set('user_rules', [{'rule_name': 'a'}])
+    assert store.version == version + 1
+    store.set('user_rules', [{'rule_name': 'a'}])
+    assert store.version == version + 1
+
+
+def test_debounce_restarts_on_each_set(tmp_path):
+    store, path = make_store(tmp_path, debounce=0.3)
+    for i in range(4):
+        store.set('user_tasks', [{'task_name': f't{i}'}])
+        time.sleep(0.15)
+    # 连续修改期间一直未到防抖时间，尚未写入
+    assert read(path)['user_tasks'] == []
+    time.sleep(0.4)
+    assert read(path)['user_tasks'] == [{'task_name': 't3'}]
+
+
+def test_flush_writes_pending(tmp_path):
+    store, path = make_store(tmp_path, debounce=60)
+    store.set('user_rules', [{'rule_name': 'a'}])
+    assert read(path)['user_rules'] == []
+    assert store.flush()
+    assert read(path)['user_rules'] == [{'rule_name': 'a'}]
+    assert store._timer is None
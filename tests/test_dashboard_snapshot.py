@@ -0,0 +1,69 @@
+import json
+import os
+import time
+
+
+def test_version_changes_only_with_content(make_helper, fake_qbittorrent):
+    helper = make_helper()
+    first = helper.refresh_dashboard_snapshot()
+    assert first.info.total_torrents == 40
+    version = first.version
+
+    # 内容不变时保持版本号，只更新刷新时间
+    second = helper.refresh_dashboard_snapshot()
+    assert second.version == version
+    assert second.updated_at >= first.updated_at
+
+    library = fake_qbittorrent.library
+    library.edit_tags([next(iter(library.torrents))], ['dashboard-test'], add=True)
+    third = helper.refresh_dashboard_snapshot()
+    assert third.version != version
+    assert third.info.tag_counts.get('dashboard-test') == 1
+
+
+def test_get_snapshot_served_from_memory(make_helper, fake_qbittorrent):
+    helper = make_helper(dashboard={'refresh_interval': 60})
+    snapshot = helper.refresh_dashboard_snapshot()
+    fake_qbittorrent.stats.clear()
+    # 后台刷新启用时直接返回快照，不请求qBittorrent
+    assert helper.get_dashboard_snapshot() is snapshot
+    assert fake_qbittorrent.stats == {}
+
+
+def test_leader_writes_shared_snapshot(make_helper):
+    helper = make_helper(dashboard={'refresh_interval': 60})
+    assert helper.is_leader
+    snapshot = helper.refresh_dashboard_snapshot()
+    with open(helper.dashboard_snapshot_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    assert data['version'] == snapshot.version
+    assert data['info']['total_torrents'] == 40
+    assert set(data['instances']) == set(snapshot.instances)
+
+
+def write_shared_snapshot(helper, snapshot, version, updated_at):
+    with open(helper.dashboard_snapshot_file, 'w', encoding='utf-8') as f:
+        json.dump({'info': snapshot.info.__dict__,
+                   'instances': {name: info.__dict__ for name, info in snapshot.instances.items()},
+                   'version': version, 'updated_at': updated_at, 'refresh_duration': 0.1}, f)
+
+
+def test_follower_reads_shared_snapshot(make_helper, fake_qbittorrent, leader_lock_holder):
+    helper = make_helper(dashboard={'refresh_interval': 60})
+    assert not helper.is_leader
+    # 尚无共享快照时自行计算，且不写入共享文件
+    own = helper.get_dashboard_snapshot()
+    assert not os.path.exists(helper.dashboard_snapshot_file)
+
+    write_shared_snapshot(helper, own, 'leader-version', time.time())
+    fake_qbittorrent.stats.clear()
+    shared = helper.get_dashboard_snapshot()
+    assert shared.version == 'leader-version'
+    assert shared.info.total_torrents == 40
+    assert fake_qbittorrent.stats == {}
+
+    # 共享快照过旧时自行计算
+    write_shared_snapshot(helper, own, 'stale-version', time.time() - 3600)
+    os.utime(helper.dashboard_snapshot_file, (time.time() + 1, time.time() + 1))
+    assert helper.get_dashboard_snapshot().version == own.version
+    assert fake_qbittorrent.stats
@@ -0,0 +1,82 @@
+import json
+import threading
+import time
+
+from qbit_helper import EventBus
+
+
+def test_new_cursor_skips_old_events(tmp_path, logger):
+    bus = EventBus(str(tmp_path / 'events.jsonl'), logger)
+    bus.publish('job', {'n': 0})
+    cursor = bus.cursor()
+    bus.publish('job', {'n': 1})
+    bus.publish('dashboard', {'n': 2})
+    events, cursor, reset = bus.read_since(cursor)
+    assert [(event, data) for _, event, data in events] == [('job', {'n': 1}), ('dashboard', {'n': 2})]
+    assert not reset
+    assert bus.read_since(cursor)[0] == []
+
+    # 断线重连时从Last-Event-ID继续
+    resumed, _, _ = bus.read_since(events[0][0])
+    assert [data for _, _, data in resumed] == [{'n': 2}]
+
+
+def test_shared_between_processes(tmp_path, logger):
+    path = str(tmp_path / 'events.jsonl')
+    reader, writer = EventBus(path, logger), EventBus(path, logger)
+    cursor = reader.cursor()
+    writer.publish('task_start', {'task_name': '测试'})
+    events, _, _ = reader.read_since(cursor)
+    assert [event for _, event, _ in events] == ['task_start']
+
+
+def test_rotation_sends_reset(tmp_path, logger):
+    bus = EventBus(str(tmp_path / 'events.jsonl'), logger, max_bytes=200)
+    bus.publish('job', {'n': 0})
+    cursor = bus.cursor()
+    n = 0
+    while not (tmp_path / 'events.jsonl.1').exists():
+        n += 1
+        bus.publish('job', {'n': n, 'padding': 'x' * 50})
+    events, cursor, reset = bus.read_since(cursor)
+    # 轮转后只能读到新文件中的事件，客户端需要重新加载完整数据
+    assert reset
+    assert [data['n'] for _, _, data in events] == [n]
+    assert not bus.read_since(cursor)[2]
+    # 初始的空cursor不视为轮转
+    assert not bus.read_since('0-0')[2]
+
+
+def test_stream_format(tmp_path, logger):
+    bus = EventBus(str(tmp_path / 'events.jsonl'), logger, poll_interval=0.05)
+    stream = bus.stream(duration=5, heartbeat=0.1)
+    assert next(stream) == 'retry: 3000\n\n'
+    # 没有事件时发送心跳
+    assert next(stream) == ': ping\n\n'
+
+    threading.Timer(0.05, bus.publish, args=('task_progress', {'done': 1, 'task_name': '测试'})).start()
+    start = time.monotonic()
+    message = next(stream)
+    assert time.monotonic() - start < 1
+    lines = message.rstrip('\n').split('\n')
+    assert lines[0].startswith('id: ')
+    assert lines[1] == 'event: task_progress'
+    assert json.loads(lines[2][len('data: '):]) == {'done': 1, 'task_name': '测试'}
+    stream.close()
+
+
+def test_task_run_publishes_events(make_helper):
+    rule = {'rule_name': '标记alpha', 'rule_type': 'tag_opt', 'priority': 1, 'opt_type': 'add',
+            'trackers': 'tracker.alpha.org', 'tag': 'alpha'}
+    helper = make_helper(rules=[rule], tasks=[{'task_name': '预览', 'rules': '标记alpha'}])
+    cursor = helper.events.cursor()
+    helper.plan_manual_task(0)
+    # 预览不发布执行进度
+    assert helper.events.read_since(cursor)[0] == []
+
+    helper.opt_all_torrent([rule])
+    events, _, _ = helper.events.read_since(cursor)
+    names = [event for _, event, _ in events]
+    assert names[0] == 'task_start' and names[-1] == 'task_finish'
+    finish = events[-1][2]
+    assert finish['counts']['标记alpha']['processed'] > 0
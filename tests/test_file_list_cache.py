@@ -0,0 +1,81 @@
+import json
+from types import SimpleNamespace
+
+from qbit_helper import FileListCache
+
+
+class FakeClient:
+    def __init__(self, files):
+        self.files = files
+        self.calls = []
+
+    def torrents_files(self, torrent_hash):
+        self.calls.append(torrent_hash)
+        files = self.files[torrent_hash]
+        if isinstance(files, Exception):
+            raise files
+        return files
+
+
+def torrent(torrent_hash):
+    return SimpleNamespace(hash=torrent_hash, name=torrent_hash)
+
+
+def test_corrupt_records_skipped(tmp_path, logger):
+    path = tmp_path / 'file_lists.jsonl'
+    with open(path, 'wb') as f:
+        f.write(b'{"hash": "a", "fingerprint": "fa"}\n')
+        for line in [b'{}', b'[]', b'"text"', b'null', b'{"hash": "b"}', b'{"fingerprint": "fc"}',
+                     b'{"hash": 1, "fingerprint": "fd"}', b'{"hash": "e", "fingerprint": null}',
+                     b'not json', b'\xff\xfe{"hash"']:
+            f.write(line + b'\n')
+        f.write(b'{"hash": "f", "fingerprint": "ff"}\n')
+    cache = FileListCache(FakeClient({}), logger, str(path))
+    assert cache.get('a') == 'fa'
+    assert cache.get('f') == 'ff'
+    assert cache.get('b') is None and cache.get('e') is None
+    assert cache._stale_records == 8
+
+
+def test_missing_file(tmp_path, logger):
+    cache = FileListCache(FakeClient({}), logger, str(tmp_path / 'file_lists.jsonl'))
+    assert cache.get('a') is None
+
+
+def test_fingerprint_ignores_top_folder():
+    files = [{'name': 'Show.S01/e1.mkv', 'size': 10}, {'name': 'Show.S01/e2.mkv', 'size': 20}]
+    renamed = [{'name': 'Show.S01.Other/e2.mkv', 'size': 20}, {'name': 'Show.S01.Other/e1.mkv', 'size': 10}]
+    assert FileListCache.fingerprint(files) == FileListCache.fingerprint(renamed)
+    assert FileListCache.fingerprint(files) != FileListCache.fingerprint(
+        [{'name': 'Show.S01/e1.mkv', 'size': 10}, {'name': 'Show.S01/e2.mkv', 'size': 21}])
+    # 单文件种子的文件名就是内容的一部分
+    assert FileListCache.fingerprint([{'name': 'a.mkv', 'size': 1}]) != \
+        FileListCache.fingerprint([{'name': 'b.mkv', 'size': 1}])
+    assert FileListCache.fingerprint([]) is None
+
+
+def test_prefetch_appends_and_reloads(tmp_path, logger):
+    path = str(tmp_path / 'file_lists.jsonl')
+    client = FakeClient({'a': [{'name': 'a.mkv', 'size': 1}], 'b': [], 'c': Exception('timeout')})
+    cache = FileListCache(client, logger, path)
+    cache.prefetch([torrent('a'), torrent('b'), torrent('c')])
+    assert cache.get('a') == FileListCache.fingerprint([{'name': 'a.mkv', 'size': 1}])
+    # 没有元数据和获取失败的种子不缓存，下次重新获取
+    assert cache.get('b') is None and cache.get('c') is None
+
+    reloaded = FileListCache(client, logger, path)
+    assert reloaded.get('a') == cache.get('a')
+    client.calls.clear()
+    reloaded.prefetch([torrent('a'), torrent('b')])
+    assert client.calls == ['b']
+
+
+def test_compaction_drops_removed_and_corrupt(tmp_path, logger):
+    path = tmp_path / 'file_lists.jsonl'
+    lines = [json.dumps({'hash': f'h{i}', 'fingerprint': f'f{i}'}) for i in range(1100)] + ['{}']
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    cache = FileListCache(FakeClient({}), logger, str(path))
+    cache.prefetch([torrent('h0')], fetch_missing=False)
+    records = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert records == [{'hash': 'h0', 'fingerprint': 'f0'}]
+    assert cache._stale_records == 0
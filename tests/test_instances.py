@@ -0,0 +1,96 @@
+import benchmark
+import pytest
+
+from qbit_helper import DEFAULT_INSTANCE_NAME
+
+TAG_RULE = {'rule_name': '标记alpha', 'rule_type': 'tag_opt', 'priority': 1, 'opt_type': 'add',
+            'trackers': 'tracker.alpha.org', 'tag': 'alpha'}
+
+
+def alpha_hashes(library):
+    return {h for h, trackers in library.trackers.items()
+            if any('tracker.alpha.org' in t['url'] for t in trackers)}
+
+
+def tagged(library, tag):
+    return {h for h, t in library.torrents.items() if tag in t['tags'].split(', ')}
+
+
+@pytest.fixture
+def second_qbittorrent():
+    server = benchmark.start_fake_server(benchmark.FakeLibrary(10, seed=2))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def host(server):
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def test_resolve_instances(make_helper, second_qbittorrent):
+    helper = make_helper(instances=[{'name': '第二', 'host': host(second_qbittorrent),
+                                     'username': 'admin', 'password': 'admin'}])
+    assert helper.resolve_instances(None) == [DEFAULT_INSTANCE_NAME, '第二']
+    assert helper.resolve_instances('all') == [DEFAULT_INSTANCE_NAME, '第二']
+    # 按配置顺序返回，忽略空白和空项
+    assert helper.resolve_instances(f'第二| {DEFAULT_INSTANCE_NAME}|') == [DEFAULT_INSTANCE_NAME, '第二']
+    assert helper.resolve_instances(['第二']) == ['第二']
+    with pytest.raises(ValueError):
+        helper.resolve_instances('第三')
+
+
+def test_rules_run_on_each_instance(make_helper, fake_qbittorrent, second_qbittorrent):
+    helper = make_helper(instances=[{'name': '第二', 'host': host(second_qbittorrent),
+                                     'username': 'admin', 'password': 'admin'}])
+    first, second = fake_qbittorrent.library, second_qbittorrent.library
+    expected_first = alpha_hashes(first) - tagged(first, 'alpha')
+    expected_second = alpha_hashes(second) - tagged(second, 'alpha')
+
+    result = helper.opt_instances([TAG_RULE], selector='第二', run_name='测试')
+    assert set(result) == {'[第二] 标记alpha'}
+    assert result['[第二] 标记alpha']['processed_count'] == len(expected_second)
+    assert expected_second <= tagged(second, 'alpha')
+    assert not expected_first & tagged(first, 'alpha')
+
+    result = helper.opt_instances([TAG_RULE], run_name='测试')
+    assert result[f'[{DEFAULT_INSTANCE_NAME}] 标记alpha']['processed_count'] == len(expected_first)
+    assert result['[第二] 标记alpha']['processed_count'] == 0
+    assert expected_first <= tagged(first, 'alpha')
+
+    # 仪表板汇总所有实例，也可以只选择部分实例
+    snapshot = helper.refresh_dashboard_snapshot()
+    assert snapshot.info.total_torrents == 50
+    info, version = helper.select_dashboard_info(snapshot, '第二')
+    assert info.total_torrents == 10
+    assert version != snapshot.version
+
+
+def test_failed_instance_does_not_block_others(make_helper, fake_qbittorrent):
+    helper = make_helper(instances=[{'name': '离线', 'host': 'http://127.0.0.1:9',
+                                     'username': 'admin', 'password': 'admin'}])
+    result = helper.opt_instances([TAG_RULE], run_name='测试')
+    # 离线实例的错误记录在日志中，结果中没有处理任何种子
+    assert result['[离线] 标记alpha']['processed_count'] == 0
+    assert result[f'[{DEFAULT_INSTANCE_NAME}] 标记alpha']['processed_count'] > 0
+    status = {instance['name']: instance for instance in helper.get_instances_status()}
+    assert status[DEFAULT_INSTANCE_NAME]['connected']
+    assert not status['离线']['connected']
+
+
+def test_sync_instances_keeps_unchanged(make_helper, second_qbittorrent):
+    second_config = {'name': '第二', 'host': host(second_qbittorrent), 'username': 'admin', 'password': 'admin'}
+    helper = make_helper(instances=[second_config])
+    default_instance, second_instance = helper.instances[DEFAULT_INSTANCE_NAME], helper.instances['第二']
+
+    user_config = helper.config['user_config']
+    user_config['qbittorrent_instances'] = [dict(second_config, password='changed'),
+                                            dict(second_config, name='第三')]
+    changes = helper.sync_instances(connect=False)
+    assert changes == {'added': ['第三'], 'reconnected': ['第二'], 'removed': []}
+    assert helper.instances[DEFAULT_INSTANCE_NAME] is default_instance
+    assert helper.instances['第二'] is not second_instance
+
+    user_config['qbittorrent_instances'] = []
+    assert helper.sync_instances(connect=False)['removed'] == ['第二', '第三']
+    assert list(helper.instances) == [DEFAULT_INSTANCE_NAME]
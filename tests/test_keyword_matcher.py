@@ -0,0 +1,149 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from qbit_helper import KeywordMatcher, CompiledRule
+
+
+def substring_match(keywords, text):
+    """原有的逐个关键字子串匹配"""
+    keywords = [k.strip() for k in keywords if k.strip()]
+    return any(keyword in text for keyword in keywords)
+
+
+@pytest.fixture(params=[False, True], ids=['substring', 'automaton'])
+def make_matcher(request, monkeypatch):
+    """分别使用子串查找和Aho-Corasick自动机构建匹配器"""
+    if request.param:
+        monkeypatch.setattr(KeywordMatcher, 'AUTOMATON_THRESHOLD', 1)
+    else:
+        monkeypatch.setattr(KeywordMatcher, 'AUTOMATON_THRESHOLD', 10 ** 9)
+
+    def make(keywords):
+        matcher = KeywordMatcher(keywords)
+        assert bool(matcher._goto) == (request.param and bool(matcher.keywords))
+        return matcher
+    return make
+
+
+@pytest.mark.parametrize('keywords, text, expected', [
+    (['he', 'she', 'his', 'hers'], 'ushers', True),
+    (['he', 'she', 'his', 'hers'], 'ahishe', True),
+    (['he', 'she', 'his', 'hers'], 'hs', False),
+    # 较短的关键字是较长关键字的后缀，只能通过失配指针发现
+    (['abcd', 'bc'], 'xabce', True),
+    (['aab', 'ab'], 'aaab', True),
+    (['aaaa'], 'aaab', False),
+    (['tracker.a.org', 'a.org'], 'https://b.a.org/announce', True),
+    (['tracker.a.org', 'pt.c.cc'], 'https://tracker.b.org/announce', False),
+    (['', 'x'], 'abc', False),
+    (['', 'b'], 'abc', True),
+    ([], 'abc', False),
+    (['abc'], '', False),
+])
+def test_search_cases(make_matcher, keywords, text, expected):
+    matcher = make_matcher(keywords)
+    assert matcher.search(text) is expected
+    assert expected == substring_match(keywords, text)
+
+
+def test_empty_keywords_never_match(make_matcher):
+    matcher = make_matcher(['', '', ''])
+    assert matcher.keywords == ()
+    assert not matcher.search('')
+    assert not matcher.search('anything')
+
+
+def test_duplicate_keywords_deduplicated(make_matcher):
+    matcher = make_matcher(['a.org', 'b.net', 'a.org'])
+    assert matcher.keywords == ('a.org', 'b.net')
+
+
+def test_random_texts_match_substring_loop(make_matcher):
+    rng = random.Random(7)
+    alphabet = 'ab.c/'
+    for _ in range(200):
+        keywords = [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 4))) for _ in range(rng.randint(1, 8))]
+        matcher = make_matcher(keywords)
+        for _ in range(20):
+            text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+            assert matcher.search(text) == substring_match(keywords, text), (keywords, text)
+
+
+def test_shared_between_threads(make_matcher):
+    matcher = make_matcher([f'pt{i}.org' for i in range(100)])
+    texts = [f'https://pt{i}.org/announce' for i in range(200)]
+    expected = [i < 100 for i in range(200)]
+    # 规则线程池中的多个线程同时使用同一个匹配器
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: [matcher.search(text) for text in texts], range(16)))
+    assert all(result == expected for result in results)
+
+
+def test_search_any():
+    matcher = KeywordMatcher(['pt.c.cc'])
+    assert matcher.search_any(['https://a.org/announce', 'https://pt.c.cc/announce'])
+    assert not matcher.search_any([])
+
+
+def test_compile_splits_keywords():
+    rule = CompiledRule.compile({'rule_name': 'r', 'rule_type': 'tracker_opt', 'opt_type': 'add',
+                                 'trackers': ' a.org | |b.net', 'tags': 'x|y'})
+    assert rule.tracker_matcher.keywords == ('a.org', 'b.net')
+    assert rule.tag_matcher.keywords == ('x', 'y')
+    assert rule.get('opt_type') == 'add'
+    assert rule.get('missing', 1) == 1
+
+
+def test_compile_empty_conditions():
+    rule = CompiledRule.compile({'rule_name': 'r', 'rule_type': 'tracker_opt', 'trackers': '', 'tags': ''})
+    assert rule.tracker_matcher is None
+    assert rule.tag_matcher is None
+
+
+def test_compile_tag_opt_ignores_tags():
+    rule = CompiledRule.compile({'rule_name': 'r', 'rule_type': 'tag_opt', 'trackers': 'a.org', 'tags': 'x'})
+    assert rule.tracker_matcher is not None
+    assert rule.tag_matcher is None
+
+
+
+def baseline_rule_check(torrent, rule):
+    """原有的tracker_opt规则匹配：标签和tracker条件逐个子串查找"""
+    tags_condition_met = True
+    trackers_condition_met = True
+    if rule.get('tags', ''):
+        tag_keywords = [k.strip() for k in rule['tags'].split('|') if k.strip()]
+        torrent_tags = torrent.tags.split(',') if torrent.tags else []
+        tags_condition_met = any(any(k in tag.strip() for k in tag_keywords) for tag in torrent_tags)
+    if rule.get('trackers', ''):
+        tracker_keywords = [k.strip() for k in rule['trackers'].split('|') if k.strip()]
+        trackers_condition_met = any(any(k in t.url for k in tracker_keywords) for t in torrent.trackers)
+    return tags_condition_met and trackers_condition_met
+
+
+def test_rule_check_matches_baseline(monkeypatch):
+    import threading
+    from types import SimpleNamespace
+    from qbit_helper import QBitHelperBasic
+
+    monkeypatch.setattr(KeywordMatcher, 'AUTOMATON_THRESHOLD', 2)
+    helper = QBitHelperBasic.__new__(QBitHelperBasic)
+    helper._compiled_rules = {}
+    helper._compiled_rules_lock = threading.Lock()
+    helper._instance_local = threading.local()
+    helper.instances = {'默认': SimpleNamespace(tracker_cache=SimpleNamespace(get=lambda torrent: torrent.trackers))}
+
+    match_strings = ['', ' ', '|', 'a.org', 'a.org|b.net', ' b | | x', 'tracker', 'org|net|cc', 'y']
+    torrents = [
+        SimpleNamespace(tags=tags, trackers=[SimpleNamespace(url=url) for url in urls])
+        for tags in ['', 'x', 'x, y', 'bx,z']
+        for urls in [[], ['https://tracker.a.org/announce'], ['** [DHT] **', 'https://pt.b.net/a?k=1']]
+    ]
+    for tags in match_strings:
+        for trackers in match_strings:
+            rule = {'rule_name': 'r', 'rule_type': 'tracker_opt', 'tags': tags, 'trackers': trackers}
+            for torrent in torrents:
+                assert helper.tracker_opt_rule_check(torrent, rule) == baseline_rule_check(torrent, rule), \
+                    (rule, torrent)
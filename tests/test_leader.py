@@ -0,0 +1,41 @@
+import os
+import time
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_leader_logs_in_and_starts_scheduler(make_helper, fake_qbittorrent):
+    helper = make_helper()
+    assert helper.is_leader
+    assert helper.scheduler.running and helper.task_run_queue is not None
+    assert helper.instance.connected
+    assert fake_qbittorrent.stats['auth/login'] == 1
+    assert helper.get_scheduler_status()['is_leader']
+
+
+def test_follower_is_lightweight_until_leader_exits(make_helper, fake_qbittorrent, leader_lock_holder):
+    helper = make_helper(scheduler={'leader_retry_interval': 0.2})
+    # 只处理Web请求的进程不登录，也不创建调度器
+    assert not helper.is_leader
+    assert helper.scheduler is None and helper.task_run_queue is None
+    assert fake_qbittorrent.stats == {}
+    assert not helper.get_scheduler_status()['is_leader']
+
+    # 第一次需要请求qBittorrent时登录
+    assert helper.get_dashboard_snapshot().info.total_torrents == 40
+    assert fake_qbittorrent.stats['auth/login'] == 1
+    assert helper.instance.connected
+
+    leader_lock_holder.stdin.close()
+    leader_lock_holder.wait(5)
+
+    # leader进程退出后接替
+    assert wait_until(lambda: helper.is_leader)
+    assert wait_until(lambda: helper.scheduler is not None and helper.scheduler.running)
+    assert wait_until(lambda: os.path.exists(helper.scheduler_status_file))
+    assert helper.get_scheduler_status()['is_leader']
@@ -0,0 +1,104 @@
+import time
+
+import pytest
+import qbittorrentapi
+
+import benchmark
+from qbit_helper import ManagedClient
+
+
+class RecordingLimiter:
+    """记录取得令牌和请求结果的限速器"""
+
+    def __init__(self):
+        self.acquired = []
+        self.recorded = []
+
+    classify = staticmethod(lambda api_namespace, api_method:
+                            None if api_namespace == 'auth' else
+                            'mutation' if api_method.startswith('add') else 'read')
+
+    def acquire(self, operation):
+        self.acquired.append(operation)
+
+    def record(self, operation, duration, error=None):
+        self.recorded.append((operation, error))
+
+
+class ExpiringSessionHandler(benchmark.FakeQBittorrentHandler):
+    """server.session_valid为False时，除登录外的请求返回403，登录后恢复"""
+
+    def _handle(self):
+        if self.path.startswith('/api/v2/auth/login'):
+            self.server.session_valid = True
+        elif not self.server.session_valid:
+            with self.server.stats_lock:
+                self.server.stats['forbidden'] = self.server.stats.get('forbidden', 0) + 1
+            return self._send(403, 'Forbidden')
+        return super()._handle()
+
+
+def make_client(server, **kwargs):
+    return ManagedClient(host=f'http://127.0.0.1:{server.server_address[1]}', username='admin', password='admin',
+                         REQUESTS_ARGS={'timeout': (1, 5)}, **kwargs)
+
+
+def test_public_methods_pass_through_limiter(fake_qbittorrent):
+    limiter = RecordingLimiter()
+    client = make_client(fake_qbittorrent, rate_limiter=limiter)
+    client.auth_log_in()
+    torrent_hash = next(iter(fake_qbittorrent.library.torrents))
+    client.torrents_trackers(torrent_hash=torrent_hash)
+    client.torrents_add_tags(tags='x', torrent_hashes=[torrent_hash])
+    # 登录不限速，读取和修改分别取得对应的令牌
+    assert limiter.acquired == ['read', 'mutation']
+    assert limiter.recorded == [('read', None), ('mutation', None)]
+    assert 'x' in fake_qbittorrent.library.torrents[torrent_hash]['tags']
+    assert client.connected
+
+
+def test_library_relogin_on_expired_session(fake_qbittorrent):
+    fake_qbittorrent.RequestHandlerClass = ExpiringSessionHandler
+    fake_qbittorrent.session_valid = False
+    client = make_client(fake_qbittorrent)
+    client.auth_log_in()
+    fake_qbittorrent.session_valid = False
+    # 会话失效后由qbittorrentapi重新登录并重试，调用方无感知
+    assert len(client.sync_maindata()['torrents']) == 40
+    assert fake_qbittorrent.stats['auth/login'] == 2
+    assert fake_qbittorrent.stats['forbidden'] >= 1
+    assert client.status()['connected']
+
+
+def test_backoff_after_connection_failures():
+    client = ManagedClient(host='http://127.0.0.1:9', username='admin', password='admin',
+                           failure_threshold=2, backoff_min=60, REQUESTS_ARGS={'timeout': (0.5, 0.5)})
+    for _ in range(2):
+        with pytest.raises(qbittorrentapi.APIConnectionError):
+            client.app_version()
+    start = time.monotonic()
+    with pytest.raises(qbittorrentapi.APIConnectionError, match='暂时不可用'):
+        client.torrents_info()
+    # 退避期间直接失败，不再发出请求
+    assert time.monotonic() - start < 0.1
+    status = client.status()
+    assert not status['connected'] and status['consecutive_failures'] == 2 and status['retry_in'] > 50
+
+
+def test_success_after_backoff_recovers(fake_qbittorrent):
+    client = make_client(fake_qbittorrent, failure_threshold=1, backoff_min=0.05)
+    client._record_failure(qbittorrentapi.APIConnectionError('Connection refused'))
+    with pytest.raises(qbittorrentapi.APIConnectionError):
+        client.app_version()
+    time.sleep(0.1)
+    assert client.app_version() == 'v4.6.7'
+    assert client.status() == {'connected': True, 'consecutive_failures': 0, 'retry_in': 0.0, 'last_error':
+                               'Connection refused'}
+
+
+def test_attributes_forwarded(fake_qbittorrent):
+    client = make_client(fake_qbittorrent)
+    assert client.host.endswith(str(fake_qbittorrent.server_address[1]))
+    assert client.torrents_add_tags.__name__ == 'torrents_add_tags'
+    with pytest.raises(AttributeError):
+        client._request_manager
@@ -0,0 +1,88 @@
+import json
+import os
+import re
+import subprocess
+import sys
+
+from qbit_helper import DEFAULT_INSTANCE_NAME, Metrics
+
+
+def sample(text, line_prefix):
+    """返回以line_prefix开头的指标行的值"""
+    for line in text.splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    raise AssertionError(f'未找到指标 {line_prefix}')
+
+
+def test_render_counter_gauge_histogram(tmp_path, logger):
+    metrics = Metrics(str(tmp_path / 'metrics'), logger)
+    metrics.inc('qbit_helper_task_runs_total', {'task': '任务', 'trigger': 'manual', 'outcome': 'success'})
+    metrics.inc('qbit_helper_task_runs_total', {'outcome': 'success', 'trigger': 'manual', 'task': '任务'}, 2)
+    metrics.set('qbit_helper_instance_up', {'instance': 'a"b'}, 1)
+    for value in (0.004, 0.3, 5000):
+        metrics.observe('qbit_helper_task_duration_seconds', {'task': '任务', 'trigger': 'manual'}, value)
+
+    text = metrics.render()
+    assert '# TYPE qbit_helper_task_runs_total counter' in text
+    assert sample(text, 'qbit_helper_task_runs_total{outcome="success",task="任务",trigger="manual"}') == 3
+    # 标签值中的引号被转义
+    assert sample(text, 'qbit_helper_instance_up{instance="a\\"b"}') == 1
+
+    labels = 'task="任务",trigger="manual"'
+    buckets = [(match.group(1), float(match.group(2))) for match in
+               re.finditer(rf'qbit_helper_task_duration_seconds_bucket\{{{labels},le="([^"]+)"\}} (\S+)', text)]
+    counts = [count for _, count in buckets]
+    # 分桶计数是累计的，+Inf分桶等于总次数
+    assert counts == sorted(counts)
+    assert buckets[-1] == ('+Inf', 3)
+    assert counts[-2] == 2
+    assert sample(text, f'qbit_helper_task_duration_seconds_count{{{labels}}}') == 3
+    assert sample(text, f'qbit_helper_task_duration_seconds_sum{{{labels}}}') == 5000.304
+
+
+def test_merges_live_processes(tmp_path, logger):
+    directory = str(tmp_path / 'metrics')
+    metrics = Metrics(directory, logger)
+    metrics.inc('qbit_helper_api_requests_total', {'endpoint': 'torrents/info'}, 2)
+    metrics.set('qbit_helper_instance_up', {'instance': 'x'}, 0)
+
+    # 其他存活进程（这里用父进程的pid）写入的指标参与合并
+    other = Metrics(directory, logger)
+    other.inc('qbit_helper_api_requests_total', {'endpoint': 'torrents/info'}, 3)
+    other.set('qbit_helper_instance_up', {'instance': 'x'}, 1)
+    with open(os.path.join(directory, f'{os.getppid()}.json'), 'w', encoding='utf-8') as f:
+        json.dump(other._snapshot(), f)
+
+    # 已退出进程的指标文件被删除
+    exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+    dead_path = os.path.join(directory, f'{exited.stdout.strip()}.json')
+    with open(dead_path, 'w', encoding='utf-8') as f:
+        json.dump(other._snapshot(), f)
+
+    text = metrics.render()
+    assert sample(text, 'qbit_helper_api_requests_total{endpoint="torrents/info"}') == 5
+    # 仪表取最近设置的值
+    assert sample(text, 'qbit_helper_instance_up{instance="x"}') == 1
+    assert not os.path.exists(dead_path)
+
+    metrics.flush()
+    assert os.path.exists(os.path.join(directory, f'{os.getpid()}.json'))
+    # 当前进程自己的文件不重复计入
+    assert sample(metrics.render(), 'qbit_helper_api_requests_total{endpoint="torrents/info"}') == 5
+
+
+def test_task_run_recorded(make_helper):
+    rule = {'rule_name': '标记alpha', 'rule_type': 'tag_opt', 'priority': 1, 'opt_type': 'add',
+            'trackers': 'tracker.alpha.org', 'tag': 'alpha'}
+    helper = make_helper(rules=[rule], tasks=[{'task_name': '手动任务', 'rules': '标记alpha'}],
+                         metrics={'enabled': True, 'flush_interval': 0})
+    helper.execute_manual_task(0)
+    text = helper.render_metrics()
+    assert sample(text, 'qbit_helper_task_runs_total{outcome="success",task="手动任务",trigger="manual"}') == 1
+    assert sample(text, 'qbit_helper_task_duration_seconds_count{task="手动任务",trigger="manual"}') == 1
+    assert sample(text, f'qbit_helper_rule_torrents_total{{instance="{DEFAULT_INSTANCE_NAME}",rule="标记alpha",'
+                        f'status="processed"}}') > 0
+    assert sample(text, f'qbit_helper_instance_up{{instance="{DEFAULT_INSTANCE_NAME}"}}') == 1
+    assert sample(text, f'qbit_helper_api_requests_total{{endpoint="torrents/addTags",'
+                        f'instance="{DEFAULT_INSTANCE_NAME}",result="ok"}}') >= 1
@@ -0,0 +1,142 @@
+import pytest
+
+from qbit_helper import MutationBuffer
+
+
+class FakeClient:
+    """记录修改调用的客户端，包含bad_hashes中任一种子的调用抛出异常"""
+
+    def __init__(self, bad_hashes=()):
+        self.bad_hashes = set(bad_hashes)
+        self.calls = []
+
+    def _call(self, method, hashes, value):
+        self.calls.append((method, tuple(hashes), value))
+        if self.bad_hashes & set(hashes):
+            raise Exception('Conflict')
+
+    def torrents_add_tags(self, tags, torrent_hashes):
+        self._call('add_tags', torrent_hashes, tags)
+
+    def torrents_remove_tags(self, tags, torrent_hashes):
+        self._call('remove_tags', torrent_hashes, tags)
+
+    def torrents_add_trackers(self, torrent_hash, urls):
+        self._call('add_trackers', [torrent_hash], urls[0])
+
+    def torrents_remove_trackers(self, torrent_hash, urls):
+        self._call('remove_trackers', [torrent_hash], urls[0])
+
+
+class FakeTrackerCache:
+    def __init__(self):
+        self.invalidated = []
+
+    def invalidate(self, torrent_hash):
+        self.invalidated.append(torrent_hash)
+
+
+def add_all(buffer, operation, value, hashes):
+    results = {}
+    for torrent_hash in hashes:
+        results[torrent_hash] = {'status': '', 'detail': 'ok'}
+        buffer.add(operation, value, torrent_hash, results[torrent_hash], f'failed {torrent_hash}')
+    return results
+
+
+def test_tags_grouped_and_chunked(logger):
+    client = FakeClient()
+    buffer = MutationBuffer(client, logger, chunk_size=2)
+    results = add_all(buffer, 'add_tags', 'A', ['h1', 'h2', 'h3'])
+    results.update(add_all(buffer, 'remove_tags', 'B', ['h4']))
+    assert len(buffer) == 4
+    assert all(result['status'] == 'pending' for result in results.values())
+
+    buffer.flush()
+    assert client.calls == [('add_tags', ('h1', 'h2'), 'A'), ('add_tags', ('h3',), 'A'),
+                            ('remove_tags', ('h4',), 'B')]
+    assert all(result['status'] == 'processed' for result in results.values())
+    assert len(buffer) == 0
+    assert [len(results) for _, results in buffer.timings] == [3, 1]
+
+
+def test_partial_failure_retries_each_torrent(logger):
+    client = FakeClient(bad_hashes={'h2'})
+    buffer = MutationBuffer(client, logger, chunk_size=10)
+    results = add_all(buffer, 'add_tags', 'A', ['h1', 'h2', 'h3'])
+    buffer.flush()
+
+    assert client.calls == [('add_tags', ('h1', 'h2', 'h3'), 'A'),
+                            ('add_tags', ('h1',), 'A'), ('add_tags', ('h2',), 'A'), ('add_tags', ('h3',), 'A')]
+    assert results['h1'] == {'status': 'processed', 'detail': 'ok'}
+    assert results['h3'] == {'status': 'processed', 'detail': 'ok'}
+    assert results['h2'] == {'status': 'failed', 'detail': 'failed h2'}
+
+
+def test_failed_chunk_does_not_affect_other_chunks(logger):
+    client = FakeClient(bad_hashes={'h1'})
+    buffer = MutationBuffer(client, logger, chunk_size=2)
+    results = add_all(buffer, 'remove_tags', 'A', ['h1', 'h2', 'h3', 'h4'])
+    buffer.flush()
+    assert [call[1] for call in client.calls] == [('h1', 'h2'), ('h1',), ('h2',), ('h3', 'h4')]
+    assert {h: r['status'] for h, r in results.items()} == {
+        'h1': 'failed', 'h2': 'processed', 'h3': 'processed', 'h4': 'processed'}
+
+
+def test_single_torrent_failure_not_retried(logger):
+    client = FakeClient(bad_hashes={'h1'})
+    buffer = MutationBuffer(client, logger)
+    results = add_all(buffer, 'add_tags', 'A', ['h1'])
+    buffer.flush()
+    assert len(client.calls) == 1
+    assert results['h1']['status'] == 'failed'
+
+
+def test_trackers_submitted_per_torrent_and_invalidated(logger):
+    client = FakeClient(bad_hashes={'h2'})
+    tracker_cache = FakeTrackerCache()
+    buffer = MutationBuffer(client, logger, chunk_size=10, tracker_cache=tracker_cache)
+    results = add_all(buffer, 'add_trackers', 'https://t/announce', ['h1', 'h2'])
+    results.update(add_all(buffer, 'remove_trackers', 'https://old/announce', ['h3']))
+    buffer.flush()
+
+    assert client.calls == [('add_trackers', ('h1',), 'https://t/announce'),
+                            ('add_trackers', ('h2',), 'https://t/announce'),
+                            ('remove_trackers', ('h3',), 'https://old/announce')]
+    assert {h: r['status'] for h, r in results.items()} == {'h1': 'processed', 'h2': 'failed', 'h3': 'processed'}
+    # 修改失败时tracker列表也可能已变化，缓存同样失效
+    assert sorted(tracker_cache.invalidated) == ['h1', 'h2', 'h3']
+
+
+def test_dry_run_records_plan_without_calls(logger):
+    client = FakeClient()
+    buffer = MutationBuffer(client, logger, dry_run=True)
+    results = add_all(buffer, 'add_tags', 'A', ['h1', 'h2'])
+    results.update(add_all(buffer, 'add_trackers', 'https://t/announce', ['h1']))
+    buffer.flush()
+    assert client.calls == []
+    assert buffer.planned == {'h1': {'add_tags': ['A'], 'add_trackers': ['https://t/announce']},
+                              'h2': {'add_tags': ['A']}}
+    assert all(result['status'] == 'processed' for result in results.values())
+
+
+def test_unknown_operation(logger):
+    buffer = MutationBuffer(FakeClient(), logger)
+    with pytest.raises(ValueError):
+        buffer.add('set_category', 'movie', 'h1', {}, '')
+
+
+def test_tracker_urls_include_pending(logger):
+    client = FakeClient()
+    buffer = MutationBuffer(client, logger)
+    urls = ['https://a/announce', 'https://b/announce']
+    add_all(buffer, 'add_trackers', 'https://c/announce', ['h1'])
+    add_all(buffer, 'remove_trackers', 'https://a/announce', ['h1'])
+    assert buffer.tracker_urls('h1', urls) == ['https://b/announce', 'https://c/announce']
+    # 其他种子和标签修改不影响
+    add_all(buffer, 'add_tags', 'A', ['h2'])
+    assert buffer.tracker_urls('h2', urls) == urls
+    assert urls == ['https://a/announce', 'https://b/announce']
+
+    buffer.flush()
+    assert buffer.tracker_urls('h1', urls) == urls
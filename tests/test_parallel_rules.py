@@ -0,0 +1,76 @@
+import threading
+import time
+
+from qbit_helper import TaskProgress
+
+TAG_RULE = {'rule_name': '标记alpha', 'rule_type': 'tag_opt', 'priority': 1, 'opt_type': 'add',
+            'trackers': 'tracker.alpha.org', 'tag': 'alpha'}
+TRACKER_RULE = {'rule_name': '添加备用tracker', 'rule_type': 'tracker_opt', 'priority': 2, 'opt_type': 'add',
+                'tags': '', 'trackers': 'pt.beta.net', 'tracker': 'https://backup.example/announce'}
+TASK = {'task_name': '并发任务', 'rules': '标记alpha|添加备用tracker'}
+
+
+def plan_changes(helper):
+    return sorted((c['hash'], c['add_tags'], c['add_trackers']) for c in helper.plan_manual_task(0)['changes'])
+
+
+def track_concurrency(helper, delay=0.01):
+    """包装opt_single_torrent，记录同时执行的种子数、执行线程和线程中的当前实例"""
+    stats = {'running': 0, 'max_running': 0, 'threads': set(), 'instances': set()}
+    lock = threading.Lock()
+    original = helper.opt_single_torrent
+
+    def opt_single_torrent(*args, **kwargs):
+        with lock:
+            stats['running'] += 1
+            stats['max_running'] = max(stats['max_running'], stats['running'])
+            stats['threads'].add(threading.current_thread().name)
+            stats['instances'].add(helper.instance.name)
+        try:
+            time.sleep(delay)
+            return original(*args, **kwargs)
+        finally:
+            with lock:
+                stats['running'] -= 1
+    helper.opt_single_torrent = opt_single_torrent
+    return stats
+
+
+def test_parallel_matches_serial(make_helper):
+    helper = make_helper(rules=[TAG_RULE, TRACKER_RULE], tasks=[TASK], execution={'workers': 1})
+    serial = plan_changes(helper)
+    assert serial
+
+    helper.config['default']['execution'] = {'workers': 4, 'max_in_flight': 8}
+    stats = track_concurrency(helper)
+    assert plan_changes(helper) == serial
+    assert all(name.startswith('opt-torrent') for name in stats['threads'])
+    assert 1 < stats['max_running'] <= 4
+    assert stats['instances'] == {helper.instance.name}
+
+
+def test_parallel_run_applies_all_changes(make_helper, fake_qbittorrent):
+    helper = make_helper(rules=[TAG_RULE], execution={'workers': 3, 'max_in_flight': 3})
+    stats = track_concurrency(helper)
+    result = helper.opt_all_torrent([TAG_RULE])
+    assert stats['max_running'] <= 3
+    library = fake_qbittorrent.library
+    alpha = {h for h, trackers in library.trackers.items() if any('tracker.alpha.org' in t['url'] for t in trackers)}
+    assert {h for h, t in library.torrents.items() if 'alpha' in t['tags'].split(', ')} >= alpha
+    assert result['标记alpha']['processed_count'] + result['标记alpha']['skipped_count'] == 40
+
+
+def test_cancel_stops_submitting(make_helper, fake_qbittorrent):
+    helper = make_helper(rules=[TAG_RULE], execution={'workers': 2, 'max_in_flight': 2})
+    stats = track_concurrency(helper, delay=0.05)
+    progress = TaskProgress()
+    timer = threading.Timer(0.08, progress.cancel)
+    timer.start()
+    try:
+        helper.opt_all_torrent([TAG_RULE], progress=progress)
+    finally:
+        timer.cancel()
+    # 取消后只完成已提交的种子
+    assert progress.cancelled
+    assert stats['running'] == 0
+    assert progress.done < progress.total
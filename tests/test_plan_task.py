@@ -0,0 +1,57 @@
+import os
+import threading
+
+import pytest
+
+TAG_RULE = {'rule_name': '标记alpha', 'rule_type': 'tag_opt', 'priority': 1, 'opt_type': 'add',
+            'trackers': 'tracker.alpha.org', 'tag': 'alpha'}
+TRACKER_RULE = {'rule_name': '添加备用tracker', 'rule_type': 'tracker_opt', 'priority': 2, 'opt_type': 'add',
+                'tags': '', 'trackers': 'pt.beta.net', 'tracker': 'https://backup.example/announce'}
+TASK = {'task_name': '预览任务', 'rules': '标记alpha|添加备用tracker'}
+
+
+def alpha_hashes(library):
+    return {h for h, trackers in library.trackers.items()
+            if any('tracker.alpha.org' in t['url'] for t in trackers)}
+
+
+def test_plan_lists_changes_without_mutating(make_helper, fake_qbittorrent):
+    helper = make_helper(rules=[TAG_RULE, TRACKER_RULE], tasks=[TASK])
+    library = fake_qbittorrent.library
+    tags_before = {h: t['tags'] for h, t in library.torrents.items()}
+    fake_qbittorrent.stats.clear()
+
+    plan = helper.plan_manual_task(0)
+    expected = {h for h in alpha_hashes(library) if 'alpha' not in tags_before[h].split(', ')}
+    assert {c['hash'] for c in plan['changes'] if c['add_tags']} == expected
+    assert plan['summary']['标记alpha']['processed_count'] == len(expected)
+    assert all(c['add_trackers'] == ['https://backup.example/announce']
+               for c in plan['changes'] if c['add_trackers'])
+    # 预览不发出任何修改请求，种子保持不变
+    assert not [endpoint for endpoint in fake_qbittorrent.stats if 'add' in endpoint or 'remove' in endpoint]
+    assert {h: t['tags'] for h, t in library.torrents.items()} == tags_before
+
+    assert len(helper.plan_manual_task(0, limit=1)['changes']) == 1
+    with pytest.raises(ValueError):
+        helper.plan_manual_task(5)
+
+
+def test_plan_does_not_wait_for_running_task(make_helper):
+    helper = make_helper(rules=[TAG_RULE], tasks=[TASK])
+    result = {}
+    # 模拟正在执行的任务持有实例锁
+    with helper.instance.lock:
+        thread = threading.Thread(target=lambda: result.update(plan=helper.plan_manual_task(0)))
+        thread.start()
+        thread.join(10)
+        assert not thread.is_alive()
+    assert result['plan']['total_changes'] > 0
+
+
+def test_plan_skips_profiling(make_helper):
+    helper = make_helper(rules=[TAG_RULE], tasks=[TASK], profiling={'mode': 'cprofile', 'dir': 'profiles'})
+    helper.plan_manual_task(0)
+    assert not os.path.exists(os.path.join('data', 'profiles'))
+    # 正常执行时仍然写入分析结果
+    helper.opt_all_torrent([TAG_RULE])
+    assert len(os.listdir(os.path.join('data', 'profiles'))) == 1
@@ -0,0 +1,162 @@
+import pytest
+import qbittorrentapi
+
+import qbit_helper
+from qbit_helper import AdaptiveRateLimiter
+
+
+class FakeClock:
+    """替代time.monotonic和time.sleep，sleep只推进时间
+
+    与真实的sleep一样每次至少推进一个很小的时间，避免浮点误差导致等待不前进。
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 1e-6)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(qbit_helper.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(qbit_helper.time, 'sleep', clock.sleep)
+    return clock
+
+
+def make_limiter(logger, **kwargs):
+    options = {'budgets': {'read': {'rate': 10, 'burst': 3, 'min_rate': 2, 'max_rate': 20}},
+               'latency_target': 1.0, 'error_threshold': 0.25, 'window': 4,
+               'increase_step': 5, 'decrease_factor': 0.5}
+    options.update(kwargs)
+    return AdaptiveRateLimiter(logger, **options)
+
+
+def test_burst_then_wait(clock, logger):
+    limiter = make_limiter(logger)
+    for _ in range(3):
+        limiter.acquire('read')
+    assert clock.sleeps == []
+    limiter.acquire('read')
+    assert sum(clock.sleeps) == pytest.approx(0.1, abs=1e-3)
+    assert limiter.stats()['read']['total_wait'] == pytest.approx(0.1)
+
+
+def test_tokens_refill_up_to_burst(clock, logger):
+    limiter = make_limiter(logger)
+    for _ in range(3):
+        limiter.acquire('read')
+    clock.now += 100
+    for _ in range(3):
+        limiter.acquire('read')
+    assert clock.sleeps == []
+    limiter.acquire('read')
+    assert sum(clock.sleeps) == pytest.approx(0.1, abs=1e-3)
+
+
+def test_sustained_rate(clock, logger):
+    limiter = make_limiter(logger)
+    start = clock.now
+    for _ in range(23):
+        limiter.acquire('read')
+    # 突发3个之后按10次/秒发放
+    assert clock.now - start == pytest.approx(2.0, abs=1e-3)
+
+
+def test_additive_increase_capped(clock, logger):
+    limiter = make_limiter(logger)
+    for expected in (15, 20, 20):
+        for _ in range(4):
+            limiter.record('read', 0.1)
+        assert limiter.stats()['read']['rate'] == expected
+
+
+def test_multiplicative_decrease_on_latency(clock, logger):
+    limiter = make_limiter(logger)
+    for _ in range(3):
+        limiter.record('read', 2.0)
+    # 窗口未满时不调整
+    assert limiter.stats()['read']['rate'] == 10
+    limiter.record('read', 2.0)
+    assert limiter.stats()['read']['rate'] == 5
+    assert limiter.stats()['read']['avg_latency'] == 2.0
+    for _ in range(8):
+        limiter.record('read', 2.0)
+    assert limiter.stats()['read']['rate'] == 2
+
+
+def test_decrease_on_congestion_errors(clock, logger):
+    limiter = make_limiter(logger)
+    error = qbittorrentapi.HTTP5XXError('Service Unavailable')
+    limiter.record('read', 0.1, error)
+    limiter.record('read', 0.1, error)
+    limiter.record('read', 0.1)
+    limiter.record('read', 0.1)
+    stats = limiter.stats()['read']
+    assert stats['rate'] == 5
+    assert stats['error_rate'] == 0.5
+    assert stats['total_errors'] == 2
+
+
+def test_error_rate_at_threshold_increases(clock, logger):
+    limiter = make_limiter(logger)
+    limiter.record('read', 0.1, qbittorrentapi.HTTP403Error('Forbidden'))
+    for _ in range(3):
+        limiter.record('read', 0.1)
+    assert limiter.stats()['read']['rate'] == 15
+
+
+def test_client_errors_not_counted(clock, logger):
+    limiter = make_limiter(logger)
+    for _ in range(4):
+        limiter.record('read', 0.1, qbittorrentapi.NotFound404Error('Not Found'))
+    stats = limiter.stats()['read']
+    assert stats['rate'] == 15
+    assert stats['total_errors'] == 0
+
+
+def test_buckets_independent(clock, logger):
+    limiter = make_limiter(logger)
+    for _ in range(4):
+        limiter.record('read', 5.0)
+    stats = limiter.stats()
+    assert stats['read']['rate'] == 5
+    assert stats['mutation']['rate'] == AdaptiveRateLimiter.DEFAULT_BUDGETS['mutation']['rate']
+
+
+def test_budget_rate_clamped(logger):
+    limiter = AdaptiveRateLimiter(logger, budgets={'mutation': {'rate': 1000}})
+    assert limiter.stats()['mutation']['rate'] == AdaptiveRateLimiter.DEFAULT_BUDGETS['mutation']['max_rate']
+
+
+@pytest.mark.parametrize('namespace, method, expected', [
+    ('auth', 'login', None),
+    ('torrents', 'info', 'read'),
+    ('torrents', 'trackers', 'read'),
+    ('torrents', 'addTags', 'mutation'),
+    ('sync', 'maindata', 'read'),
+    ('app', 'setPreferences', 'mutation'),
+    ('transfer', 'toggleSpeedLimitsMode', 'mutation'),
+])
+def test_classify(namespace, method, expected):
+    assert AdaptiveRateLimiter.classify(namespace, method) == expected
+
+
+@pytest.mark.parametrize('error, expected', [
+    (qbittorrentapi.HTTP403Error('Forbidden'), True),
+    (qbittorrentapi.HTTP5XXError('Bad Gateway'), True),
+    (qbittorrentapi.APIConnectionError('Connection refused'), True),
+    (TimeoutError(), True),
+    (qbittorrentapi.NotFound404Error('Not Found'), False),
+    (qbittorrentapi.Conflict409Error('Conflict'), False),
+    (ValueError('bad'), False),
+])
+def test_is_congestion_error(error, expected):
+    assert AdaptiveRateLimiter.is_congestion_error(error) is expected
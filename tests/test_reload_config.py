@@ -0,0 +1,82 @@
+import os
+import time
+
+import yaml
+
+from qbit_helper import DEFAULT_INSTANCE_NAME
+
+TAG_RULE = {'rule_name': '标记alpha', 'rule_type': 'tag_opt', 'priority': 1, 'opt_type': 'add',
+            'trackers': 'tracker.alpha.org', 'tag': 'alpha'}
+AUTO_TASK = {'index': 1, 'task_name': '每日标记', 'task_type': 'auto', 'cron': '0 3 * * *', 'status': True,
+             'rules': '标记alpha'}
+
+
+def edit_config_file(helper, edit):
+    """模拟其他进程修改配置文件"""
+    with open(helper.config_store.path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    edit(config)
+    with open(helper.config_store.path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    # 保证修改时间与上次读取时不同
+    mtime = time.time() + 5
+    os.utime(helper.config_store.path, (mtime, mtime))
+
+
+def auto_jobs(helper):
+    return {job.id: job for job in helper.scheduler.get_jobs() if job.id.startswith('auto_task_')}
+
+
+def test_reload_applies_only_changes(make_helper, fake_qbittorrent):
+    helper = make_helper(rules=[TAG_RULE], tasks=[AUTO_TASK])
+    instance = helper.instances[DEFAULT_INSTANCE_NAME]
+    compiled = helper.compile_rule(TAG_RULE)
+    next_run_time = auto_jobs(helper)['auto_task_1'].next_run_time
+    logins = fake_qbittorrent.stats['auth/login']
+
+    def edit(config):
+        config['user_tasks'][0]['task_name'] = '每日标记alpha'
+        config['user_tasks'].append(dict(AUTO_TASK, index=2, task_name='每周标记', cron='0 3 * * 1'))
+    edit_config_file(helper, edit)
+    changes = helper.reload_config()
+    assert changes['instances'] == {'added': [], 'reconnected': [], 'removed': []}
+    assert changes['tasks'] == {'added': ['每周标记'], 'removed': [], 'rescheduled': [], 'updated': ['每日标记alpha']}
+    # 未变化的实例保留会话，规则未变化时保留编译缓存，只修改参数的任务不改变下次执行时间
+    assert helper.instances[DEFAULT_INSTANCE_NAME] is instance
+    assert fake_qbittorrent.stats['auth/login'] == logins
+    assert helper.compile_rule(TAG_RULE) is compiled
+    jobs = auto_jobs(helper)
+    assert set(jobs) == {'auto_task_1', 'auto_task_2'}
+    assert jobs['auto_task_1'].next_run_time == next_run_time
+    assert jobs['auto_task_1'].name == '每日标记alpha'
+
+
+def test_reload_reconnects_changed_instance(make_helper, fake_qbittorrent):
+    helper = make_helper(rules=[TAG_RULE], tasks=[AUTO_TASK])
+    instance = helper.instances[DEFAULT_INSTANCE_NAME]
+    compiled = helper.compile_rule(TAG_RULE)
+    logins = fake_qbittorrent.stats['auth/login']
+
+    def edit(config):
+        config['user_config']['qbittorrent']['username'] = 'operator'
+        config['user_rules'][0]['tag'] = 'alpha2'
+        config['user_tasks'][0]['cron'] = '0 4 * * *'
+    edit_config_file(helper, edit)
+    changes = helper.reload_config()
+    assert changes['instances']['reconnected'] == [DEFAULT_INSTANCE_NAME]
+    assert changes['tasks']['rescheduled'] == ['每日标记']
+    assert helper.instances[DEFAULT_INSTANCE_NAME] is not instance
+    assert fake_qbittorrent.stats['auth/login'] == logins + 1
+    # 规则变化后清空编译缓存
+    assert helper.compile_rule(TAG_RULE) is not compiled
+
+
+def test_watch_config_file(make_helper):
+    helper = make_helper(rules=[TAG_RULE], tasks=[AUTO_TASK])
+    helper._watch_config_file()
+    assert set(auto_jobs(helper)) == {'auto_task_1'}
+
+    edit_config_file(helper, lambda config: config['user_tasks'][0].update(status=False))
+    helper._watch_config_file()
+    assert auto_jobs(helper) == {}
+    assert not helper.config_store.changed_on_disk()
@@ -0,0 +1,65 @@
+import sqlite3
+
+from qbit_helper import DEFAULT_INSTANCE_NAME, CompiledRule
+
+TAG_RULE = {'rule_name': '标记alpha', 'rule_type': 'tag_opt', 'priority': 1, 'opt_type': 'add',
+            'trackers': 'tracker.alpha.org', 'tag': 'alpha'}
+
+
+def test_run_saves_states_and_history(make_helper, fake_qbittorrent):
+    helper = make_helper(rules=[TAG_RULE])
+    library = fake_qbittorrent.library
+    result = helper.opt_all_torrent([TAG_RULE], incremental=False)
+    processed = result['标记alpha']['processed_count']
+    assert processed > 0
+
+    # 记录修改后的标签和tracker主机名
+    states = helper.state_store.get_torrent_states(DEFAULT_INSTANCE_NAME)
+    assert set(states) == set(library.torrents)
+    tagged = {h for h, state in states.items() if 'alpha' in state[0].split(',')}
+    assert tagged == {h for h, t in library.torrents.items() if 'alpha' in t['tags'].split(', ')}
+    assert all('tracker.alpha.org' in states[h][1].split(',') for h in tagged)
+
+    history = helper.state_store.query_history(instance=DEFAULT_INSTANCE_NAME, rule_name='标记alpha')
+    assert len(history) == processed
+    assert {entry['status'] for entry in history} == {'processed'}
+    assert {entry['rule_version'] for entry in history} == {CompiledRule.rule_version(TAG_RULE)}
+    torrent_hash = history[0]['hash']
+    assert [entry['rule_name'] for entry in helper.state_store.query_history(torrent_hash=torrent_hash)] == ['标记alpha']
+    assert helper.state_store.query_history(rule_name='其他规则') == []
+
+
+def test_removed_torrent_keeps_tombstone(make_helper, fake_qbittorrent):
+    helper = make_helper(rules=[TAG_RULE])
+    library = fake_qbittorrent.library
+    helper.opt_all_torrent([TAG_RULE], incremental=False)
+
+    removed_hash = next(iter(library.torrents))
+    with library.lock:
+        del library.torrents[removed_hash]
+        del library.trackers[removed_hash]
+        library.touch(removed=[removed_hash])
+    helper.opt_all_torrent([TAG_RULE], incremental=False)
+    states = helper.state_store.get_torrent_states(DEFAULT_INSTANCE_NAME)
+    assert removed_hash not in states and len(states) == 39
+    # 保留字段指纹为空的删除记录，用于增量模式下重新处理其辅种
+    conn = sqlite3.connect(helper.state_store.path)
+    try:
+        row = conn.execute('SELECT fingerprint, field_fingerprint FROM torrent_state WHERE hash = ?',
+                           (removed_hash,)).fetchone()
+    finally:
+        conn.close()
+    assert row[1] == ''
+
+
+def test_readable_while_open(make_helper):
+    helper = make_helper(rules=[TAG_RULE])
+    helper.opt_all_torrent([TAG_RULE], incremental=False)
+    # WAL模式下其他进程可以直接读取
+    conn = sqlite3.connect(helper.state_store.path)
+    try:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('SELECT COUNT(*) FROM torrent_state').fetchone()[0] == 40
+        assert conn.execute('SELECT COUNT(*) FROM rule_applications').fetchone()[0] > 0
+    finally:
+        conn.close()
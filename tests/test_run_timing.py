@@ -0,0 +1,89 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from qbit_helper import ManagedClient, QBitHelperBasic, RunTiming
+
+
+def make_client():
+    return ManagedClient(host='http://127.0.0.1:9', username='admin', password='admin')
+
+
+def request(client, method='info'):
+    client._record_request(None, 'torrents', method, 0.01)
+
+
+def test_counts_requests_in_run_context():
+    client = make_client()
+    request(client)
+    timing = RunTiming()
+    token = RunTiming.current.set(timing)
+    try:
+        request(client)
+        request(client)
+        request(client, 'trackers')
+    finally:
+        RunTiming.current.reset(token)
+    request(client)
+    assert timing.api_call_counts() == {'torrents/info': 2, 'torrents/trackers': 1}
+
+
+def test_other_threads_not_counted():
+    client = make_client()
+    timing = RunTiming()
+    token = RunTiming.current.set(timing)
+    try:
+        # 同时运行的面板或其他任务在自己的线程中发出请求
+        thread = threading.Thread(target=lambda: [request(client) for _ in range(5)])
+        thread.start()
+        thread.join()
+        request(client, 'trackers')
+    finally:
+        RunTiming.current.reset(token)
+    assert timing.api_call_counts() == {'torrents/trackers': 1}
+
+
+def test_submit_propagates_run_to_pool():
+    client = make_client()
+    first, second = RunTiming(), RunTiming()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        for timing, count in ((first, 6), (second, 3)):
+            token = RunTiming.current.set(timing)
+            try:
+                futures = [RunTiming.submit(executor, request, client) for _ in range(count)]
+                # 直接提交的任务不属于任何运行
+                futures.append(executor.submit(request, client))
+                for future in futures:
+                    future.result()
+            finally:
+                RunTiming.current.reset(token)
+    assert first.api_call_counts() == {'torrents/info': 6}
+    assert second.api_call_counts() == {'torrents/info': 3}
+    assert RunTiming.current.get() is None
+
+
+def test_activate_resets_on_error():
+    timing = RunTiming()
+    try:
+        with timing.activate():
+            assert RunTiming.current.get() is timing
+            raise RuntimeError('flush failed')
+    except RuntimeError:
+        pass
+    # 运行异常结束后，线程池线程上的后续请求不再计入该运行
+    assert RunTiming.current.get() is None
+
+
+def test_opt_all_torrent_clears_run_on_error():
+    helper = QBitHelperBasic.__new__(QBitHelperBasic)
+    seen = []
+
+    def failing_run(*args):
+        seen.append(RunTiming.current.get())
+        raise OSError('state store unavailable')
+    helper._opt_all_torrent = failing_run
+    with pytest.raises(OSError):
+        helper.opt_all_torrent([])
+    assert isinstance(seen[0], RunTiming)
+    assert RunTiming.current.get() is None
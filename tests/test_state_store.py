@@ -0,0 +1,245 @@
+import sqlite3
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import qbit_helper
+from qbit_helper import CompiledRule, QBitHelperBasic, StateStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(qbit_helper.time, 'time', clock.time)
+    return clock
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'state.db')
+
+
+def state(tags='', hosts='a.org', fingerprint='fp', field='f1'):
+    return tags, hosts, fingerprint, field
+
+
+def test_only_changed_states_written(db_path, logger, clock):
+    store = StateStore(db_path, logger)
+    assert store.save_run('默认', {'a': state(), 'b': state(field='f2')}, []) == (2, 0)
+    clock.now += 10
+    assert store.save_run('默认', {'a': state(), 'b': state(field='f2')}, []) == (0, 0)
+    # 只有标签变化（字段指纹未变）也写入
+    assert store.save_run('默认', {'a': state(tags='x'), 'b': state(field='f2')}, []) == (1, 0)
+
+
+def test_unknown_tracker_hosts_keep_previous(db_path, logger, clock):
+    store = StateStore(db_path, logger)
+    store.save_run('默认', {'a': state(hosts='a.org')}, [])
+    store.save_run('默认', {'a': state(hosts=None)}, [])
+    assert store.get_torrent_states('默认')['a'] == state(hosts='a.org')
+    assert StateStore(db_path, logger).get_torrent_states('默认')['a'] == state(hosts='a.org')
+
+
+def test_changed_torrents(db_path, logger, clock):
+    store = StateStore(db_path, logger)
+    store.save_run('默认', {'a': state(field='fa'), 'b': state(field='fb')}, [])
+    clock.now += 10
+    since = clock.now
+    clock.now += 10
+
+    changed, removed = store.changed_torrents('默认', {'a': 'fa', 'b': 'fb2', 'c': 'fc'}, since)
+    # b的字段变化，c是新种子
+    assert changed == {'b', 'c'}
+    assert removed == set()
+
+    # 运行后写入的状态：b在since之后变化，仍然需要处理
+    store.save_run('默认', {'a': state(field='fa'), 'b': state(field='fb2'), 'c': state(field='fc')}, [])
+    changed, _ = store.changed_torrents('默认', {'a': 'fa', 'b': 'fb2', 'c': 'fc'}, since)
+    assert changed == {'b', 'c'}
+    changed, _ = store.changed_torrents('默认', {'a': 'fa', 'b': 'fb2', 'c': 'fc'}, clock.now)
+    assert changed == set()
+
+
+def test_force_changed(db_path, logger, clock):
+    store = StateStore(db_path, logger)
+    store.save_run('默认', {'a': state(field='fa')}, [])
+    clock.now += 10
+    since = clock.now
+    clock.now += 10
+    store.save_run('默认', {'a': state(field='fa')}, [], force_changed=['a'])
+    assert store.changed_torrents('默认', {'a': 'fa'}, since)[0] == {'a'}
+
+
+def test_removed_torrents_report_fingerprint(db_path, logger, clock):
+    store = StateStore(db_path, logger)
+    store.save_run('默认', {'a': state(fingerprint='content'), 'b': state(fingerprint=None)}, [])
+    clock.now += 10
+    since = clock.now
+    # 种子被删除但尚未写入删除记录
+    assert store.changed_torrents('默认', {}, since)[1] == {'content'}
+    clock.now += 10
+    store.save_run('默认', {}, [])
+    assert store.get_torrent_states('默认') == {}
+    assert store.changed_torrents('默认', {}, since)[1] == {'content'}
+    # 删除记录早于since时不再报告
+    assert store.changed_torrents('默认', {}, clock.now + 1)[1] == set()
+
+
+def test_tombstones_pruned(db_path, logger, clock):
+    store = StateStore(db_path, logger, history_days=1)
+    store.save_run('默认', {'a': state()}, [('a', 'r', 'v1', 'processed', '')])
+    store.save_run('默认', {}, [])
+    clock.now += 3 * 86400
+    store.save_run('默认', {'b': state()}, [])
+    with sqlite3.connect(db_path) as conn:
+        assert [row[0] for row in conn.execute('SELECT hash FROM torrent_state')] == ['b']
+        assert conn.execute('SELECT COUNT(*) FROM rule_applications').fetchone()[0] == 0
+
+
+def test_state_survives_restart(db_path, logger, clock):
+    store = StateStore(db_path, logger)
+    store.save_run('默认', {'a': state(tags='x,y', fingerprint='content', field='fa')}, [])
+    clock.now += 10
+    reopened = StateStore(db_path, logger)
+    assert reopened.get_torrent_states('默认') == {'a': state(tags='x,y', fingerprint='content', field='fa')}
+    assert reopened.changed_torrents('默认', {'a': 'fa'}, clock.now)[0] == set()
+    assert reopened.save_run('默认', {'a': state(tags='x,y', fingerprint='content', field='fa')}, []) == (0, 0)
+
+
+def test_checkpoints_keep_full_sweep_time(db_path, logger, clock):
+    store = StateStore(db_path, logger)
+    store.save_run('默认', {}, [], checkpoints=[('r', 'v1', 100.0, True)])
+    store.save_run('默认', {}, [], checkpoints=[('r', 'v1', 200.0, False)])
+    assert store.get_rule_checkpoints('默认') == {
+        'r': {'rule_version': 'v1', 'evaluated_at': 200.0, 'full_sweep_at': 100.0}}
+    store.save_run('默认', {}, [], checkpoints=[('r', 'v2', 300.0, True)])
+    assert store.get_rule_checkpoints('默认')['r'] == {'rule_version': 'v2', 'evaluated_at': 300.0,
+                                                      'full_sweep_at': 300.0}
+    assert store.get_rule_checkpoints('其他') == {}
+
+
+def test_query_history(db_path, logger, clock):
+    store = StateStore(db_path, logger)
+    store.save_run('默认', {}, [('a', 'r1', 'v1', 'processed', 'ok'), ('b', 'r2', 'v1', 'failed', 'err')], 'run')
+    clock.now += 1
+    store.save_run('其他', {}, [('a', 'r1', 'v1', 'processed', 'ok')])
+    assert [row['instance'] for row in store.query_history(torrent_hash='a')] == ['其他', '默认']
+    rows = store.query_history(instance='默认', rule_name='r2')
+    assert [(row['hash'], row['status'], row['run_name']) for row in rows] == [('b', 'failed', 'run')]
+    assert len(store.query_history(limit=1)) == 1
+
+
+def test_migrates_old_schema(db_path, logger):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("""CREATE TABLE torrent_state (instance TEXT NOT NULL, hash TEXT NOT NULL,
+            tags TEXT NOT NULL DEFAULT '', tracker_hosts TEXT NOT NULL DEFAULT '', fingerprint TEXT,
+            updated_at REAL NOT NULL, PRIMARY KEY (instance, hash)) WITHOUT ROWID""")
+        conn.execute("INSERT INTO torrent_state VALUES ('默认', 'a', 'x', 'a.org', 'content', 1)")
+    store = StateStore(db_path, logger)
+    # 旧记录没有字段指纹，视为已删除的种子，当前存在时作为变化的种子处理
+    assert store.get_torrent_states('默认') == {}
+    assert store.changed_torrents('默认', {'a': 'fa'}, 0)[0] == {'a'}
+
+
+class Torrent(dict):
+    __getattr__ = dict.get
+
+
+def make_torrent(torrent_hash, name, tags=''):
+    return Torrent(hash=torrent_hash, name=name, tags=tags, tracker='https://a.org/announce', trackers_count=1,
+                   save_path='/downloads/', size=100)
+
+
+def make_helper(store, torrents, fingerprints, full_sweep_interval=86400):
+    helper = QBitHelperBasic.__new__(QBitHelperBasic)
+    helper.logger = store.logger
+    helper.state_store = store
+    helper.config_store = SimpleNamespace(data={'default': {'incremental': {
+        'enabled': True, 'full_sweep_interval': full_sweep_interval}}})
+    torrent_dict = {}
+    for torrent in torrents:
+        torrent_dict.setdefault(fingerprints[torrent.hash], []).append(torrent.hash)
+    helper._instance_local = threading.local()
+    helper.instances = {'默认': SimpleNamespace(
+        name='默认', torrent_dict=torrent_dict,
+        file_list_cache=SimpleNamespace(get=lambda torrent_hash: fingerprints.get(torrent_hash)))}
+    return helper
+
+
+def save_evaluated(store, torrents, fingerprints, rules, evaluated_at, full=True):
+    store.save_run('默认', {torrent.hash: ('', 'a.org', fingerprints.get(torrent.hash),
+                                          QBitHelperBasic._field_fingerprint(torrent)) for torrent in torrents},
+                   [], checkpoints=[(rule.rule_name, rule.version, evaluated_at, full) for rule in rules])
+
+
+def test_incremental_scopes(db_path, logger, clock):
+    store = StateStore(db_path, logger)
+    torrents = [make_torrent('a', 'A'), make_torrent('b', 'B'), make_torrent('c', 'C')]
+    fingerprints = {'a': 'fa', 'b': 'fb', 'c': 'fc'}
+    tag_rule = CompiledRule.compile({'rule_name': 'tag', 'rule_type': 'tag_opt', 'opt_type': 'add', 'tag': 'x'})
+    new_rule = CompiledRule.compile({'rule_name': 'new', 'rule_type': 'tag_opt', 'opt_type': 'add', 'tag': 'y'})
+    helper = make_helper(store, torrents, fingerprints)
+
+    # 没有检查点时处理所有种子
+    assert helper._incremental_scopes([tag_rule], torrents) == [None]
+    save_evaluated(store, torrents, fingerprints, [tag_rule], clock.now)
+    clock.now += 60
+
+    torrents[1] = make_torrent('b', 'B', tags='changed')
+    torrents.append(make_torrent('d', 'D'))
+    fingerprints['d'] = 'fd'
+    assert helper._incremental_scopes([tag_rule, new_rule], torrents) == [{'b', 'd'}, None]
+
+    # 规则定义变化后全量处理
+    modified = CompiledRule.compile(dict(tag_rule.rule, tag='z'))
+    assert helper._incremental_scopes([modified], torrents) == [None]
+
+
+def test_incremental_full_sweep_interval(db_path, logger, clock):
+    store = StateStore(db_path, logger)
+    torrents = [make_torrent('a', 'A')]
+    fingerprints = {'a': 'fa'}
+    rule = CompiledRule.compile({'rule_name': 'tag', 'rule_type': 'tag_opt', 'opt_type': 'add', 'tag': 'x'})
+    helper = make_helper(store, torrents, fingerprints, full_sweep_interval=3600)
+    save_evaluated(store, torrents, fingerprints, [rule], clock.now)
+    clock.now += 1800
+    save_evaluated(store, torrents, fingerprints, [rule], clock.now, full=False)
+    clock.now += 60
+    assert helper._incremental_scopes([rule], torrents) == [set()]
+    # 增量运行不推迟全量处理
+    clock.now += 1800
+    assert helper._incremental_scopes([rule], torrents) == [None]
+
+
+def test_incremental_duplicate_groups(db_path, logger, clock):
+    store = StateStore(db_path, logger)
+    torrents = [make_torrent('a', 'A'), make_torrent('a2', 'A2'), make_torrent('b', 'B'), make_torrent('b2', 'B2'),
+                make_torrent('b3', 'B3'), make_torrent('c', 'C')]
+    fingerprints = {'a': 'fa', 'a2': 'fa', 'b': 'fb', 'b2': 'fb', 'b3': 'fb', 'c': 'fc'}
+    rule = CompiledRule.compile({'rule_name': 'dup', 'rule_type': 'duplicate_tag_opt', 'opt_type': 'add'})
+    save_evaluated(store, torrents, fingerprints, [rule], clock.now)
+    clock.now += 60
+
+    # 新增a的辅种a3，删除b3
+    torrents = [t for t in torrents if t.hash != 'b3'] + [make_torrent('a3', 'A3')]
+    fingerprints['a3'] = 'fa'
+    helper = make_helper(store, torrents, {h: fingerprints[h] for h in fingerprints if h != 'b3'})
+    assert helper._incremental_scopes([rule], torrents) == [{'a', 'a2', 'a3', 'b', 'b2'}]
+
+
+def test_rule_version_ignores_index():
+    rule = {'rule_name': 'r', 'rule_type': 'tag_opt', 'trackers': 'a.org', 'tag': 'x'}
+    version = CompiledRule.rule_version(rule)
+    assert CompiledRule.rule_version(dict(rule, index=3)) == version
+    assert CompiledRule.rule_version(dict(reversed(list(rule.items())))) == version
+    assert CompiledRule.rule_version(dict(rule, tag='y')) != version
+    assert CompiledRule.compile(rule).version == version
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from qbit_helper import TaskJobManager
+
+
+def wait_for_status(manager, job_id, statuses=TaskJobManager.FINISHED_STATUSES, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        view = manager.get(job_id, include_result=True)
+        if view is not None and view['status'] in statuses:
+            return view
+        time.sleep(0.02)
+    raise AssertionError(f'任务 {job_id} 未在 {timeout} 秒内进入 {statuses}')
+
+
+@pytest.fixture
+def manager(tmp_path, logger):
+    manager = TaskJobManager(str(tmp_path / 'jobs'), logger, workers=1, keep=3, progress_interval=0)
+    yield manager
+    manager._executor.shutdown(wait=True)
+
+
+def test_job_result_and_progress(manager):
+    def work(progress):
+        progress.add_total(3)
+        progress.advance(3)
+        return {'标记alpha': {'processed_count': 3}}
+    job = manager.submit('测试任务', work, task_index=0)
+    assert job['task_index'] == 0
+    view = wait_for_status(manager, job['job_id'])
+    assert view['status'] == 'succeeded'
+    assert view['progress']['done'] == view['progress']['total'] == 3
+    assert view['result'] == {'标记alpha': {'processed_count': 3}}
+    assert 'result' not in manager.get(job['job_id'])
+    assert manager.get('../etc/passwd') is None
+
+
+def test_job_failure_recorded(manager):
+    def work(progress):
+        raise RuntimeError('实例离线')
+    view = wait_for_status(manager, manager.submit('失败任务', work)['job_id'])
+    assert view['status'] == 'failed'
+    assert view['error'] == '实例离线'
+
+
+def test_cancel_running_and_queued(manager):
+    started = threading.Event()
+
+    def work(progress):
+        started.set()
+        while not progress.cancelled:
+            progress.advance()
+            time.sleep(0.01)
+        return {}
+    running = manager.submit('长任务', work)
+    queued = manager.submit('排队任务', work)
+    assert started.wait(5)
+    # 线程池只有一个线程，第二个任务仍在排队
+    assert manager.get(queued['job_id'])['status'] == 'queued'
+    assert manager.cancel(queued['job_id'])
+    assert manager.get(queued['job_id'])['status'] == 'cancelled'
+    assert manager.cancel(running['job_id'])
+    assert wait_for_status(manager, running['job_id'])['status'] == 'cancelled'
+    assert not manager.cancel(running['job_id'])
+
+
+def test_other_process_view_and_cancel(manager, tmp_path, logger):
+    release = threading.Event()
+
+    def work(progress):
+        while not progress.cancelled and not release.is_set():
+            progress.advance()
+            time.sleep(0.01)
+        return {}
+    job = manager.submit('长任务', work)
+
+    # 同一jobs目录下的另一个worker通过状态文件查询和取消
+    other = TaskJobManager(str(tmp_path / 'jobs'), logger, workers=1)
+    try:
+        wait_for_status(other, job['job_id'], statuses=('running',))
+        assert [view['job_id'] for view in other.list()] == [job['job_id']]
+        assert other.cancel(job['job_id'])
+        assert wait_for_status(manager, job['job_id'])['status'] == 'cancelled'
+        assert other.get(job['job_id'])['status'] == 'cancelled'
+    finally:
+        release.set()
+        other._executor.shutdown(wait=True)
+
+
+def test_keeps_recent_jobs(manager):
+    job_ids = []
+    for i in range(5):
+        job_ids.append(manager.submit(f'任务{i}', lambda progress: {})['job_id'])
+        wait_for_status(manager, job_ids[-1])
+        time.sleep(0.01)
+    assert {view['job_id'] for view in manager.list()} <= set(job_ids[-4:])
+    assert manager.get(job_ids[0]) is None
+
+
+def test_submit_manual_task(make_helper, fake_qbittorrent):
+    rule = {'rule_name': '标记alpha', 'rule_type': 'tag_opt', 'priority': 1, 'opt_type': 'add',
+            'trackers': 'tracker.alpha.org', 'tag': 'alpha'}
+    helper = make_helper(rules=[rule], tasks=[{'task_name': '手动任务', 'rules': '标记alpha'}])
+    with pytest.raises(ValueError):
+        helper.submit_manual_task(3)
+    with pytest.raises(ValueError):
+        helper.submit_manual_task(0, instances='不存在')
+    job = helper.submit_manual_task(0)
+    view = wait_for_status(helper.task_jobs, job['job_id'])
+    assert view['status'] == 'succeeded'
+    assert view['progress']['total'] == 40
+    assert view['progress']['rules']['标记alpha']['processed'] > 0
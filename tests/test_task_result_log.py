@@ -0,0 +1,114 @@
+import os
+
+from qbit_helper import TaskResultLog
+
+
+def entry(i, body='结果'):
+    return f'[2024-01-01 00:00:{i % 60:02d}] 任务：任务{i}\n  {body}\n'
+
+
+def index_records(log):
+    with open(log.index_path, 'rb') as f:
+        data = f.read()
+    return [log._unpack_index_record(data[i:i + log.INDEX_RECORD_SIZE])
+            for i in range(0, len(data), log.INDEX_RECORD_SIZE)]
+
+
+def test_read_runs_pages_from_latest(tmp_path):
+    log = TaskResultLog(str(tmp_path / 'task_results.log'), max_bytes=0)
+    for i in range(5):
+        log.append(entry(i))
+    page = log.read_runs(limit=2)
+    assert page['content'] == entry(3) + entry(4)
+    assert page['total_runs'] == 5 and page['cursor'] == 3 and page['has_more']
+    page = log.read_runs(limit=10, before=page['cursor'])
+    assert page['content'] == ''.join(entry(i) for i in range(3))
+    assert not page['has_more']
+
+
+def test_read_since(tmp_path):
+    log = TaskResultLog(str(tmp_path / 'task_results.log'), max_bytes=0)
+    log.append(entry(0))
+    page = log.read_runs()
+    log.append(entry(1))
+    update = log.read_since(page['next_offset'], page['generation'])
+    assert update['content'] == entry(1) and not update['reset']
+    assert log.read_since(update['next_offset'] + 100)['reset']
+
+
+def test_missing_index_rebuilt(tmp_path):
+    log = TaskResultLog(str(tmp_path / 'task_results.log'), max_bytes=0)
+    with open(log.path, 'w', encoding='utf-8') as f:
+        f.write(entry(0, '第一行\n  第二行') + entry(1))
+    assert log.read_runs(limit=1)['content'] == entry(1)
+    assert len(index_records(log)) == 2
+
+
+def test_rotation_starts_new_index(tmp_path):
+    log = TaskResultLog(str(tmp_path / 'task_results.log'), max_bytes=len(entry(0).encode()) * 3, backup_count=2)
+    for i in range(3):
+        log.append(entry(i))
+    generation = log.generation()
+    log.append(entry(3))
+
+    assert os.path.exists(log.path + '.1')
+    assert log.read_runs()['content'] == entry(3)
+    assert index_records(log) == [(0, len(entry(3).encode()))]
+    assert log.generation() != generation
+    assert log.read_since(0, generation)['reset']
+
+    for i in range(4, 10):
+        log.append(entry(i))
+    assert os.path.exists(log.path + '.2')
+    assert not os.path.exists(log.path + '.3')
+
+
+def test_truncated_log_rebuilds_index(tmp_path):
+    log = TaskResultLog(str(tmp_path / 'task_results.log'), max_bytes=0)
+    for i in range(3):
+        log.append(entry(i))
+    # 日志被外部截断，只剩第一次运行
+    with open(log.path, 'w', encoding='utf-8') as f:
+        f.write(entry(0))
+    page = log.read_runs()
+    assert page['total_runs'] == 1
+    assert page['content'] == entry(0)
+
+    log.append(entry(5))
+    assert log.read_runs()['content'] == entry(0) + entry(5)
+
+    open(log.path, 'w').close()
+    page = log.read_runs()
+    assert page['total_runs'] == 0 and page['content'] == ''
+    log.append(entry(6))
+    assert log.read_runs()['content'] == entry(6)
+
+
+def test_deleted_log_discards_index(tmp_path):
+    log = TaskResultLog(str(tmp_path / 'task_results.log'), max_bytes=0)
+    log.append(entry(0))
+    log.append(entry(1))
+    os.remove(log.path)
+    assert log.read_runs()['total_runs'] == 0
+    log.append(entry(2))
+    assert index_records(log) == [(0, len(entry(2).encode()))]
+    assert log.read_runs()['content'] == entry(2)
+
+
+def test_partial_index_record_rebuilds(tmp_path):
+    log = TaskResultLog(str(tmp_path / 'task_results.log'), max_bytes=0)
+    log.append(entry(0))
+    log.append(entry(1))
+    with open(log.index_path, 'ab') as f:
+        f.write(b'0000')
+    assert log.read_runs()['total_runs'] == 2
+    assert log.read_runs(limit=1)['content'] == entry(1)
+
+
+def test_unindexed_tail_rebuilds(tmp_path):
+    log = TaskResultLog(str(tmp_path / 'task_results.log'), max_bytes=0)
+    log.append(entry(0))
+    # 旧版本直接追加到日志，没有写索引
+    with open(log.path, 'a', encoding='utf-8') as f:
+        f.write(entry(1))
+    assert log.read_runs()['total_runs'] == 2
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from qbit_helper import QBitHelperBasic, TaskRunQueue
+
+
+class Recorder:
+    def __init__(self):
+        self.batches = []
+        self.done = threading.Event()
+
+    def __call__(self, payloads):
+        self.batches.append((time.monotonic(), list(payloads)))
+        self.done.set()
+
+
+def test_single_task_does_not_wait_full_window(logger):
+    recorder = Recorder()
+    queue = TaskRunQueue(recorder, logger, batch_window=5)
+    start = time.monotonic()
+    assert queue.submit('job', '任务', 'a')
+    assert recorder.done.wait(2)
+    assert recorder.batches[0][1] == ['a']
+    assert recorder.batches[0][0] - start < 1
+
+
+def test_tasks_due_together_share_batch(logger):
+    recorder = Recorder()
+    queue = TaskRunQueue(recorder, logger, batch_window=5)
+    for i, priority in enumerate([3, 1, 2]):
+        queue.submit(f'job{i}', f'任务{i}', f'p{priority}', priority=priority)
+        time.sleep(0.02)
+    assert recorder.done.wait(2)
+    # 按priority排序后一起执行
+    assert recorder.batches == [(recorder.batches[0][0], ['p1', 'p2', 'p3'])]
+
+
+def test_window_bounds_wait(logger, monkeypatch):
+    monkeypatch.setattr(TaskRunQueue, 'BATCH_IDLE', 0.2)
+    recorder = Recorder()
+    queue = TaskRunQueue(recorder, logger, batch_window=0.5)
+    start = time.monotonic()
+    # 任务持续入队时，最多等待batch_window秒
+    for i in range(8):
+        queue.submit(f'job{i}', f'任务{i}', i)
+        time.sleep(0.1)
+    assert recorder.done.wait(2)
+    first_batch_at, payloads = recorder.batches[0]
+    assert first_batch_at - start < 0.8
+    assert 0 < len(payloads) < 8
+
+
+def test_max_instances_coalesces(logger):
+    release = threading.Event()
+    started = threading.Event()
+
+    def run_batch(payloads):
+        started.set()
+        release.wait(2)
+
+    queue = TaskRunQueue(run_batch, logger, batch_window=0)
+    assert queue.submit('job', '任务', 1, max_instances=2)
+    assert started.wait(2)
+    # 运行中的一次也计入max_instances
+    assert queue.submit('job', '任务', 2, max_instances=2)
+    assert not queue.submit('job', '任务', 3, max_instances=2)
+    assert queue.status() == {'queued': ['任务'], 'running': ['任务']}
+    release.set()
+
+
+def test_batch_groups_by_resolved_instances(logger):
+    helper = QBitHelperBasic.__new__(QBitHelperBasic)
+    helper.logger = logger
+    helper.instances = {'a': None, 'b': None, 'c': None}
+    shared, single = [], []
+    helper._match_task_rules = lambda task: task['rules']
+    helper.opt_instances_shared = lambda rules_list, selector, run_name: \
+        shared.append((selector, run_name)) or [{} for _ in rules_list]
+    helper._execute_auto_task_and_log_result = lambda index, task, result=None, duration=0.0: \
+        single.append((task['task_name'], result is not None))
+    items = [(0, {'task_name': 't0', 'instances': ['a', 'b'], 'rules': []}),
+             (1, {'task_name': 't1', 'instances': 'b|a', 'rules': []}),
+             (2, {'task_name': 't2', 'instances': ['missing'], 'rules': []}),
+             (3, {'task_name': 't3', 'rules': []}),
+             (4, {'task_name': 't4', 'instances': 'all', 'rules': []})]
+    helper._run_auto_task_batch(items)
+    # 列表和字符串写法选中相同实例时合并，无效的实例选择单独执行
+    assert shared == [(['a', 'b'], 't0+t1'), (['a', 'b', 'c'], 't3+t4')]
+    assert single == [('t0', True), ('t1', True), ('t2', False), ('t3', True), ('t4', True)]
@@ -0,0 +1,157 @@
+import random
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from qbit_helper import CompiledRule, KeywordMatcher, QBitHelperBasic, TorrentIndex
+
+HOSTS = ['tracker.a.org', 'pt.b.net', 'c.cc', 'tracker.d.io']
+TAGS = ['x', 'y', 'z', 'xy', 'movie']
+
+
+def make_torrents(rng, count=300):
+    torrents = []
+    for i in range(count):
+        tags = rng.sample(TAGS, rng.randint(0, 3))
+        urls = ['** [DHT] **'] + [f'https://{host}/announce?k={i}' for host in rng.sample(HOSTS, rng.randint(0, 2))]
+        torrents.append(SimpleNamespace(hash=f'{i:040x}', tags=', '.join(tags),
+                                        trackers=[SimpleNamespace(url=url) for url in urls]))
+    return torrents
+
+
+def make_helper(index):
+    helper = QBitHelperBasic.__new__(QBitHelperBasic)
+    helper._compiled_rules = {}
+    helper._compiled_rules_lock = threading.Lock()
+    helper._instance_local = threading.local()
+    helper.instances = {'默认': SimpleNamespace(
+        tracker_cache=SimpleNamespace(get=lambda torrent: torrent.trackers),
+        torrent_mirror=SimpleNamespace(index=index),
+        torrent_dict={}
+    )}
+    return helper
+
+
+def full_scan(helper, rule, torrents):
+    """逐个种子检查规则，返回规则会实际处理的种子"""
+    hashes = set()
+    for torrent in torrents:
+        tags = [t.strip() for t in torrent.tags.split(',') if t.strip()]
+        if rule.rule_type == 'tag_opt':
+            if not helper.tag_opt_rule_check(torrent, rule):
+                continue
+            if rule.opt_type != 'add' and rule.get('tag') not in tags:
+                continue
+        elif not helper.tracker_opt_rule_check(torrent, rule):
+            continue
+        hashes.add(torrent.hash)
+    return hashes
+
+
+def random_rules(rng, count=60):
+    match_strings = ['', 'a.org', 'b.net|c.cc', 'tracker', 'announce', 'nomatch', 'x', 'y|movie', 'z']
+    rules = []
+    for _ in range(count):
+        rule_type = rng.choice(['tag_opt', 'tracker_opt'])
+        rules.append(CompiledRule.compile({
+            'rule_name': 'r', 'rule_type': rule_type, 'opt_type': rng.choice(['add', 'remove']),
+            'trackers': rng.choice(match_strings), 'tags': rng.choice(match_strings),
+            'tag': rng.choice(TAGS), 'tracker': 'https://new.t/announce'
+        }))
+    return rules
+
+
+@pytest.fixture(params=[False, True], ids=['substring', 'automaton'])
+def automaton(request, monkeypatch):
+    monkeypatch.setattr(KeywordMatcher, 'AUTOMATON_THRESHOLD', 1 if request.param else 10 ** 9)
+
+
+def test_candidates_equal_full_scan_when_indexed(automaton):
+    rng = random.Random(3)
+    torrents = make_torrents(rng)
+    index = TorrentIndex()
+    for torrent in torrents:
+        index.update_tags(torrent.hash, torrent.tags)
+        index.update_trackers(torrent.hash, torrent.trackers)
+    helper = make_helper(index)
+    torrent_hashes = {t.hash for t in torrents}
+    pruned = 0
+    for rule in random_rules(rng):
+        candidates = helper._rule_candidates(rule, torrent_hashes)
+        if candidates is None:
+            continue
+        pruned += 1
+        # 标签和tracker都已索引时，候选集合与逐个检查的结果一致
+        assert candidates == full_scan(helper, rule, torrents), rule.rule
+    assert pruned > 30
+
+
+def test_candidates_include_unindexed_trackers(automaton):
+    rng = random.Random(5)
+    torrents = make_torrents(rng)
+    index = TorrentIndex()
+    for i, torrent in enumerate(torrents):
+        index.update_tags(torrent.hash, torrent.tags)
+        # 部分种子尚未获取tracker列表
+        if i % 3:
+            index.update_trackers(torrent.hash, torrent.trackers)
+    helper = make_helper(index)
+    torrent_hashes = {t.hash for t in torrents}
+    unindexed = {t.hash for i, t in enumerate(torrents) if not i % 3}
+    for rule in random_rules(rng):
+        candidates = helper._rule_candidates(rule, torrent_hashes)
+        if candidates is None:
+            continue
+        # 剪枝不能漏掉会被处理的种子
+        assert full_scan(helper, rule, torrents) <= candidates, rule.rule
+        if rule.tracker_matcher is not None and rule.tag_matcher is None and rule.opt_type == 'add':
+            assert unindexed <= candidates
+
+
+def test_candidates_limited_to_current_torrents():
+    index = TorrentIndex()
+    index.update_tags('a', 'x')
+    index.update_tags('b', 'x')
+    helper = make_helper(index)
+    rule = CompiledRule.compile({'rule_name': 'r', 'rule_type': 'tag_opt', 'opt_type': 'remove', 'tag': 'x'})
+    assert helper._rule_candidates(rule, {'a'}) == {'a'}
+
+
+def test_no_conditions_means_all_torrents():
+    helper = make_helper(TorrentIndex())
+    rule = CompiledRule.compile({'rule_name': 'r', 'rule_type': 'tracker_opt', 'opt_type': 'add'})
+    assert helper._rule_candidates(rule, {'a', 'b'}) is None
+
+
+def test_index_tracks_updates():
+    index = TorrentIndex()
+    index.update_tags('a', 'x, y')
+    index.update_trackers('a', [SimpleNamespace(url='https://tracker.a.org/announce')])
+    index.update_tags('b', 'y')
+    assert index.hashes_for_tag('y') == {'a', 'b'}
+    assert index.hashes_for_tracker_host('tracker.a.org') == {'a'}
+
+    index.update_tags('a', 'z')
+    assert index.hashes_for_tag('x') == set()
+    assert index.hashes_for_tag('y') == {'b'}
+    assert 'x' not in index.tag_hashes
+
+    index.update_trackers('a', [SimpleNamespace(url='https://pt.b.net/announce')])
+    assert index.hashes_for_tracker_host('tracker.a.org') == set()
+    assert index.hashes_for_tracker_host('pt.b.net') == {'a'}
+
+    matcher = KeywordMatcher(['b.net'])
+    assert index.match_trackers(matcher, {'a', 'b'}) == {'a', 'b'}
+    index.update_trackers('b', [])
+    assert index.match_trackers(matcher, {'a', 'b'}) == {'a'}
+    # 移除tracker索引后种子重新作为候选
+    index.discard_trackers('a')
+    assert index.match_trackers(matcher, {'a', 'b'}) == {'a'}
+    assert index.hashes_for_tracker_host('pt.b.net') == set()
+
+    index.remove('b')
+    assert index.hashes_for_tag('y') == set()
+    assert index.match_trackers(matcher, {'a'}) == {'a'}
+    index.clear()
+    assert index.tag_hashes == {} and index.tracker_url_hashes == {}
@@ -0,0 +1,82 @@
+import pytest
+
+from qbit_helper import TorrentMirror
+
+
+class ScriptedClient:
+    """按顺序返回预设的sync/maindata响应，记录请求的rid"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.rids = []
+
+    def sync_maindata(self, rid=0):
+        self.rids.append(rid)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+FULL = {'rid': 1, 'full_update': True, 'torrents': {
+    'a': {'name': 'A', 'tags': 'x', 'state': 'uploading'},
+    'b': {'name': 'B', 'tags': '', 'state': 'stalledUP'},
+}}
+
+
+def test_incremental_merge(logger):
+    client = ScriptedClient([FULL,
+                             {'rid': 2, 'torrents': {'a': {'tags': 'x, y'}, 'c': {'name': 'C', 'tags': 'y'}},
+                              'torrents_removed': ['b']},
+                             {'rid': 3}])
+    mirror = TorrentMirror(client, logger)
+    assert mirror.refresh() == {'a', 'b'}
+    assert mirror.refresh() == {'a', 'b', 'c'}
+    # 只携带变化的字段，其余字段保持不变
+    assert mirror.torrents['a']['name'] == 'A' and mirror.torrents['a']['tags'] == 'x, y'
+    assert mirror.torrents['a'].hash == 'a'
+    assert set(mirror.torrents) == {'a', 'c'}
+    assert mirror.index.hashes_for_tag('y') == {'a', 'c'}
+    assert mirror.index.hashes_for_tag('x') == {'a'}
+    assert mirror.refresh() == set()
+    assert client.rids == [0, 1, 2]
+
+
+def test_refresh_does_not_change_held_torrents(logger):
+    client = ScriptedClient([FULL, {'rid': 2, 'torrents': {'a': {'tags': 'z', 'state': 'pausedUP'}}}])
+    mirror = TorrentMirror(client, logger)
+    held = {torrent.hash: torrent for torrent in mirror.get_torrents()}
+    # 任务执行期间后台刷新种子镜像，任务持有的种子对象不变
+    mirror.refresh()
+    assert held['a']['tags'] == 'x' and held['a']['state'] == 'uploading'
+    assert mirror.torrents['a']['tags'] == 'z'
+    assert mirror.torrents['b'] is held['b']
+
+
+def test_full_update_replaces_mirror(logger):
+    client = ScriptedClient([FULL, {'rid': 5, 'full_update': True, 'torrents': {'c': {'name': 'C', 'tags': ''}}}])
+    mirror = TorrentMirror(client, logger)
+    mirror.refresh()
+    assert mirror.refresh() == {'a', 'b', 'c'}
+    assert set(mirror.torrents) == {'c'}
+    assert mirror.index.hashes_for_tag('x') == set()
+
+
+def test_failed_sync_requests_full_update(logger):
+    client = ScriptedClient([FULL, ConnectionError('timeout'), FULL])
+    mirror = TorrentMirror(client, logger)
+    mirror.refresh()
+    with pytest.raises(ConnectionError):
+        mirror.refresh()
+    mirror.refresh()
+    assert client.rids == [0, 1, 0]
+
+
+def test_get_torrents_without_refresh(logger):
+    client = ScriptedClient([FULL])
+    mirror = TorrentMirror(client, logger)
+    assert mirror.get_torrents(refresh=False) == []
+    assert sorted(t['name'] for t in mirror.get_torrents()) == ['A', 'B']
+    assert len(mirror.get_torrents(refresh=False)) == 2
+    mirror.reset()
+    assert mirror.rid == 0 and mirror.get_torrents(refresh=False) == []
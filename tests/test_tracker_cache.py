@@ -0,0 +1,98 @@
+import threading
+import time
+
+from qbit_helper import TrackerCache
+
+
+class Torrent(dict):
+    def __getattr__(self, name):
+        return self[name]
+
+
+def make_torrent(torrent_hash, trackers_count=1, tracker='https://a/announce'):
+    return Torrent(hash=torrent_hash, name=torrent_hash, trackers_count=trackers_count, tracker=tracker)
+
+
+class FakeClient:
+    """按hash返回tracker列表并记录请求，bad_hashes中的种子请求失败"""
+
+    def __init__(self, bad_hashes=()):
+        self.bad_hashes = set(bad_hashes)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def torrents_trackers(self, torrent_hash):
+        with self.lock:
+            self.calls.append(torrent_hash)
+        if torrent_hash in self.bad_hashes:
+            raise Exception('Not Found')
+        return [Torrent(url=f'https://{torrent_hash}/announce')]
+
+
+def test_get_cached_until_fingerprint_changes(logger):
+    client = FakeClient()
+    cache = TrackerCache(client, logger)
+    torrent = make_torrent('h1')
+    assert cache.get(torrent)[0].url == 'https://h1/announce'
+    cache.get(torrent)
+    assert client.calls == ['h1']
+
+    # trackers_count或tracker字段变化时重新获取
+    cache.get(make_torrent('h1', trackers_count=2))
+    cache.get(make_torrent('h1', trackers_count=2, tracker='https://b/announce'))
+    assert client.calls == ['h1'] * 3
+
+    cache.invalidate('h1')
+    cache.get(make_torrent('h1', trackers_count=2, tracker='https://b/announce'))
+    assert len(client.calls) == 4
+
+
+def test_ttl_expiry(logger):
+    client = FakeClient()
+    cache = TrackerCache(client, logger, ttl=0.05)
+    torrent = make_torrent('h1')
+    cache.get(torrent)
+    cache.get(torrent)
+    time.sleep(0.1)
+    cache.get(torrent)
+    assert client.calls == ['h1', 'h1']
+
+    # ttl为0时不过期
+    cache = TrackerCache(client, logger, ttl=0)
+    cache.get(torrent)
+    time.sleep(0.1)
+    cache.get(torrent)
+    assert client.calls == ['h1'] * 3
+
+
+def test_prefetch_only_missing_and_scoped(logger):
+    client = FakeClient()
+    cache = TrackerCache(client, logger, max_workers=4)
+    torrents = [make_torrent(f'h{i}') for i in range(10)]
+    cache.get(torrents[0])
+    cache.prefetch(torrents, hashes={'h0', 'h1', 'h2'})
+    assert sorted(client.calls) == ['h0', 'h1', 'h2']
+
+    cache.prefetch(torrents)
+    assert sorted(client.calls) == ['h0'] + [f'h{i}' for i in range(1, 10)]
+    assert all(cache.peek(torrent.hash) is not None for torrent in torrents)
+
+    # 已不存在的种子在预取时被清理
+    cache.prefetch(torrents[5:])
+    assert cache.peek('h0') is None
+    assert cache.peek('h5') is not None
+    assert len(client.calls) == 10
+
+
+def test_prefetch_failure_logged_and_retried(logger):
+    client = FakeClient(bad_hashes={'h1'})
+    cache = TrackerCache(client, logger)
+    torrents = [make_torrent('h0'), make_torrent('h1')]
+    cache.prefetch(torrents)
+    assert cache.peek('h0') is not None
+    assert cache.peek('h1') is None
+
+    client.bad_hashes.clear()
+    cache.prefetch(torrents)
+    assert cache.peek('h1') is not None
+    assert client.calls.count('h0') == 1